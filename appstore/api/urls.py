@@ -1,8 +1,11 @@
 from django.urls import include, re_path
 
 from .v1.router import v1_urlpatterns
+from .v1.views import instance_stream
 
 
 urlpatterns = [
+    # Ahead of the router, whose instance detail route would match "stream".
+    re_path(r"^api/v1/instances/stream/$", instance_stream, name="instances-stream"),
     re_path(r"^api/v1/", include(v1_urlpatterns)),
 ]
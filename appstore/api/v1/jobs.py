@@ -0,0 +1,157 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import LaunchJob
+
+logger = logging.getLogger(__name__)
+
+
+class LaunchDispatcher:
+    """
+    Run queued launch jobs on a bounded pool of worker threads.
+
+    The LaunchJob table is the queue. A worker claims the oldest queued job
+    with a conditional update, so several appstore processes can share the
+    table without running a job twice. A job is only claimed while fewer than
+    ``concurrency`` jobs are running in total and its owner has fewer than
+    ``user_concurrency`` running; the limits are checked against the table
+    and may be overshot briefly when separate processes claim at once.
+
+    ``handler(job, progress)`` performs the launch. It returns the result
+    stored on the job, raises to fail it, and may call ``progress(message)``
+    to report how far it got.
+    """
+
+    def __init__(
+        self,
+        handler,
+        workers=4,
+        concurrency=8,
+        user_concurrency=2,
+        poll_interval=2,
+        stale_after=900,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.concurrency = concurrency
+        self.user_concurrency = user_concurrency
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._claim_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._threads = []
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    def start(self):
+        """Fail orphaned jobs, then start the workers. Safe to call again."""
+        with self._claim_lock:
+            if self._threads:
+                return
+            self.recover()
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"launch-worker-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, user, app_id, request):
+        """Queue a launch and wake a worker for it."""
+        job = LaunchJob.objects.create(user=user, app_id=app_id, request=request)
+        self._wake.set()
+        return job
+
+    def recover(self):
+        """
+        Fail running jobs whose worker went away, e.g. with a restarted pod.
+        They are not retried: the launch may already have created objects.
+        """
+        now = timezone.now()
+        orphaned = LaunchJob.objects.filter(
+            status=LaunchJob.RUNNING,
+            heartbeat__lt=now - timedelta(seconds=self.stale_after),
+        ).update(
+            status=LaunchJob.FAILED,
+            error="launch was interrupted",
+            finished=now,
+        )
+        if orphaned:
+            logger.warning(f"-- failed {orphaned} interrupted launch jobs")
+        return orphaned
+
+    def claim(self):
+        """Take the oldest queued job allowed by the limits, or None."""
+        with self._claim_lock:
+            running = LaunchJob.objects.filter(status=LaunchJob.RUNNING)
+            if running.count() >= self.concurrency:
+                return None
+            busy = (
+                running.values("user")
+                .annotate(running=Count("pk"))
+                .filter(running__gte=self.user_concurrency)
+                .values("user")
+            )
+            candidates = (
+                LaunchJob.objects.filter(status=LaunchJob.QUEUED)
+                .exclude(user__in=busy)
+                .order_by("created")
+                .values_list("pk", flat=True)
+            )
+            for pk in candidates[: self.workers]:
+                now = timezone.now()
+                claimed = LaunchJob.objects.filter(
+                    pk=pk, status=LaunchJob.QUEUED
+                ).update(
+                    status=LaunchJob.RUNNING,
+                    progress="starting",
+                    started=now,
+                    heartbeat=now,
+                )
+                if claimed:
+                    return LaunchJob.objects.select_related("user").get(pk=pk)
+            return None
+
+    def run(self, job):
+        """Run a claimed job and record how it ended."""
+
+        def progress(message):
+            LaunchJob.objects.filter(pk=job.pk).update(
+                progress=message, heartbeat=timezone.now()
+            )
+
+        started = timezone.now()
+        try:
+            result = self.handler(job, progress)
+        except Exception as e:
+            logger.exception(f"-- launch job {job.pk} for {job.app_id} failed")
+            fields = dict(status=LaunchJob.FAILED, error=str(e) or type(e).__name__)
+        else:
+            fields = dict(status=LaunchJob.SUCCEEDED, result=result, progress="done")
+        finished = timezone.now()
+        LaunchJob.objects.filter(pk=job.pk).update(finished=finished, **fields)
+        logger.info(
+            f"-- launch job {job.pk} for {job.app_id} {fields['status']} "
+            f"in {(finished - started).total_seconds():.1f}s"
+        )
+
+    def _run(self):
+        while True:
+            try:
+                job = self.claim()
+                if job is not None:
+                    self.run(job)
+                    continue
+            except Exception:
+                logger.exception("-- launch worker error")
+            finally:
+                close_old_connections()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
@@ -46,6 +46,7 @@ class Instance:
     host: InitVar[str]
     username: InitVar[str]
     is_ready: bool
+    is_hibernated: bool = False
     url: str = field(init=False)
     status: str = field(init=False)
     protocol: InitVar[str] = os.environ.get("ACCOUNT_DEFAULT_HTTP_PROTOCOL", "http")
@@ -60,7 +61,9 @@ class Instance:
         # Would be better to get this from tycho per app based on the pod status
         # in kubernetes. That could then be provided via the rest endpoint to a
         # client, or using sockets a notification on pod status change.
-        if self.aid is None or "None" in self.url:
+        if self.is_hibernated:
+            self.status = "hibernated"
+        elif self.aid is None or "None" in self.url:
             self.status = "starting"
         else:
             self.status = "ready"
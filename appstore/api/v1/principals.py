@@ -0,0 +1,21 @@
+"""
+Principals resolved per user, shared by every view that needs tokens.
+Entries are dropped when the user's social tokens change (see core.signals),
+which imports this module rather than the views.
+"""
+from django.conf import settings
+
+from tycho.tycho_utils import TTLCache
+
+principal_cache = TTLCache(ttl=settings.PRINCIPAL_CACHE_TTL)
+
+
+def cached_principal(request, kind, resolve):
+    user_id = request.user.pk
+    if user_id is None:
+        return resolve(request)
+    return principal_cache.get((kind, user_id), lambda: resolve(request))
+
+
+def forget_principal(user_id):
+    principal_cache.invalidate(lambda key, value: key[1] == user_id)
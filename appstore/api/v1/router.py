@@ -5,6 +5,7 @@ from .views import (
     UsersViewSet,
     LoginProviderViewSet,
     AppContextViewSet,
+    LaunchJobViewSet,
 )
 
 router = DefaultRouter()
@@ -13,5 +14,6 @@ router.register(r"providers", LoginProviderViewSet, basename="providers")
 router.register(r"instances", InstanceViewSet, basename="instances")
 router.register(r"users", UsersViewSet, basename="users")
 router.register(r"context", AppContextViewSet, basename="context")
+router.register(r"jobs", LaunchJobViewSet, basename="jobs")
 
 v1_urlpatterns = router.urls
@@ -1,6 +1,7 @@
 import logging
 
 from rest_framework import serializers
+from core.models import LaunchJob
 from .models import ResourceRequest
 from .validators import memory_format_validator
 
@@ -35,6 +36,7 @@ class InstanceSerializer(serializers.Serializer):
     ephemeralStorage = serializers.CharField()
     url = serializers.CharField()
     status = serializers.CharField()
+    is_hibernated = serializers.BooleanField(default=False)
 
 
 class AppDetailSerializer(serializers.Serializer):
@@ -66,6 +68,17 @@ class ResourceSerializer(serializers.Serializer):
         return ResourceRequest(**validated_data)
 
 
+class BulkLaunchSerializer(ResourceSerializer):
+    users = serializers.ListField(
+        child=serializers.CharField(), allow_empty=False, max_length=500
+    )
+
+    def create(self, validated_data):
+        validated_data = dict(validated_data)
+        validated_data.pop("users")
+        return super().create(validated_data)
+
+
 class InstanceSpecSerializer(serializers.Serializer):
     username = serializers.CharField()
     app_id = serializers.CharField()
@@ -77,6 +90,22 @@ class InstanceSpecSerializer(serializers.Serializer):
     protocol = serializers.CharField()
 
 
+class LaunchJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LaunchJob
+        fields = [
+            "id",
+            "app_id",
+            "status",
+            "progress",
+            "result",
+            "error",
+            "created",
+            "started",
+            "finished",
+        ]
+
+
 class InstanceIdentifierSerializer(serializers.Serializer):
     sid = serializers.CharField()
 
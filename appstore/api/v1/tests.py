@@ -1,17 +1,40 @@
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 from rest_framework.test import APIRequestFactory, force_authenticate
 
 
+from allauth.socialaccount.models import SocialAccount, SocialApp, SocialToken
+
+from core.models import IrodAuthorizedUser, LaunchJob, UserIdentityToken
+from tycho.context import NullContext, TychoContext
+from tycho.tests import RegistrySession
+
+from .jobs import LaunchDispatcher
+from .principals import principal_cache
 from .views import (
+    AppCatalog,
+    contextFactory,
+    get_social_tokens,
+    get_tycho,
+    launch_dispatcher,
+    launch_fits,
     AppViewSet,
     InstanceViewSet,
     UsersViewSet,
     LoginProviderViewSet,
     AppContextViewSet,
+    LaunchJobViewSet,
 )
 
 
@@ -48,11 +71,112 @@ class TestAppView(TestCase):
         response = list_view(api_request)
         self.assertEqual(response.status_code, 200)
 
+    def test_unchanged_app_list_is_not_modified(self):
+        user = User.objects.get(username=self.username)
+        list_view = self.view.as_view({"get": "list"})
+        api_request = self.factory.get("")
+        force_authenticate(api_request, user=user)
+        response = list_view(api_request)
+        etag = response["ETag"]
+
+        api_request = self.factory.get("", HTTP_IF_NONE_MATCH=etag)
+        force_authenticate(api_request, user=user)
+        response = list_view(api_request)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_unknown_app_is_not_found(self):
+        user = User.objects.get(username=self.username)
+        detail_view = self.view.as_view({"get": "retrieve"})
+        api_request = self.factory.get("")
+        force_authenticate(api_request, user=user)
+        response = detail_view(api_request, app_id="no-such-app")
+        self.assertEqual(response.status_code, 404)
+
     def tearDown(self):
         # Remove test user so it's no laying around with a known password.
         User.objects.get(username=self.username, is_superuser=True).delete()
 
 
+REGISTRY = """
+settings: {}
+contexts:
+  test:
+    apps:
+      a:
+        name: a
+        description: An app.
+        details: Its details.
+        count: 1
+        spec: http://registry/a/docker-compose.yaml
+        docs: http://registry/a/docs
+"""
+
+SPEC = """
+services:
+  a:
+    image: a
+    deploy:
+      resources:
+        limits:
+          cpus: '{cpus}'
+        reservations:
+          cpus: '{cpus}'
+"""
+
+
+class TestAppCatalog(TestCase):
+    def setUp(self):
+        self.session = RegistrySession({
+            "app-registry.yaml": REGISTRY,
+            "app-defaults.yaml": "{}",
+            "docker-compose.yaml": SPEC.format(cpus=1),
+        })
+        with mock.patch("tycho.context.CachedSession", return_value=self.session):
+            self.context = TychoContext(
+                product="test", tycho_config_url="http://registry/main"
+            )
+
+    def test_changed_spec_rebuilds_catalog(self):
+        catalog = AppCatalog()
+        with mock.patch("api.v1.views.get_tycho", return_value=self.context):
+            first = catalog.get()
+            self.assertIs(catalog.get(), first)
+        self.session.files["docker-compose.yaml"] = SPEC.format(cpus=2)
+        context = self.context.reload()
+        with mock.patch("api.v1.views.get_tycho", return_value=self.context):
+            self.assertIs(catalog.get(), first)
+        with mock.patch("api.v1.views.get_tycho", return_value=context):
+            second = catalog.get()
+        self.assertIsNot(second, first)
+        self.assertNotEqual(second.list.etag, first.list.etag)
+        self.assertEqual(second.apps["a"].content.count(b'"cpus":"2"'), 2)
+
+
+class TestCapacityView(TestCase):
+    def test_capacity_is_not_tracked_without_the_index(self):
+        user = User.objects.create_user("capacity_tester")
+        view = AppViewSet.as_view({"get": "capacity"}, **AppViewSet.capacity.kwargs)
+        api_request = APIRequestFactory().get("")
+        force_authenticate(api_request, user=user)
+        self.assertEqual(view(api_request).status_code, 404)
+
+
+class TestTychoContext(TestCase):
+    @override_settings(TYCHO_MODE="null")
+    def test_context_is_created_once_on_first_use(self):
+        def get(context_type, **kwargs):
+            contextFactory.contexts[context_type] = mock.Mock()
+            return contextFactory.contexts[context_type]
+
+        with mock.patch.dict(contextFactory.contexts, clear=True), \
+                mock.patch.object(contextFactory, "get", side_effect=get) as create:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                contexts = list(executor.map(lambda _: get_tycho(), range(8)))
+            create.assert_called_once()
+            self.assertEqual(len({id(context) for context in contexts}), 1)
+
+
 class TestInstanceView(TestCase):
     def setUp(self):
         self.username = "instance_api_tester"
@@ -77,12 +201,209 @@ class TestInstanceView(TestCase):
         response = list_view(api_request)
         self.assertEqual(response.status_code, 200)
 
+    def test_only_operators_can_list_all_instances(self):
+        user = User.objects.create_user("instance_api_regular")
+        all_view = self.view.as_view(
+            {"get": "all_instances"}, **self.view.all_instances.kwargs
+        )
+        api_request = self.factory.get("")
+        force_authenticate(api_request, user=user)
+        response = all_view(api_request)
+        self.assertEqual(response.status_code, 403)
+
+    def test_list_all_instances_filters_page(self):
+        user = User.objects.get(username=self.username)
+        all_view = self.view.as_view(
+            {"get": "all_instances"}, **self.view.all_instances.kwargs
+        )
+        api_request = self.factory.get("", {"ready": "true", "app": "jupyter-ds"})
+        force_authenticate(api_request, user=user)
+        response = all_view(api_request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("next", response.data)
+        self.assertTrue(response.data["results"])
+        for record in response.data["results"]:
+            self.assertTrue(record["is_ready"])
+            self.assertEqual(record["app_id"], "jupyter-ds")
+
+    def test_list_all_instances_rejects_bad_age(self):
+        user = User.objects.get(username=self.username)
+        all_view = self.view.as_view(
+            {"get": "all_instances"}, **self.view.all_instances.kwargs
+        )
+        api_request = self.factory.get("", {"min_age": "old"})
+        force_authenticate(api_request, user=user)
+        response = all_view(api_request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_all_instances_rejects_out_of_range_limit(self):
+        user = User.objects.get(username=self.username)
+        all_view = self.view.as_view(
+            {"get": "all_instances"}, **self.view.all_instances.kwargs
+        )
+        for limit in ["0", "-1", "501"]:
+            api_request = self.factory.get("", {"limit": limit})
+            force_authenticate(api_request, user=user)
+            response = all_view(api_request)
+            self.assertEqual(response.status_code, 400)
+
+    def test_bulk_launch_reports_each_user(self):
+        User.objects.create_user("bulk_student_a")
+        User.objects.create_user("bulk_student_b")
+        user = User.objects.get(username=self.username)
+        bulk_view = self.view.as_view(
+            {"post": "bulk_create"}, **self.view.bulk_create.kwargs
+        )
+        api_request = self.factory.post(
+            "",
+            {
+                "app_id": "jupyter-ds",
+                "cpus": 1,
+                "memory": "2000M",
+                "users": ["bulk_student_a", "bulk_student_b", "bulk_nobody"],
+            },
+            format="json",
+        )
+        force_authenticate(api_request, user=user)
+        response = bulk_view(api_request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["bulk_nobody"], {"error": "Unknown user."})
+        for username in ["bulk_student_a", "bulk_student_b"]:
+            self.assertEqual(response.data[username]["username"], username)
+            self.assertIn(f"/{username}/", response.data[username]["url"])
+
+    def test_bulk_launch_passes_each_users_irods_uid(self):
+        User.objects.create_user("bulk_irods_a")
+        User.objects.create_user("bulk_irods_b")
+        IrodAuthorizedUser.objects.create(user="bulk_irods_a", uid=30001)
+        user = User.objects.get(username=self.username)
+        bulk_view = self.view.as_view(
+            {"post": "bulk_create"}, **self.view.bulk_create.kwargs
+        )
+        api_request = self.factory.post(
+            "",
+            {
+                "app_id": "jupyter-ds",
+                "cpus": 1,
+                "memory": "2000M",
+                "users": ["bulk_irods_a", "bulk_irods_b"],
+            },
+            format="json",
+        )
+        force_authenticate(api_request, user=user)
+        with mock.patch.dict("os.environ", {"IROD_HOST": "irods"}), \
+                mock.patch("tycho.context.NullContext.start_many", autospec=True,
+                           side_effect=NullContext.start_many) as start_many:
+            response = bulk_view(api_request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["bulk_irods_b"], {"error": "No iRODS uid for this user."})
+        self.assertEqual(response.data["bulk_irods_a"]["username"], "bulk_irods_a")
+        principals = start_many.call_args[0][1]
+        self.assertEqual([(p.username, p.uid) for p in principals], [("bulk_irods_a", "30001")])
+        self.assertNotIn("NFSRODS_UID", os.environ)
+
+    def test_only_operators_can_bulk_launch(self):
+        user = User.objects.create_user("bulk_regular")
+        bulk_view = self.view.as_view(
+            {"post": "bulk_create"}, **self.view.bulk_create.kwargs
+        )
+        api_request = self.factory.post("", {}, format="json")
+        force_authenticate(api_request, user=user)
+        self.assertEqual(bulk_view(api_request).status_code, 403)
+
+    def test_hibernate_and_resume_own_instance(self):
+        user = User.objects.get(username=self.username)
+        owned = [mock.Mock(identifier="abc")]
+        for name, status in [("hibernate", "hibernated"), ("resume", "starting")]:
+            view = self.view.as_view({"post": name}, **getattr(self.view, name).kwargs)
+            api_request = self.factory.post("")
+            force_authenticate(api_request, user=user)
+            with mock.patch.object(self.view, "get_queryset", return_value=owned):
+                response = view(api_request, sid="abc")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data, {"sid": "abc", "status": status})
+                response = view(api_request, sid="someone-elses")
+                self.assertEqual(response.status_code, 404)
+
+    def test_launch_that_fits_no_node_is_rejected(self):
+        user = User.objects.get(username=self.username)
+        create_view = self.view.as_view({"post": "create"})
+        api_request = self.factory.post(
+            "", {"app_id": "jupyter-ds", "cpus": 1, "memory": "2000M"}, format="json"
+        )
+        force_authenticate(api_request, user=user)
+        with mock.patch("api.v1.views.launch_fits", return_value=False):
+            response = create_view(api_request)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertFalse(UserIdentityToken.objects.filter(user=user).exists())
+
+    def test_launch_fits_reads_kubernetes_quantities(self):
+        tycho = mock.Mock()
+        for memory, storage, expected in [
+            ("4Gi", "512Mi", (4 * 2**30, 512 * 2**20)),
+            ("2GB", "1.5G", (2 * 10**9, 15 * 10**8)),
+            ("2000M", None, (2 * 10**9, 0)),
+        ]:
+            reservations = {"cpus": "1", "memory": memory, "ephemeralStorage": storage}
+            launch_fits(tycho, {"deploy": {"resources": {"reservations": reservations}}})
+            self.assertEqual(
+                (tycho.fits.call_args.kwargs["memory"], tycho.fits.call_args.kwargs["ephemeral_storage"]),
+                expected,
+            )
+
     # TODO Add POST and DELETE
 
     def tearDown(self):
         User.objects.get(username=self.username, is_superuser=True).delete()
 
 
+class TestInstanceStreamView(TestCase):
+    def setUp(self):
+        self.username = "instance_stream_tester"
+        self.password = "Wq8#zL2r!nT5vK9@cY3p"
+        self.user = User.objects.create_superuser(
+            self.username, "instance-stream-test@renci-example.com", self.password
+        )
+
+    def test_anonymous_cannot_see_view(self):
+        response = self.client.get("/api/v1/instances/stream/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_logged_in_gets_snapshot(self):
+        """
+        Over WSGI the stream sends the snapshot and closes so the
+        client falls back to reconnecting.
+        """
+        self.client.force_login(self.user)
+        response = self.client.get("/api/v1/instances/stream/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join(response.streaming_content).decode()
+        self.assertIn("retry: ", body)
+        self.assertIn("event: snapshot\ndata: [", body)
+
+    @override_settings(LAUNCH_JOBS_ENABLED=True, TYCHO_MODE="null")
+    async def test_stream_creates_the_context_off_the_event_loop(self):
+        """
+        The first get_tycho creates the context and starts the launch
+        workers, whose recovery writes to the database. Under ASGI that must
+        not run on the event loop.
+        """
+        await sync_to_async(self.async_client.force_login)(self.user)
+        with mock.patch.dict(contextFactory.contexts, clear=True), \
+                mock.patch.object(launch_dispatcher, "start", side_effect=launch_dispatcher.recover) as start, \
+                mock.patch("api.v1.views.STREAM_MAX_SECONDS", 0):
+            response = await self.async_client.get("/api/v1/instances/stream/")
+            body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        start.assert_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("event: snapshot\ndata: [", body)
+
+    def tearDown(self):
+        User.objects.get(username=self.username, is_superuser=True).delete()
+
+
 class TestUserView(TestCase):
     def setUp(self):
         self.username = "user_api_tester"
@@ -153,3 +474,165 @@ class TestAppContextView(TestCase):
         list_view = view.as_view({"get": "list"})
         response = list_view(factory.get(""))
         self.assertEqual(response.status_code, 200)
+
+
+class TestPrincipalCache(TestCase):
+    def setUp(self):
+        principal_cache.invalidate()
+        self.user = User.objects.create_user("principal_cache_tester")
+        app = SocialApp.objects.create(provider="github", name="github")
+        account = SocialAccount.objects.create(user=self.user, provider="github", uid="1")
+        self.token = SocialToken.objects.create(app=app, account=account, token="first")
+        self.factory = APIRequestFactory()
+
+    def request(self):
+        request = self.factory.get("")
+        request.user = self.user
+        return request
+
+    def test_tokens_are_resolved_once_per_user(self):
+        before = principal_cache.stats()
+        first = get_social_tokens(self.request())
+        with self.assertNumQueries(0):
+            self.assertEqual(get_social_tokens(self.request()), first)
+        after = principal_cache.stats()
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertEqual(after["hits"] - before["hits"], 1)
+
+    def test_token_change_invalidates_principal(self):
+        get_social_tokens(self.request())
+        self.token.token = "second"
+        self.token.save()
+        with CaptureQueriesContext(connection) as queries:
+            get_social_tokens(self.request())
+        self.assertGreater(len(queries), 0)
+
+
+class TestSocialTokenLookup(TestCase):
+    def setUp(self):
+        principal_cache.invalidate()
+        self.app = SocialApp.objects.create(provider="github", name="github")
+        self.factory = APIRequestFactory()
+
+    def add_user(self, username):
+        user = User.objects.create_user(username)
+        account = SocialAccount.objects.create(user=user, provider="github", uid=username)
+        SocialToken.objects.create(
+            app=self.app, account=account, token=f"{username}-token", token_secret="secret"
+        )
+        return user
+
+    def lookup(self, user):
+        principal_cache.invalidate()
+        request = self.factory.get("")
+        request.user = user
+        return get_social_tokens(request)
+
+    def test_lookup_finds_the_users_token(self):
+        self.add_user("token_owner_a")
+        user = self.add_user("token_owner_b")
+        self.assertEqual(
+            self.lookup(user), ("token_owner_b", "token_owner_b-token", "secret")
+        )
+
+    def test_query_count_does_not_grow_with_table(self):
+        """
+        The old lookup walked every token, costing queries per row.
+        """
+        user = self.add_user("token_owner_first")
+        with self.assertNumQueries(1):
+            self.lookup(user)
+        SocialToken.objects.bulk_create(
+            SocialToken(
+                app=self.app,
+                account=SocialAccount.objects.create(
+                    user=User.objects.create_user(f"token_filler_{i}"),
+                    provider="github",
+                    uid=f"filler-{i}",
+                ),
+                token=f"filler-{i}",
+            )
+            for i in range(200)
+        )
+        last = self.add_user("token_owner_last")
+        with self.assertNumQueries(1):
+            self.assertEqual(self.lookup(last)[1], "token_owner_last-token")
+
+    def test_user_without_token(self):
+        user = User.objects.create_user("token_less")
+        self.assertEqual(self.lookup(user), ("token_less", None, None))
+
+
+class TestLaunchJobs(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("launch_job_tester")
+        self.factory = APIRequestFactory()
+
+    @override_settings(LAUNCH_JOBS_ENABLED=True)
+    def test_create_queues_a_job(self):
+        create_view = InstanceViewSet.as_view({"post": "create"})
+        api_request = self.factory.post(
+            "", {"app_id": "jupyter-ds", "cpus": 1, "memory": "2000M"}, format="json"
+        )
+        force_authenticate(api_request, user=self.user)
+        with mock.patch.object(launch_dispatcher, "start") as start:
+            response = create_view(api_request)
+        start.assert_called_once()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], LaunchJob.QUEUED)
+        self.assertTrue(response["Location"].endswith(f"/api/v1/jobs/{response.data['id']}/"))
+
+        detail_view = LaunchJobViewSet.as_view({"get": "retrieve"})
+        api_request = self.factory.get("")
+        force_authenticate(api_request, user=self.user)
+        response = detail_view(api_request, pk=response.data["id"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["app_id"], "jupyter-ds")
+
+    def test_users_only_see_their_jobs(self):
+        other = User.objects.create_user("launch_job_other")
+        job = LaunchJob.objects.create(user=other, app_id="jupyter-ds")
+        detail_view = LaunchJobViewSet.as_view({"get": "retrieve"})
+        api_request = self.factory.get("")
+        force_authenticate(api_request, user=self.user)
+        self.assertEqual(detail_view(api_request, pk=job.pk).status_code, 404)
+
+    def test_claims_respect_user_and_global_limits(self):
+        other = User.objects.create_user("launch_job_other")
+        dispatcher = LaunchDispatcher(None, concurrency=2, user_concurrency=1)
+        first = dispatcher.enqueue(self.user, "jupyter-ds", {})
+        dispatcher.enqueue(self.user, "jupyter-ds", {})
+        third = dispatcher.enqueue(other, "jupyter-ds", {})
+        dispatcher.enqueue(other, "jupyter-ds", {})
+        self.assertEqual(dispatcher.claim().pk, first.pk)
+        """ The user is at their limit, so the other user's job goes next. """
+        self.assertEqual(dispatcher.claim().pk, third.pk)
+        """ Two running jobs is the global limit. """
+        self.assertIsNone(dispatcher.claim())
+
+    def test_run_records_result_and_failure(self):
+        def handler(job, progress):
+            progress("launching")
+            if job.app_id == "broken":
+                raise ValueError("no such app")
+            return {"sid": "abc"}
+
+        dispatcher = LaunchDispatcher(handler)
+        for app_id in ("jupyter-ds", "broken"):
+            dispatcher.enqueue(self.user, app_id, {})
+            dispatcher.run(dispatcher.claim())
+        done = LaunchJob.objects.get(app_id="jupyter-ds")
+        self.assertEqual((done.status, done.result), (LaunchJob.SUCCEEDED, {"sid": "abc"}))
+        failed = LaunchJob.objects.get(app_id="broken")
+        self.assertEqual((failed.status, failed.error), (LaunchJob.FAILED, "no such app"))
+
+    def test_recover_fails_orphaned_jobs(self):
+        dispatcher = LaunchDispatcher(None, stale_after=60)
+        job = dispatcher.enqueue(self.user, "jupyter-ds", {})
+        dispatcher.claim()
+        self.assertEqual(dispatcher.recover(), 0)
+        LaunchJob.objects.filter(pk=job.pk).update(
+            heartbeat=timezone.now() - timedelta(seconds=120)
+        )
+        self.assertEqual(dispatcher.recover(), 1)
+        self.assertEqual(LaunchJob.objects.get(pk=job.pk).status, LaunchJob.FAILED)
@@ -1,26 +1,43 @@
-import functools
+import asyncio
+import hashlib
+import json
 import logging
+import math
 from dataclasses import asdict
-import time
+from datetime import datetime
 import os
 import re
+import threading
+import time
+
+from asgiref.sync import sync_to_async
 
 from django.conf import settings
-from django.contrib.contenttypes.models import ContentType
-from django.contrib.auth import logout
+from django.contrib.auth import get_user_model, logout
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
 
 
 from rest_framework import status as drf_status, viewsets, serializers
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
+from rest_framework.reverse import reverse
 from rest_framework import status
 
 from allauth import socialaccount
+from allauth.socialaccount.models import SocialToken
+
+from kubernetes.utils import parse_quantity
 
 from tycho.context import ContextFactory, Principal
-from core.models import IrodAuthorizedUser, UserIdentityToken
+from tycho.exceptions import TychoException
+from core.models import IrodAuthorizedUser, LaunchJob, UserIdentityToken
 
+from .jobs import LaunchDispatcher
+from .principals import cached_principal
 from .models import Instance, InstanceSpec, App, LoginProvider, Resources, User
 from .serializers import (
     InstanceSerializer,
@@ -34,6 +51,8 @@ from .serializers import (
     AppContextSerializer,
     InstanceModifySerializer,
     EmptySerializer,
+    LaunchJobSerializer,
+    BulkLaunchSerializer,
 )
 
 from urllib.parse import urljoin
@@ -45,23 +64,46 @@ logger = logging.getLogger(__name__)
 """
 Tycho context for application management.
 Manages application metadata, discovers and invokes TychoClient, etc.
+The context is created by the first call to get_tycho, so management commands
+and worker startup do not load the registry or connect to the cluster.
 """
 contextFactory = ContextFactory()
-if settings.EXTERNAL_TYCHO_APP_REGISTRY_ENABLED == "false":
-    logger.debug (f"-- appstore.appstore.core.views.py: EXTERNAL_TYCHO_APP_REGISTRY_ENABLED is 'false', using Tycho built-in app registry file")
-    tycho = contextFactory.get(
-            context_type=settings.TYCHO_MODE, product=settings.APPLICATION_BRAND
-    )
-else:
+tycho_lock = threading.Lock()
+
+
+def create_tycho():
+    if settings.EXTERNAL_TYCHO_APP_REGISTRY_ENABLED == "false":
+        logger.debug (f"-- appstore.appstore.core.views.py: EXTERNAL_TYCHO_APP_REGISTRY_ENABLED is 'false', using Tycho built-in app registry file")
+        return contextFactory.get(
+                context_type=settings.TYCHO_MODE, product=settings.APPLICATION_BRAND
+        )
     logger.debug (f"-- appstore.appstore.core.views.py: EXTERNAL_TYCHO_APP_REGISTRY_REPO is {settings.EXTERNAL_TYCHO_APP_REGISTRY_REPO}, EXTERNAL_TYCHO_APP_REGISTRY_BRANCH is {settings.EXTERNAL_TYCHO_APP_REGISTRY_BRANCH}, using external app registry file")
     # urljoin might not work as planned if the first part doesn't end with a slash.
     tycho_config_url = urljoin(settings.EXTERNAL_TYCHO_APP_REGISTRY_REPO, settings.EXTERNAL_TYCHO_APP_REGISTRY_BRANCH)
     logger.debug (f"tycho_config_url: {tycho_config_url}")
-    tycho = contextFactory.get(
+    return contextFactory.get(
             context_type=settings.TYCHO_MODE, product=settings.APPLICATION_BRAND, tycho_config_url=tycho_config_url
     )
 
 
+def get_tycho():
+    """
+    The current generation of the tycho context. Registry reloads replace it,
+    so fetch it once per request instead of holding on to it.
+
+    The launch workers are started here too, rather than at import, so that
+    management commands such as migrate neither query the job table nor run
+    worker threads.
+    """
+    if settings.TYCHO_MODE not in contextFactory.contexts:
+        with tycho_lock:
+            if settings.TYCHO_MODE not in contextFactory.contexts:
+                create_tycho()
+    if settings.LAUNCH_JOBS_ENABLED and not launch_dispatcher.started:
+        launch_dispatcher.start()
+    return contextFactory.current(settings.TYCHO_MODE)
+
+
 def get_nfs_uid(username):
     irod_auth_user = IrodAuthorizedUser.objects.get(user=username)
     if irod_auth_user is not None:
@@ -176,6 +218,69 @@ def validate_request_resources(request_cpu, request_gpu, request_memory, request
         )
 
 
+def check_request_resources(tycho, app_id, resource_request):
+    """
+    Check a resource request against the app's limits and reservations.
+    Returns a 400 response when it is out of bounds, otherwise None.
+    """
+    app_data = tycho.apps.get(app_id)
+    spec = tycho.get_definition(app_id)
+    limits, reservations = parse_spec_resources(app_id, spec, app_data)
+    gpu_reservations = search_for_gpu_reservation(reservations)
+    gpu_limits = search_for_gpu_reservation(limits)
+
+    minimum_resources = Resources(
+        reservations.get("cpus", 0),
+        gpu_reservations,
+        reservations.get("memory", 0),
+        reservations.get("ephemeralStorage", 0)
+    )
+    maximum_resources = Resources(
+        limits.get("cpus", 0),
+        gpu_limits,
+        limits.get("memory", 0),
+        limits.get("ephemeralStorage", 0)
+    )
+
+    request_cpu = float(resource_request.cpus)
+    request_gpu = int(resource_request.gpus)
+    request_memory = to_bytes(resource_request.memory)
+    request_ephemeral = to_bytes(resource_request.ephemeralStorage)
+
+    return validate_request_resources(request_cpu, request_gpu, request_memory, request_ephemeral, minimum_resources, maximum_resources)
+
+
+def launch_fits(tycho, resources):
+    """
+    Check a launch's reservations against the capacity tycho tracks for each
+    node. Returns True or False, or None when capacity is not tracked.
+    """
+    reservations = resources["deploy"]["resources"]["reservations"]
+    return tycho.fits(
+        cpus=float(reservations.get("cpus") or 0),
+        memory=quantity_bytes(reservations.get("memory") or 0),
+        ephemeral_storage=quantity_bytes(reservations.get("ephemeralStorage") or 0),
+        gpus=int(reservations.get("gpus") or 0),
+    )
+
+
+def quantity_bytes(value):
+    """
+    Convert a memory or storage reservation into bytes the way Kubernetes reads
+    it, e.g. "4Gi", "512Mi" or "2G". Compose style byte units such as "2GB" are
+    read as their decimal Kubernetes equivalent.
+    """
+    try:
+        return math.ceil(parse_quantity(value))
+    except ValueError:
+        match = re.fullmatch(r"([0-9.]+)\s*([kmgt]?)b", str(value).strip(), re.IGNORECASE)
+        if match is None:
+            raise
+        number, unit = match.groups()
+        suffix = {"": "", "k": "k", "m": "M", "g": "G", "t": "T"}[unit.lower()]
+        return math.ceil(parse_quantity(number + suffix))
+
+
 def to_bytes(memory):
     """
     Convert memory string into bytes
@@ -223,22 +328,23 @@ def to_bytes(memory):
     return number * conversion
 
 
-# TODO fetch by user instead of iterating all?
-# sanitize input to avoid injection.
-def get_social_tokens(request):
+def lookup_social_tokens(request):
+    """
+    Find the user's social token with one query, using the foreign key
+    indexes on token.account and account.user.
+    """
     username = request.user
-    social_token_model_objects = (
-        ContentType.objects.get(model="socialtoken").model_class().objects.all()
-    )
     access_token = None
     refresh_token = None
-    for obj in social_token_model_objects:
-        if obj.account.user.username == username:
-            access_token = obj.token
-            refresh_token = obj.token_secret if obj.token_secret else None
-            break
-        else:
-            continue
+    social_token = (
+        SocialToken.objects.select_related("account__user")
+        .filter(account__user_id=request.user.pk)
+        .order_by("pk")
+        .first()
+    )
+    if social_token is not None:
+        access_token = social_token.token
+        refresh_token = social_token.token_secret if social_token.token_secret else None
     # with DRF and the user interaction in social auth we need username to be a string
     # when it is passed to `tycho.start` otherwise it will be a `User` object and there
     # will be a serialization failure from this line of code:
@@ -249,9 +355,232 @@ def get_social_tokens(request):
     return str(username), access_token, refresh_token
 
 
+def get_social_tokens(request):
+    return cached_principal(request, "social", lookup_social_tokens)
+
+
 def get_tokens(request):
-    username = request.user.get_username()
-    return username, None, None
+    return cached_principal(
+        request, "username", lambda request: (request.user.get_username(), None, None)
+    )
+
+def build_app(tycho, app_id, app_data):
+    """
+    Combine an app's registry entry with the resources declared in its spec.
+    """
+    spec = tycho.get_definition(app_id)
+    limits, reservations = parse_spec_resources(app_id, spec, app_data)
+
+    # TODO GPUs can be defined differently in docker-compose than in the
+    # submission from Tycho to k8s, how do we want to handle this?
+    # https://github.com/compose-spec/compose-spec/blob/master/deploy.md
+    # #capabilities
+    # https://github.com/helxplatform/tycho/search?q=gpu
+    gpu_reservations = search_for_gpu_reservation(reservations)
+    gpu_limits = search_for_gpu_reservation(limits)
+    return App(
+        app_data["name"],
+        app_id,
+        app_data["description"],
+        app_data["details"],
+        app_data["docs"],
+        app_data["spec"],
+        app_data["count"],
+        asdict(
+            Resources(
+                reservations.get("cpus", 0),
+                gpu_reservations,
+                reservations.get("memory", 0),
+                reservations.get("ephemeralStorage", 0),
+            )
+        ),
+        asdict(
+            Resources(
+                limits.get("cpus", 0),
+                gpu_limits,
+                limits.get("memory", 0),
+                limits.get("ephemeralStorage", 0),
+            )
+        ),
+    )
+
+
+class RenderedDocument:
+    """
+    A response body rendered once, served by ETag.
+    """
+
+    def __init__(self, data):
+        self.content = JSONRenderer().render(data)
+        self.etag = quote_etag(hashlib.sha1(self.content).hexdigest())
+
+    def respond(self, request):
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if if_none_match:
+            etags = [etag.removeprefix("W/") for etag in parse_etags(if_none_match)]
+            if "*" in etags or self.etag in etags:
+                response = HttpResponseNotModified()
+                response["ETag"] = self.etag
+                return response
+        response = HttpResponse(self.content, content_type="application/json")
+        response["ETag"] = self.etag
+        return response
+
+
+class CatalogSnapshot:
+    """
+    The app list and every app's details, rendered for one generation of
+    the tycho context.
+    """
+
+    def __init__(self, generation, apps, details, complete):
+        self.generation = generation
+        self.built = time.monotonic()
+        self.complete = complete
+        self.list = RenderedDocument(apps)
+        self.apps = {app_id: RenderedDocument(data) for app_id, data in details.items()}
+
+    def respond(self, request):
+        return self.list.respond(request)
+
+
+class AppCatalog:
+    """
+    Build the app catalog once per registry generation instead of on every request.
+
+    Parsing specs and serializing every app is the bulk of the cost of /apps/, and
+    the result only changes when the registry, the app defaults or a fetched spec
+    changes. Tycho checks those every TYCHO_REGISTRY_REFRESH seconds and swaps in a
+    new context generation when one did, so a changed spec shows up here after the
+    next refresh. A catalog missing apps whose specs could not be loaded is rebuilt
+    after retry_seconds so transient fetch failures heal.
+    """
+
+    def __init__(self, retry_seconds=60):
+        self.retry_seconds = retry_seconds
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        snapshot = self.snapshot
+        if snapshot is None or not self.is_current(snapshot):
+            with self.lock:
+                snapshot = self.snapshot
+                if snapshot is None or not self.is_current(snapshot):
+                    snapshot = self.build()
+                    self.snapshot = snapshot
+        return snapshot
+
+    def is_current(self, snapshot):
+        tycho = get_tycho()
+        if snapshot.generation != (id(tycho), tycho.generation):
+            return False
+        return snapshot.complete or time.monotonic() - snapshot.built < self.retry_seconds
+
+    def build(self):
+        tycho = get_tycho()
+        generation = (id(tycho), tycho.generation)
+        apps = {}
+        details = {}
+        complete = True
+        for app_id, app_data in sorted(tycho.apps.items()):
+            try:
+                app = asdict(build_app(tycho, app_id, app_data))
+            except Exception as e:
+                logger.error(f"Could not parse {app_id}...continuing. {e}")
+                complete = False
+                continue
+            apps[app_id] = app
+            serializer = AppDetailSerializer(data=app)
+            serializer.is_valid()
+            if serializer.errors:
+                logger.error(
+                    f"Serialization errors detected:\n{serializer.errors}\nWill attempt "
+                    f"to provide data to user."
+                )
+            details[app_id] = serializer.validated_data
+        logger.debug(f"apps:\n${apps}")
+        return CatalogSnapshot(generation, apps, details, complete)
+
+
+app_catalog = AppCatalog()
+
+
+def start_instance(tycho, principal, identity_token, app_id, resources, host, env):
+    """
+    Start an app for a principal and describe the instance. An instance that
+    cannot be described is deleted rather than left running untracked.
+    """
+    system = tycho.start(principal, app_id, resources, host, env)
+    return track_instance(tycho, system, principal, identity_token, app_id, resources, host)
+
+
+def track_instance(tycho, system, principal, identity_token, app_id, resources, host):
+    """
+    Describe a started system as the instance spec returned to clients.
+    """
+    identity_token.consumer_id = identity_token.compute_app_consumer_id(app_id, system.identifier)
+    identity_token.save()
+
+    s = InstanceSpec(
+        principal.username,
+        app_id,
+        tycho.apps[app_id]["name"],
+        host,
+        resources,
+        system.services[0].ip_address,
+        system.services[0].port,
+        system.services[0].identifier,
+        system.identifier,
+    )
+    # TODO: better status capture from Tycho on submission
+    serializer = InstanceSpecSerializer(data=asdict(s))
+    try:
+        serializer.is_valid(raise_exception=True)
+    except serializers.ValidationError:
+        # Delete invalid instance configuration that we won't be tracking
+        # for the user.
+        tycho.delete({"name": system.services[0].identifier})
+        raise
+    return serializer.validated_data
+
+
+def run_launch_job(job, progress):
+    """
+    Launch the app described by a queued job, for the launch workers.
+    """
+    launch = job.request
+    identity_token = UserIdentityToken.objects.get(pk=launch["identity_token"])
+    principal = Principal(
+        job.user.get_username(), identity_token.token, None, uid=launch.get("nfs_uid")
+    )
+    tycho = get_tycho()
+    deadline = time.monotonic() + settings.LAUNCH_CAPACITY_WAIT
+    while launch_fits(tycho, launch["resources"]) is False:
+        if time.monotonic() > deadline:
+            raise TychoException("No node has room for this launch.")
+        progress("waiting for cluster capacity")
+        time.sleep(5)
+    progress("launching")
+    instance = start_instance(
+        tycho,
+        principal,
+        identity_token,
+        job.app_id,
+        launch["resources"],
+        launch["host"],
+        launch["env"],
+    )
+    return dict(instance)
+
+
+launch_dispatcher = LaunchDispatcher(
+    run_launch_job,
+    workers=settings.LAUNCH_JOB_WORKERS,
+    concurrency=settings.LAUNCH_JOB_CONCURRENCY,
+    user_concurrency=settings.LAUNCH_JOB_USER_CONCURRENCY,
+)
+
 
 class AppViewSet(viewsets.GenericViewSet):
     """
@@ -278,8 +607,25 @@ class AppViewSet(viewsets.GenericViewSet):
                        app_id. Similar to the list method, it parses resource specifications 
                        and returns them in a structured format. 
 
+    - Cluster Capacity:
+        - URL: /apps/capacity/
+        - HTTP Method: GET
+        - Method: capacity
+        - Description: Allocatable and still available CPU, memory, ephemeral
+                       storage and GPUs of each node, with the largest and total
+                       available. 404 unless TYCHO_CAPACITY_INDEX is enabled.
+
+    - Image Pre-pull Status (operators):
+        - URL: /apps/prepull/
+        - HTTP Method: GET
+        - Method: prepull
+        - Description: For each node, whether each app image is pulled,
+                       pulling or failed.
+
     Note:
     - The app_id is used as a lookup field.
+    - Responses are served from a prebuilt catalog snapshot with an ETag and
+      honor If-None-Match with 304 Not Modified.
     - The ViewSet interacts with an external system named 'tycho' to fetch app definitions 
       and other relevant data. There are also utility functions like 'parse_spec_resources' 
       and 'search_for_gpu_reservation' that are presumably defined elsewhere in the codebase.
@@ -289,7 +635,7 @@ class AppViewSet(viewsets.GenericViewSet):
     lookup_url_kwarg = "app_id"
 
     def get_queryset(self):
-        return tycho.apps
+        return get_tycho().apps
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -301,109 +647,41 @@ class AppViewSet(viewsets.GenericViewSet):
         """
         Provide all available apps.
         """
-        apps = {}
-
-        for app_id, app_data in self.get_queryset().items():
-            try:
-                spec = tycho.get_definition(app_id)
-                limits, reservations = parse_spec_resources(app_id, spec, app_data)
-
-                # TODO GPUs can be defined differently in docker-compose than in the
-                # submission from Tycho to k8s, how do we want to handle this?
-                # https://github.com/compose-spec/compose-spec/blob/master/deploy.md
-                # #capabilities
-                # https://github.com/helxplatform/tycho/search?q=gpu
-                gpu_reservations = search_for_gpu_reservation(reservations)
-                gpu_limits = search_for_gpu_reservation(limits)
-                spec = App(
-                    app_data["name"],
-                    app_id,
-                    app_data["description"],
-                    app_data["details"],
-                    app_data["docs"],
-                    app_data["spec"],
-                    app_data["count"],
-                    asdict(
-                        Resources(
-                            reservations.get("cpus", 0),
-                            gpu_reservations,
-                            reservations.get("memory", 0),
-                            reservations.get("ephemeralStorage", 0),
-                        )
-                    ),
-                    asdict(
-                        Resources(
-                            limits.get("cpus", 0),
-                            gpu_limits,
-                            limits.get("memory", 0),
-                            limits.get("ephemeralStorage", 0),
-                        )
-                    ),
-                )
-
-                apps[app_id] = asdict(spec)
-            except Exception as e:
-                logger.error(f"Could not parse {app_id}...continuing. {e}")
-                continue
+        return app_catalog.get().respond(request)
 
-        apps = {key: value for key, value in sorted(apps.items())}
-        logging.debug(f"apps:\n${apps}")
-        serializer = self.get_serializer(data=apps)
-        serializer.is_valid()
-        if serializer.errors:
-            logger.error(
-                f"Serialization errors detected:\n{serializer.errors}\nWill attempt "
-                f"to provide data to user."
+    @action(detail=False, methods=["get"])
+    def capacity(self, request):
+        """
+        Report the resources still available on each node.
+        """
+        capacity = get_tycho().capacity()
+        if capacity is None:
+            return Response(
+                {"message": "Cluster capacity is not tracked."},
+                status=drf_status.HTTP_404_NOT_FOUND,
             )
-        # TODO change this to serializer.data after discovery on nested object data
-        return Response(apps)
+        return Response(capacity)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="prepull",
+        permission_classes=[IsAdminUser],
+    )
+    def prepull(self, request):
+        """
+        Report which app images each node has pulled.
+        """
+        return Response(get_tycho().prepull_status())
 
     def retrieve(self, request, app_id=None):
         """
         Provide app details.
         """
-        app_data = self.get_queryset()[app_id]
-        spec = tycho.get_definition(app_id)
-        limits, reservations = parse_spec_resources(app_id, spec, app_data)
-
-        gpu_reservations = search_for_gpu_reservation(reservations)
-        gpu_limits = search_for_gpu_reservation(limits)
-
-        app = App(
-            app_data["name"],
-            app_id,
-            app_data["description"],
-            app_data["details"],
-            app_data["docs"],
-            app_data["spec"],
-            app_data["count"],
-            asdict(
-                Resources(
-                    reservations.get("cpus", 0),
-                    gpu_reservations,
-                    reservations.get("memory", 0),
-                    reservations.get("ephemeralStorage", 0)
-                )
-            ),
-            asdict(
-                Resources(
-                    limits.get("cpus", 0),
-                    gpu_limits,
-                    limits.get("memory", 0),
-                    limits.get("ephemeralStorage", 0)
-                )
-            )
-        )
-        logging.debug(f"app:\n${app}")
-
-        serializer = self.get_serializer(data=asdict(app))
-        serializer.is_valid()
-        if serializer.errors:
-            logger.error(
-                f"Serialization errors detected:\n{serializer.errors}\nWill attempt "
-                f"to provide data to user."
-            )
-        return Response(serializer.validated_data)
+        snapshot = app_catalog.get()
+        if app_id not in snapshot.apps:
+            return Response(status=drf_status.HTTP_404_NOT_FOUND)
+        return snapshot.apps[app_id].respond(request)
 
 
 class InstanceViewSet(viewsets.GenericViewSet):
@@ -420,6 +698,8 @@ class InstanceViewSet(viewsets.GenericViewSet):
         - URL: /instances/
         - HTTP Method: POST
         - Method: create
+        - Note: With LAUNCH_JOBS enabled the launch is queued and a 202 with
+                the job is returned; poll /jobs/{id}/ for the instance.
 
     - Retrieve (Detail) Endpoint:
         - URL: /instances/{sid}/
@@ -437,12 +717,46 @@ class InstanceViewSet(viewsets.GenericViewSet):
         - HTTP Method: PATCH
         - Method: partial_update
 
+    - Hibernate Instance:
+        - URL: /instances/{sid}/hibernate/
+        - HTTP Method: POST
+        - Method: hibernate
+        - Description: Scales the instance to zero replicas; its services and
+                       volumes are kept. Idle instances are also hibernated
+                       automatically with TYCHO_IDLE_HIBERNATE_AFTER.
+
+    - Resume Instance:
+        - URL: /instances/{sid}/resume/
+        - HTTP Method: POST
+        - Method: resume
+        - Description: Scales a hibernated instance back to one replica.
+
     - Check Instance Readiness:
         - URL: /instances/{sid}/is_ready/
         - HTTP Method: GET
         - Method: is_ready
         - Description: Checks if a specific user instance, identified by its 'sid', is ready.
 
+    - Bulk Launch (operators):
+        - URL: /instances/bulk/
+        - HTTP Method: POST
+        - Method: bulk_create
+        - Description: Starts one app for a list of users and returns a
+                       per-user map of instance specs or errors.
+
+    - Warm Pool Statistics (operators):
+        - URL: /instances/warm-pool/
+        - HTTP Method: GET
+        - Method: warm_pool
+        - Description: Size and hit rate of each app's pool of standby instances.
+
+    - List All Instances (operators):
+        - URL: /instances/all/
+        - HTTP Method: GET
+        - Method: all_instances
+        - Description: Pages through every user's instances on the cluster with
+                       cursor pagination and app, user, readiness and age filters.
+
     """
 
     lookup_field = "sid"
@@ -451,6 +765,8 @@ class InstanceViewSet(viewsets.GenericViewSet):
     def get_serializer_class(self):
         if self.action == "create":
             return ResourceSerializer
+        elif self.action == "bulk_create":
+            return BulkLaunchSerializer
         elif self.action == "destroy":
             return InstanceIdentifierSerializer
         elif self.action == "partial_update":
@@ -458,21 +774,21 @@ class InstanceViewSet(viewsets.GenericViewSet):
         else:
             return InstanceSerializer
 
-    @functools.lru_cache(maxsize=16, typed=False)
     def get_principal(self, request):
         """
         Retrieve principal information from Tycho based on the request
-        user.
+        user. Tokens are cached per user in principal_cache.
         """
         tokens = get_tokens(request)
         principal = Principal(*tokens)
         return principal
 
     def get_queryset(self):
-        status = tycho.status({"username": self.request.user.username})
+        status = get_tycho().status({"username": self.request.user.username})
         return status.services
 
     def get_instance(self, sid, username, host):
+        tycho = get_tycho()
         active = self.get_queryset()
 
         for instance in active:
@@ -493,7 +809,8 @@ class InstanceViewSet(viewsets.GenericViewSet):
                     app.get("app_id"),
                     host,
                     username,
-                    instance.is_ready
+                    instance.is_ready,
+                    is_hibernated=instance.is_hibernated,
                 )
         return None
 
@@ -501,6 +818,7 @@ class InstanceViewSet(viewsets.GenericViewSet):
         """
         Provide all active instances.
         """
+        tycho = get_tycho()
 
         active = self.get_queryset()
         principal = self.get_principal(request)
@@ -532,7 +850,8 @@ class InstanceViewSet(viewsets.GenericViewSet):
                         instance.total_util["ephemeralStorage"],
                         host,
                         username,
-                        instance.is_ready
+                        instance.is_ready,
+                        is_hibernated=instance.is_hibernated,
                     )
                     instances.append(asdict(inst))
         else:
@@ -547,6 +866,7 @@ class InstanceViewSet(viewsets.GenericViewSet):
         Given an app id and resources pass the information to Tycho to start
         a instance of an app.
         """
+        tycho = get_tycho()
         
         username = request.user.get_username()
 
@@ -559,41 +879,82 @@ class InstanceViewSet(viewsets.GenericViewSet):
         irods_enabled = os.environ.get("IROD_HOST",'').strip()
         # TODO update social query to fetch user.
 
-        #Need to set an environment variable for the IRODS UID
+        # The IRODS UID travels with the principal; launches run concurrently,
+        # so it cannot be shared through the process environment.
+        nfs_uid = None
         if irods_enabled != '':
-            nfs_id = get_nfs_uid(username)
-            os.environ["NFSRODS_UID"] = str(nfs_id)
+            nfs_uid = str(get_nfs_uid(username))
+
+        app_id = serializer.data["app_id"]
+        validation_response = check_request_resources(tycho, app_id, resource_request)
+        if validation_response is not None:
+            return validation_response
+
+        # Queued launches wait for capacity in the worker; direct launches that
+        # cannot be scheduled are turned away instead of left pending.
+        if not settings.LAUNCH_JOBS_ENABLED and launch_fits(tycho, resource_request.resources) is False:
+            return Response(
+                {"message": "No node has room for this launch. Try fewer resources or try again later."},
+                status=drf_status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "60"},
+            )
 
         # We will update this later once a system id for the app exists
         identity_token = UserIdentityToken.objects.create(user=request.user)
-        principal = Principal(username, identity_token.token, None)
+        principal = Principal(username, identity_token.token, None, uid=nfs_uid)
 
-        app_id = serializer.data["app_id"]
-        app_data = tycho.apps.get(app_id)
-        spec = tycho.get_definition(app_id)
-        limits, reservations = parse_spec_resources(app_id, spec, app_data)
-        gpu_reservations = search_for_gpu_reservation(reservations)
-        gpu_limits = search_for_gpu_reservation(limits)
+        env = {}
+        if settings.GRADER_API_URL is not None:
+            env["GRADER_API_URL"] = settings.GRADER_API_URL
 
-        minimum_resources = Resources(
-            reservations.get("cpus", 0),
-            gpu_reservations,
-            reservations.get("memory", 0),
-            reservations.get("ephemeralStorage", 0)
-        )
-        maximum_resources = Resources(
-            limits.get("cpus", 0),
-            gpu_limits,
-            limits.get("memory", 0),
-            limits.get("ephemeralStorage", 0)
-        )
+        host = get_host(request)
+        if settings.LAUNCH_JOBS_ENABLED:
+            job = launch_dispatcher.enqueue(
+                request.user,
+                app_id,
+                {
+                    "resources": resource_request.resources,
+                    "host": host,
+                    "env": env,
+                    "identity_token": identity_token.pk,
+                    "nfs_uid": nfs_uid,
+                },
+            )
+            return Response(
+                LaunchJobSerializer(job).data,
+                status=drf_status.HTTP_202_ACCEPTED,
+                headers={"Location": reverse("jobs-detail", args=[job.pk], request=request)},
+            )
 
-        request_cpu = float(resource_request.cpus)
-        request_gpu = int(resource_request.gpus)
-        request_memory = to_bytes(resource_request.memory)
-        request_ephemeral = to_bytes(resource_request.ephemeralStorage)
+        try:
+            instance = start_instance(
+                tycho, principal, identity_token, app_id, resource_request.resources, host, env
+            )
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=drf_status.HTTP_400_BAD_REQUEST)
+        return Response(instance)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk",
+        permission_classes=[IsAdminUser],
+    )
+    def bulk_create(self, request):
+        """
+        Start the same app for a roster of users, e.g. a class. The spec is
+        resolved once and the launches run concurrently. Returns a map of
+        each username to its instance spec, or to the error that stopped it.
+        """
+        tycho = get_tycho()
 
-        validation_response = validate_request_resources(request_cpu, request_gpu, request_memory, request_ephemeral, minimum_resources, maximum_resources)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        usernames = list(dict.fromkeys(serializer.validated_data["users"]))
+        resource_request = serializer.create(serializer.validated_data)
+        app_id = resource_request.app_id
+
+        validation_response = check_request_resources(tycho, app_id, resource_request)
         if validation_response is not None:
             return validation_response
 
@@ -601,45 +962,93 @@ class InstanceViewSet(viewsets.GenericViewSet):
         if settings.GRADER_API_URL is not None:
             env["GRADER_API_URL"] = settings.GRADER_API_URL
 
-        host = get_host(request)
-        system = tycho.start(principal, app_id, resource_request.resources, host, env)
+        users = {
+            user.get_username(): user
+            for user in get_user_model().objects.filter(username__in=usernames)
+        }
+        results = {
+            username: {"error": "Unknown user."}
+            for username in usernames
+            if username not in users
+        }
+        nfs_uids = {}
+        if os.environ.get("IROD_HOST", "").strip() != "":
+            for username in list(users):
+                try:
+                    nfs_uids[username] = str(get_nfs_uid(username))
+                except IrodAuthorizedUser.DoesNotExist:
+                    results[username] = {"error": "No iRODS uid for this user."}
+                    del users[username]
+        identity_tokens = {
+            username: UserIdentityToken.objects.create(user=user)
+            for username, user in users.items()
+        }
+        principals = [
+            Principal(username, identity_token.token, None, uid=nfs_uids.get(username))
+            for username, identity_token in identity_tokens.items()
+        ]
 
-        identity_token.consumer_id = identity_token.compute_app_consumer_id(app_id, system.identifier)
-        identity_token.save()
-
-        s = InstanceSpec(
-            principal.username,
+        host = get_host(request)
+        systems = tycho.start_many(
+            principals,
             app_id,
-            tycho.apps[app_id]["name"],
-            host,
             resource_request.resources,
-            system.services[0].ip_address,
-            system.services[0].port,
-            system.services[0].identifier,
-            system.identifier,
+            host,
+            env,
+            max_workers=settings.BULK_LAUNCH_WORKERS,
         )
-        # TODO: better status capture from Tycho on submission
-        if s:
-            serializer = InstanceSpecSerializer(data=asdict(s))
+        for principal in principals:
+            username = principal.username
+            system = systems[username]
+            if isinstance(system, Exception):
+                identity_tokens[username].delete()
+                results[username] = {"error": str(system)}
+                continue
             try:
-                serializer.is_valid(raise_exception=True)
-                return Response(serializer.validated_data)
-            except serializers.ValidationError:
-                # Delete invalid instance configuration that we won't be tracking
-                # for the user.
-                tycho.delete({"name": system.services[0].identifier})
-                return Response(
-                    serializer.errors, status=drf_status.HTTP_400_BAD_REQUEST
+                results[username] = track_instance(
+                    tycho,
+                    system,
+                    principal,
+                    identity_tokens[username],
+                    app_id,
+                    resource_request.resources,
+                    host,
                 )
-        else:
-            # Failed to construct a tracked instance, attempt to remove
-            # potentially created instance rather than leaving it hanging.
-            tycho.delete({"name": system.services[0].identifier})
-            identity_token.delete()
-            return Response(
-                {"message": "failed to submit app start."},
-                status=drf_status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+            except serializers.ValidationError as e:
+                results[username] = {"error": e.detail}
+        return Response(results)
+
+    @action(detail=True, methods=["post"])
+    def hibernate(self, request, sid=None):
+        """
+        Scale an idle instance to zero, keeping its services and storage.
+        """
+        return self.scale_instance(sid, get_tycho().hibernate, "hibernated")
+
+    @action(detail=True, methods=["post"])
+    def resume(self, request, sid=None):
+        """
+        Bring a hibernated instance back.
+        """
+        return self.scale_instance(sid, get_tycho().resume, "starting")
+
+    def scale_instance(self, sid, operation, status):
+        if not any(instance.identifier == sid for instance in self.get_queryset()):
+            return Response(status=drf_status.HTTP_404_NOT_FOUND)
+        operation(sid)
+        return Response({"sid": sid, "status": status})
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="warm-pool",
+        permission_classes=[IsAdminUser],
+    )
+    def warm_pool(self, request):
+        """
+        Report the size, hits, misses and hit rate of each app's warm pool.
+        """
+        return Response(get_tycho().warm_pool_stats())
 
     def retrieve(self, request, sid=None):
         """
@@ -660,6 +1069,58 @@ class InstanceViewSet(viewsets.GenericViewSet):
         logger.error(f"\n{sid} not found\n")
         return Response(status=drf_status.HTTP_404_NOT_FOUND)
     
+    @action(detail=False, methods=["get"], url_path="all", permission_classes=[IsAdminUser])
+    def all_instances(self, request):
+        """
+        Page through every instance on the cluster. Operators only.
+
+        Query parameters: cursor (from the previous page's "next"), limit
+        (1 to 500, default 100), and the filters user, app, ready
+        (true/false), min_age and max_age (seconds). The user filter is
+        applied by the cluster; the others to each page, so a page may hold
+        fewer than limit instances while "next" is still set.
+        """
+        params = request.query_params
+        try:
+            limit = int(params.get("limit", 100))
+            min_age = float(params["min_age"]) if "min_age" in params else None
+            max_age = float(params["max_age"]) if "max_age" in params else None
+        except ValueError:
+            return Response(
+                {"detail": "limit, min_age and max_age must be numbers."},
+                status=drf_status.HTTP_400_BAD_REQUEST,
+            )
+        # The cluster treats a limit of 0 as no limit at all.
+        if not 1 <= limit <= 500:
+            return Response(
+                {"detail": "limit must be between 1 and 500."},
+                status=drf_status.HTTP_400_BAD_REQUEST,
+            )
+        ready = params.get("ready")
+        app = params.get("app")
+        try:
+            page = get_tycho().status_page({
+                "username": params.get("user"),
+                "limit": limit,
+                "cursor": params.get("cursor"),
+            })
+        except TychoException as e:
+            return Response({"detail": str(e)}, status=drf_status.HTTP_400_BAD_REQUEST)
+
+        now = datetime.utcnow()
+        results = []
+        for record in page["result"]:
+            if app and record.get("app_id") != app:
+                continue
+            if ready is not None and bool(record.get("is_ready")) != (ready.lower() == "true"):
+                continue
+            if min_age is not None or max_age is not None:
+                age = (now - datetime.strptime(record["creation_time"], "%m-%d-%Y %H:%M:%S")).total_seconds()
+                if (min_age is not None and age < min_age) or (max_age is not None and age > max_age):
+                    continue
+            results.append(record)
+        return Response({"results": results, "next": page["cursor"]})
+
     @action(detail=True, methods=['get'])
     def is_ready(self, request, sid=None):
         principal = self.get_principal(request)
@@ -680,6 +1141,7 @@ class InstanceViewSet(viewsets.GenericViewSet):
         """
         Submit instance id (sid) to tycho for removal.
         """
+        tycho = get_tycho()
         serializer = self.get_serializer(data={"sid": sid})
         serializer.is_valid(raise_exception=True)
         logger.debug(f"\nDeleting: {sid}")
@@ -693,10 +1155,7 @@ class InstanceViewSet(viewsets.GenericViewSet):
                 consumer_id = UserIdentityToken.compute_app_consumer_id(serializer.validated_data["aid"], serializer.validated_data["sid"])
                 tokens = UserIdentityToken.objects.filter(user=request.user, consumer_id=consumer_id)
                 tokens.delete()
-                # TODO How can we avoid this sleep? Do we need an immediate response beyond
-                # a successful submission? Can we do a follow up with Web Sockets or SSE
-                # to the front end?
-                time.sleep(2)
+                # The frontend learns about the removal from the instance stream.
                 return Response(response)
             else: return Response(status=drf_status.HTTP_403_FORBIDDEN)
         else: return Response(status=drf_status.HTTP_404_NOT_FOUND)
@@ -705,6 +1164,7 @@ class InstanceViewSet(viewsets.GenericViewSet):
         """
         Pass labels, cpu and memory to tycho for patching a running deployment.
         """
+        tycho = get_tycho()
         serializer = InstanceModifySerializer(data=request.data)
         serializer.is_valid()
 
@@ -750,6 +1210,163 @@ class InstanceViewSet(viewsets.GenericViewSet):
         return Response(response)
 
 
+"""
+Instance event stream.
+Pushes creation, readiness and deletion of the user's instances to the browser
+as server-sent events, fed by the deployment watch behind tycho's status index.
+"""
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_MAX_SECONDS = 300
+STREAM_RETRY_MILLISECONDS = 5000
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_record(record):
+    """ Reduce a tycho status record to what the frontend tracks. """
+    return {
+        "sid": record.get("sid"),
+        "app_id": record.get("app_id"),
+        "creation_time": record.get("creation_time"),
+        "is_ready": bool(record.get("is_ready")),
+    }
+
+
+def stream_snapshot(username):
+    tycho = get_tycho()
+    return [
+        {
+            "sid": service.identifier,
+            "app_id": service.app_id,
+            "creation_time": service.creation_time,
+            "is_ready": bool(service.is_ready),
+        }
+        for service in tycho.status({"username": username}).services or []
+    ]
+
+
+async def instance_stream(request):
+    """
+    Stream the user's instance changes as server-sent events.
+
+    - URL: /instances/stream/
+    - HTTP Method: GET
+    - Description: Sends a `snapshot` event listing the user's instances,
+      then `created`, `readiness` and `deleted` events as they happen. The
+      stream ends after STREAM_MAX_SECONDS and the client reconnects. When
+      served over WSGI only the snapshot is sent, since holding the response
+      open would pin a worker thread.
+    """
+    user = await sync_to_async(
+        lambda: request.user if request.user.is_authenticated else None
+    )()
+    if user is None:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=drf_status.HTTP_403_FORBIDDEN,
+        )
+    username = user.username
+
+    if not isinstance(request, ASGIRequest):
+        snapshot = await sync_to_async(stream_snapshot)(username)
+
+        def once():
+            yield f"retry: {STREAM_RETRY_MILLISECONDS}\n\n"
+            yield format_event("snapshot", snapshot)
+
+        return event_stream_response(once())
+
+    # The first call may create the context and start the launch workers,
+    # which fetches the registry and writes to the database: keep it off the loop.
+    tycho = await sync_to_async(get_tycho)()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def listener(event_type, record, previous):
+        """ Runs on the informer thread; hand matching changes to the loop. """
+        if record.get("username") != username:
+            return
+        if event_type == "ADDED":
+            event = "created"
+        elif event_type == "DELETED":
+            event = "deleted"
+        elif previous is None or bool(previous.get("is_ready")) != bool(record.get("is_ready")):
+            event = "readiness"
+        else:
+            return
+        loop.call_soon_threadsafe(queue.put_nowait, (event, stream_record(record)))
+
+    async def events():
+        yield f"retry: {STREAM_RETRY_MILLISECONDS}\n\n"
+        try:
+            # Listen before taking the snapshot so nothing falls in between.
+            await sync_to_async(tycho.add_status_listener)(listener)
+        except TychoException as e:
+            logger.warning(f"-- instance stream unavailable: {e}")
+            yield format_event("snapshot", await sync_to_async(stream_snapshot)(username))
+            return
+        try:
+            yield format_event("snapshot", await sync_to_async(stream_snapshot)(username))
+            deadline = loop.time() + STREAM_MAX_SECONDS
+            while loop.time() < deadline:
+                timeout = min(STREAM_KEEPALIVE_SECONDS, deadline - loop.time())
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event, data)
+        finally:
+            await sync_to_async(tycho.remove_status_listener)(listener)
+
+    return event_stream_response(events())
+
+
+def event_stream_response(stream):
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+class LaunchJobViewSet(viewsets.GenericViewSet):
+    """
+    Report the progress of queued app launches.
+
+    Endpoints:
+    - List Endpoint:
+        - URL: /jobs/
+        - HTTP Method: GET
+        - Method: list
+        - Description: The user's launch jobs, newest first.
+
+    - Retrieve (Detail) Endpoint:
+        - URL: /jobs/{id}/
+        - HTTP Method: GET
+        - Method: retrieve
+        - Description: Status and progress of a job; once it succeeded the
+                       result holds the instance spec a synchronous launch
+                       would have returned.
+    """
+
+    serializer_class = LaunchJobSerializer
+
+    def get_queryset(self):
+        jobs = LaunchJob.objects.order_by("-created")
+        if self.request.user.is_staff:
+            return jobs
+        return jobs.filter(user=self.request.user)
+
+    def list(self, request):
+        serializer = self.get_serializer(self.get_queryset()[:50], many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, pk=None):
+        return Response(self.get_serializer(self.get_object()).data)
+
+
 class UsersViewSet(viewsets.GenericViewSet):
     """
     UsersViewSet - ViewSet for managing user information.
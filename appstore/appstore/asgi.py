@@ -0,0 +1,15 @@
+"""
+ASGI config for appstore project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serving the app through ASGI lets long lived responses such as the instance
+event stream wait on the event loop instead of holding a worker thread.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "appstore.settings")
+
+application = get_asgi_application()
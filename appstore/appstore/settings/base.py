@@ -48,6 +48,8 @@ TYCHO_MODE = os.environ.get("TYCHO_MODE", "null" if DEV_PHASE == "stub" else "li
 
 # Needs to be JSON-encoded since expressions can contain basically any character that would be used as a delimiter. 
 AUTO_WHITELIST_PATTERNS = json.loads(os.environ.get("AUTO_WHITELIST_PATTERNS", "[]"))
+# Seconds a user's positive whitelist decision is reused by the middleware.
+AUTHORIZATION_CACHE_TTL = int(os.environ.get("AUTHORIZATION_CACHE_TTL", 60))
 
 # Variables used for an external Tycho app registry.
 # ToDo: Consider setting the default value of TYCHO_APP_REGISTRY_REPO to 
@@ -134,6 +136,18 @@ MIDDLEWARE = [
 GRADER_API_URL = os.environ.get("GRADER_API_URL", None)
 
 SESSION_IDLE_TIMEOUT = int(os.environ.get("DJANGO_SESSION_IDLE_TIMEOUT", 300))
+# Seconds a user's resolved principal (username and tokens) is reused.
+PRINCIPAL_CACHE_TTL = int(os.environ.get("PRINCIPAL_CACHE_TTL", 300))
+# Queue launches as jobs run by background workers instead of inside the request.
+LAUNCH_JOBS_ENABLED = os.environ.get("LAUNCH_JOBS", "false").lower() == "true"
+LAUNCH_JOB_WORKERS = int(os.environ.get("LAUNCH_JOB_WORKERS", 4))
+LAUNCH_JOB_CONCURRENCY = int(os.environ.get("LAUNCH_JOB_CONCURRENCY", 8))
+LAUNCH_JOB_USER_CONCURRENCY = int(os.environ.get("LAUNCH_JOB_USER_CONCURRENCY", 2))
+# Launches in flight at once for a bulk (classroom) launch.
+BULK_LAUNCH_WORKERS = int(os.environ.get("BULK_LAUNCH_WORKERS", 16))
+# Seconds a queued launch waits for a node with room before it fails, when
+# tycho tracks cluster capacity (TYCHO_CAPACITY_INDEX).
+LAUNCH_CAPACITY_WAIT = int(os.environ.get("LAUNCH_CAPACITY_WAIT", 600))
 EXPORTABLE_ENV = os.environ.get("EXPORTABLE_ENV",None)
 if EXPORTABLE_ENV != None: EXPORTABLE_ENV = EXPORTABLE_ENV.split(':')
 else: EXPORTABLE_ENV = []
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from core.models import AuthorizedUser
+from core.models import AuthorizedUser, LaunchJob
 
 
 class AuthorizedUserAdmin(admin.ModelAdmin):
@@ -9,3 +9,11 @@ class AuthorizedUserAdmin(admin.ModelAdmin):
 
 
 admin.site.register(AuthorizedUser)
+
+
+class LaunchJobAdmin(admin.ModelAdmin):
+    list_display = ['app_id', 'user', 'status', 'progress', 'created', 'finished']
+    list_filter = ['status']
+
+
+admin.site.register(LaunchJob, LaunchJobAdmin)
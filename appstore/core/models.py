@@ -1,4 +1,5 @@
 import secrets
+import uuid
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth import get_user_model
@@ -67,4 +68,41 @@ class UserIdentityToken(models.Model):
 
     def __str__(self):
         return f"{ self.user.get_username() }-token-{ self.pk }"
-        
\ No newline at end of file
+
+
+class LaunchJob(models.Model):
+    """
+    An app launch waiting for, or run by, a launch worker. The rows are the
+    queue, so accepted launches survive a restart of the appstore.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(UserModel, on_delete=models.CASCADE)
+    app_id = models.CharField(max_length=256)
+    # Everything the worker needs to start the app: resources, host, env.
+    request = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    progress = models.CharField(max_length=256, blank=True)
+    result = models.JSONField(default=None, null=True, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(default=None, null=True, blank=True)
+    finished = models.DateTimeField(default=None, null=True, blank=True)
+    # Touched as the launch progresses; a running job that stops beating was orphaned.
+    heartbeat = models.DateTimeField(default=None, null=True, blank=True)
+
+    class Meta:
+        ordering = ["created"]
+
+    def __str__(self):
+        return f"{ self.app_id }-job-{ self.pk } ({ self.status })"
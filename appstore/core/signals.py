@@ -0,0 +1,51 @@
+from allauth.socialaccount.models import SocialToken
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from api.v1.principals import forget_principal
+from core.models import AuthorizedUser
+from middleware.filter_whitelist_middleware import authorization_cache
+
+
+def forget_authorization(authorized):
+    """
+    Drop cached whitelist decisions for users the AuthorizedUser row matched.
+    Only positive decisions are cached, so a new row needs no eviction.
+    """
+    authorization_cache.invalidate(
+        lambda key, value: key[1] == authorized.email or key[2] == authorized.username
+    )
+
+
+@receiver(pre_save, sender=AuthorizedUser)
+def forget_changed_authorization(sender, instance, **kwargs):
+    """
+    An edited row stops authorizing the email and username it had before.
+    """
+    if instance.pk is None:
+        return
+    previous = AuthorizedUser.objects.filter(pk=instance.pk).first()
+    if previous is not None:
+        forget_authorization(previous)
+
+
+@receiver(post_delete, sender=AuthorizedUser)
+def forget_authorizations(sender, instance, **kwargs):
+    forget_authorization(instance)
+
+
+@receiver(post_save, sender=SocialToken)
+@receiver(post_delete, sender=SocialToken)
+def forget_principal_tokens(sender, instance, **kwargs):
+    """
+    A refreshed or revoked token must not be served from the principal cache.
+    Only this process's cache is cleared; other workers keep theirs for up
+    to PRINCIPAL_CACHE_TTL.
+    """
+    forget_principal(instance.account.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_principal_user(sender, instance, **kwargs):
+    forget_principal(instance.pk)
@@ -1,3 +1,4 @@
+import functools
 import logging
 import re
 
@@ -11,11 +12,24 @@ from django.core.mail import send_mail
 from smtplib import SMTPSenderRefused, SMTPResponseException
 
 from core.models import AuthorizedUser
+from tycho.tycho_utils import TTLCache
 
 logger = logging.getLogger(__name__)
 FORMAT = "%(asctime)-15s %(clientip)s %(user)-8s %(message)s"
 logging.basicConfig(format=FORMAT)
 
+# Users recently found to be authorized, keyed by (pk, email, username) so
+# changing either identifier forces a new check. core.signals evicts the
+# users an AuthorizedUser row matched when it is edited or deleted. The
+# cache is per process, so other workers may keep admitting a revoked user
+# for up to AUTHORIZATION_CACHE_TTL.
+authorization_cache = TTLCache(ttl=settings.AUTHORIZATION_CACHE_TTL)
+
+
+@functools.lru_cache(maxsize=4)
+def compile_patterns(patterns):
+    return [re.compile(pattern) for pattern in patterns]
+
 
 class AllowWhiteListedUserOnly(MiddlewareMixin):
     def __init__(self, get_response=None):
@@ -41,11 +55,7 @@ class AllowWhiteListedUserOnly(MiddlewareMixin):
                     request.path.startswith("/api/v1/providers"),
                 ]
             ):
-                if self.is_authorized(user):
-                    logger.debug(f"Adding user {user} to whitelist")
-                    whitelist_group = Group.objects.get(name="whitelisted")
-                    user.groups.add(whitelist_group)
-                else:
+                if not self.is_authorized_cached(user):
                     logger.debug(f"Filtering user {user} is not authorized")
                     self.clear_session(request)
                     try:
@@ -81,8 +91,8 @@ class AllowWhiteListedUserOnly(MiddlewareMixin):
     @staticmethod
     def is_auto_whitelisted_email(user):
         email = user.email
-        for pattern in settings.AUTO_WHITELIST_PATTERNS:
-            if re.match(pattern, email) is not None:
+        for pattern in compile_patterns(tuple(settings.AUTO_WHITELIST_PATTERNS)):
+            if pattern.match(email) is not None:
                 return True
         return False
     
@@ -91,6 +101,28 @@ class AllowWhiteListedUserOnly(MiddlewareMixin):
         username = user.username
         
 
+    @staticmethod
+    def is_authorized_cached(user):
+        """
+        Authorize the user, reusing a recent positive decision. Only a fresh
+        decision touches the database, including adding the user to the
+        whitelisted group; denials are never cached.
+        """
+        key = (user.pk, user.email, user.username)
+
+        def authorize():
+            if not AllowWhiteListedUserOnly.is_authorized(user):
+                raise PermissionError(user.username)
+            logger.debug(f"Adding user {user} to whitelist")
+            whitelist_group = Group.objects.get(name="whitelisted")
+            user.groups.add(whitelist_group)
+            return True
+
+        try:
+            return authorization_cache.get(key, authorize)
+        except PermissionError:
+            return False
+
     @staticmethod
     def is_authorized(user):
         if AuthorizedUser.objects.filter(email=user.email).exists():
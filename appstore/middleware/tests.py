@@ -7,7 +7,10 @@ from mock import Mock
 
 from core.models import AuthorizedUser
 
-from middleware.filter_whitelist_middleware import AllowWhiteListedUserOnly
+from middleware.filter_whitelist_middleware import (
+    AllowWhiteListedUserOnly,
+    authorization_cache,
+)
 
 
 class AllowWhiteListedUserOnlyTests(TestCase):
@@ -30,6 +33,7 @@ class AllowWhiteListedUserOnlyTests(TestCase):
         self.request.path = "/apps/"
         self.request.session = {}
         self.groups = Group.objects.create(name="whitelisted")
+        authorization_cache.invalidate()
 
     def test_request_processing(self):
         """ Test processing a request. """
@@ -89,3 +93,62 @@ class AllowWhiteListedUserOnlyTests(TestCase):
         self.assertTrue(isinstance(response, HttpResponseRedirect))
         self.assertEqual(response.url, settings.LOGIN_WHITELIST_URL)
 
+
+    def test_whitelisted_user_is_not_queried_again(self):
+        user = self._create_user_and_login(
+            username="Steve_cached", email="steve@cached.com", password="admin"
+        )
+        AuthorizedUser.objects.create(email=user.email)
+        self.request.user = user
+        self.request.session = self.client.session
+        self.assertIsNone(self.middleware.process_request(self.request))
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.middleware.process_request(self.request))
+
+    def test_removing_authorization_revokes_cached_decision(self):
+        user = self._create_user_and_login(
+            username="Steve_revoked", email="steve@revoked.com", password="admin"
+        )
+        authorized = AuthorizedUser.objects.create(email=user.email)
+        self.request.user = user
+        self.request.session = self.client.session
+        self.assertIsNone(self.middleware.process_request(self.request))
+        authorized.delete()
+        response = self.middleware.process_request(self.request)
+        self.assertTrue(isinstance(response, HttpResponseRedirect))
+
+    def test_removing_authorization_keeps_other_cached_decisions(self):
+        user = self._create_user_and_login(
+            username="Steve_kept", email="steve@kept.com", password="admin"
+        )
+        AuthorizedUser.objects.create(email=user.email)
+        other = AuthorizedUser.objects.create(email="someone@else.com")
+        self.request.user = user
+        self.request.session = self.client.session
+        self.assertIsNone(self.middleware.process_request(self.request))
+        other.delete()
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.middleware.process_request(self.request))
+
+    def test_editing_authorization_revokes_cached_decision(self):
+        user = self._create_user_and_login(
+            username="Steve_edited", email="steve@edited.com", password="admin"
+        )
+        authorized = AuthorizedUser.objects.create(username=user.username)
+        self.request.user = user
+        self.request.session = self.client.session
+        self.assertIsNone(self.middleware.process_request(self.request))
+        authorized.username = "someone_else"
+        authorized.save()
+        response = self.middleware.process_request(self.request)
+        self.assertTrue(isinstance(response, HttpResponseRedirect))
+
+    def test_auto_whitelist_patterns(self):
+        user = self._create_user_and_login(
+            username="Steve_auto", email="steve@auto.example.org", password="admin"
+        )
+        self.request.user = user
+        self.request.session = self.client.session
+        with self.settings(AUTO_WHITELIST_PATTERNS=[r".*@auto\.example\.org$"]):
+            self.assertIsNone(self.middleware.process_request(self.request))
+        self.assertTrue(AuthorizedUser.objects.filter(email=user.email).exists())
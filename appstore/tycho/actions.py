@@ -1,4 +1,5 @@
 import argparse
+import functools
 import ipaddress
 import json
 import jsonschema
@@ -7,6 +8,7 @@ import netifaces
 import os
 import requests
 import sys
+import threading
 import traceback
 import yaml
 from tycho.core import Tycho
@@ -19,19 +21,34 @@ containers running on abstracted compute fabrics.
 """
 logger = logging.getLogger(__name__)
 
-""" Load the schema. """
+""" The schema, loaded on the first validation. """
 schema_file_path = os.path.join (
     os.path.dirname(__file__),
     'api-schema.yaml')
-template = None
-with open(schema_file_path, 'r') as file_obj:
-    template = yaml.load(file_obj, Loader=yaml.FullLoader) #nosec B506
 
 backplane = None
-_tycho = Tycho(backplane=backplane)
+_tycho = None
+_tycho_lock = threading.Lock ()
+
+
+@functools.lru_cache (maxsize=None)
+def schema ():
+    with open(schema_file_path, 'r') as file_obj:
+        return yaml.load(file_obj, Loader=yaml.FullLoader) #nosec B506
 
 
 def tycho ():
+    """ The Tycho core, created on first use.
+
+        Creating it loads the cluster configuration and builds the compute
+        clients, which management commands and tests importing this module
+        never need.
+    """
+    global _tycho
+    if _tycho is None:
+        with _tycho_lock:
+            if _tycho is None:
+                _tycho = Tycho(backplane=backplane)
     return _tycho
 
 
@@ -44,8 +61,7 @@ class TychoResource:
     def validate(self, request, component):
         """ Validate a request against the schema. """
         if not self.specs:
-            with open(schema_file_path, 'r') as file_obj:
-                self.specs = yaml.load(file_obj, Loader=yaml.FullLoader) #nosec B506
+            self.specs = schema ()
         to_validate = self.specs["components"]["schemas"][component]
         try:
             logger.debug(f"--:Validating obj {request}")
@@ -123,8 +139,9 @@ class StatusSystemResource(TychoResource):
             self.validate(request, component="StatusRequest")
             system_name = request.get('name', None)
             system_username = request.get('username', None)
+            # The response is JSON, so gather the records the compute may page through.
             response = self.create_response(
-                result=tycho().get_compute().status(system_name, system_username),
+                result=list(tycho().get_compute().status(system_name, system_username)),
                 message=f"Get status for system {system_name}")
         except Exception as e:
             response = self.create_response(
@@ -134,6 +151,26 @@ class StatusSystemResource(TychoResource):
         return response
 
 
+class ScaleSystemResource(TychoResource):
+    """ Hibernate or resume a system by scaling its deployments, keeping everything else. """
+
+    def post(self, request):
+        response = {}
+        system_name = None
+        try:
+            logger.debug(f"scale-request: {json.dumps(request, indent=2)}")
+            self.validate(request, component="ScaleRequest")
+            system_name = request['name']
+            response = self.create_response(
+                result=tycho().get_compute().scale(system_name, request['replicas']),
+                message=f"Scaled system {system_name} to {request['replicas']}")
+        except Exception as e:
+            response = self.create_response(
+                exception=e,
+                message=f"Failed to scale system {system_name}.")
+        return response
+
+
 class ModifySystemResource(TychoResource):
     """ Modify a system given a name, labels, resources(cpu and memory) """
 
@@ -0,0 +1,226 @@
+import logging
+import math
+import threading
+import time
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from kubernetes.utils import parse_quantity
+
+logger = logging.getLogger (__name__)
+
+""" Pods that still hold their requests. Pods leaving this selection are watched as deletions. """
+ACTIVE_PODS = "status.phase!=Succeeded,status.phase!=Failed"
+
+
+class CapacityIndex:
+    """ Keep the unreserved capacity of every node in memory using list and watch.
+
+        Nodes and pods are listed and then watched, each from its own daemon
+        thread, the same way :class:`tycho.informer.DeploymentInformer` follows
+        deployments. For every schedulable, ready node the index holds its
+        allocatable CPU, memory, ephemeral storage and GPUs less the requests of
+        the pods bound to it, so checking whether a launch fits is a scan over
+        the nodes without any API call.
+
+        Quantities are kept as integers (millicores, bytes and devices) so pods
+        coming and going never accumulate rounding errors. Taints, affinity and
+        per-node pod limits are not modelled: a launch the index accepts may
+        still stay pending, but one it rejects cannot be scheduled as requested.
+    """
+
+    RESOURCES = ("cpus", "memory", "ephemeralStorage", "gpus")
+
+    def __init__(self, api, gpu_resource_name="nvidia.com/gpu", resync_period=300,
+                 watch_timeout=60, retry_delay=5):
+        """ Construct a capacity index.
+
+            :param api: A CoreV1Api client allowed to list nodes and pods cluster wide.
+            :param gpu_resource_name: Extended resource name of a GPU.
+            :type gpu_resource_name: str
+            :param resync_period: Seconds between full relists.
+            :type resync_period: int
+            :param watch_timeout: Server side timeout of each watch request in seconds.
+            :type watch_timeout: int
+            :param retry_delay: Seconds to wait before retrying after an error.
+            :type retry_delay: int
+        """
+        self.api = api
+        self.gpu_resource_name = gpu_resource_name
+        self.resync_period = resync_period
+        self.watch_timeout = watch_timeout
+        self.retry_delay = retry_delay
+        self._lock = threading.RLock ()
+        self._nodes = {}
+        self._pods = {}
+        self._requested = {}
+        self._synced = { "node" : threading.Event (), "pod" : threading.Event () }
+        self._stopped = threading.Event ()
+        self._threads = {}
+
+    def start (self):
+        """ Start a list and watch loop for nodes and one for pods. """
+        with self._lock:
+            self._stopped.clear ()
+            for kind in ("node", "pod"):
+                thread = self._threads.get (kind)
+                if thread is None or not thread.is_alive ():
+                    self._threads[kind] = threading.Thread (
+                        target=self._run, args=(kind,), name=f"tycho-capacity-{kind}s", daemon=True)
+                    self._threads[kind].start ()
+
+    def stop (self):
+        self._stopped.set ()
+
+    @property
+    def has_synced (self):
+        """ True once nodes and pods have both been listed. """
+        return all (event.is_set () for event in self._synced.values ())
+
+    def quantities (self, resources):
+        """ Convert a Kubernetes resource list into a tuple ordered as :attr:`RESOURCES`. """
+        resources = resources or {}
+        def parse (name, scale=1):
+            value = resources.get (name)
+            return math.ceil (parse_quantity (value) * scale) if value is not None else 0
+        return (
+            parse ("cpu", 1000),
+            parse ("memory"),
+            parse ("ephemeral-storage"),
+            parse (self.gpu_resource_name))
+
+    def pod_requests (self, pod):
+        """ Effective requests of a pod, as the scheduler counts them.
+
+            Containers run together and add up; init containers run one at a time,
+            so only the largest one counts, and the runtime overhead comes on top.
+        """
+        spec = pod.spec
+        total = [ 0 ] * len (self.RESOURCES)
+        for container in spec.containers or []:
+            requests = self.quantities (container.resources and container.resources.requests)
+            total = [ a + b for a, b in zip (total, requests) ]
+        for container in spec.init_containers or []:
+            requests = self.quantities (container.resources and container.resources.requests)
+            total = [ max (a, b) for a, b in zip (total, requests) ]
+        overhead = self.quantities (spec.overhead)
+        return tuple (a + b for a, b in zip (total, overhead))
+
+    @staticmethod
+    def schedulable (node):
+        if node.spec and node.spec.unschedulable:
+            return False
+        conditions = (node.status and node.status.conditions) or []
+        return any (c.type == "Ready" and c.status == "True" for c in conditions)
+
+    def fits (self, cpus=0, memory=0, ephemeral_storage=0, gpus=0):
+        """ Whether any single node has room for a pod with these requests.
+
+            :param cpus: CPU cores.
+            :type cpus: float
+            :param memory: Memory in bytes.
+            :type memory: int
+            :param ephemeral_storage: Ephemeral storage in bytes.
+            :type ephemeral_storage: int
+            :param gpus: GPU devices.
+            :type gpus: int
+            :returns: True or False, or None until the index has synced.
+        """
+        if not self.has_synced:
+            return None
+        wanted = (math.ceil (cpus * 1000), memory, ephemeral_storage, gpus)
+        zero = (0,) * len (self.RESOURCES)
+        with self._lock:
+            for name, allocatable in self._nodes.items ():
+                requested = self._requested.get (name, zero)
+                if all (w <= a - r for w, a, r in zip (wanted, allocatable, requested)):
+                    return True
+        return False
+
+    def summary (self):
+        """ Allocatable and available resources of each node, with the largest and total available. """
+        def readable (values):
+            values = dict (zip (self.RESOURCES, values))
+            values["cpus"] = values["cpus"] / 1000
+            return values
+        zero = (0,) * len (self.RESOURCES)
+        nodes = {}
+        with self._lock:
+            for name, allocatable in self._nodes.items ():
+                requested = self._requested.get (name, zero)
+                nodes[name] = (allocatable, tuple (max (0, a - r) for a, r in zip (allocatable, requested)))
+        available = [ free for _, free in nodes.values () ] or [ zero ]
+        return {
+            "synced"    : self.has_synced,
+            "nodes"     : {
+                name : { "allocatable" : readable (allocatable), "available" : readable (free) }
+                for name, (allocatable, free) in sorted (nodes.items ())
+            },
+            "largest"   : readable (tuple (max (values) for values in zip (*available))),
+            "available" : readable (tuple (sum (values) for values in zip (*available)))
+        }
+
+    def _source (self, kind):
+        if kind == "node":
+            return self.api.list_node, {}
+        return self.api.list_pod_for_all_namespaces, { "field_selector" : ACTIVE_PODS }
+
+    def _run (self, kind):
+        function, kwargs = self._source (kind)
+        while not self._stopped.is_set ():
+            try:
+                response = function (**kwargs)
+                self._replace (kind, response.items)
+                self._synced[kind].set ()
+                resource_version = response.metadata.resource_version
+                logger.debug (f"-- capacity index listed {len(response.items)} {kind}s at {resource_version}")
+                deadline = time.monotonic () + self.resync_period
+                while not self._stopped.is_set () and time.monotonic () < deadline:
+                    timeout = max (1, min (self.watch_timeout, int (deadline - time.monotonic ())))
+                    for event in watch.Watch ().stream (
+                            function, resource_version=resource_version, timeout_seconds=timeout, **kwargs):
+                        self._update (kind, event['type'], event['object'])
+                        resource_version = event['object'].metadata.resource_version or resource_version
+                        if self._stopped.is_set ():
+                            break
+            except ApiException as e:
+                if e.status == 410:
+                    logger.debug (f"-- capacity index {kind} resourceVersion expired. relisting.")
+                    continue
+                logger.warning (f"-- capacity index api error listing {kind}s: {e.status} {e.reason}")
+                self._stopped.wait (self.retry_delay)
+            except Exception as e:
+                logger.warning (f"-- capacity index error: {e}")
+                logger.debug ("", exc_info=True)
+                self._stopped.wait (self.retry_delay)
+
+    def _replace (self, kind, items):
+        with self._lock:
+            if kind == "node":
+                self._nodes = {}
+            else:
+                self._pods = {}
+                self._requested = {}
+            for item in items:
+                self._update (kind, "ADDED", item)
+
+    def _update (self, kind, event_type, item):
+        with self._lock:
+            if kind == "node":
+                name = item.metadata.name
+                self._nodes.pop (name, None)
+                if event_type != "DELETED" and self.schedulable (item):
+                    self._nodes[name] = self.quantities (item.status.allocatable)
+                return
+            key = (item.metadata.namespace, item.metadata.name)
+            previous = self._pods.pop (key, None)
+            if previous is not None:
+                node, requests = previous
+                self._requested[node] = tuple (a - b for a, b in zip (self._requested[node], requests))
+            node = item.spec.node_name
+            finished = item.status is not None and item.status.phase in ("Succeeded", "Failed")
+            if event_type == "DELETED" or finished or not node:
+                return
+            requests = self.pod_requests (item)
+            self._pods[key] = (node, requests)
+            self._requested[node] = tuple (
+                a + b for a, b in zip (self._requested.get (node, (0,) * len (self.RESOURCES)), requests))
@@ -9,10 +9,11 @@ import sys
 import traceback
 import argparse
 import yaml
-from tycho.tycho_utils import TemplateUtils
+from tycho.tycho_utils import TemplateUtils, TTLCache
 from tycho.config import Config
 from tycho.exceptions import TychoException
-from tycho.actions import StartSystemResource, StatusSystemResource, DeleteSystemResource, ModifySystemResource
+from tycho.actions import StartSystemResource, StatusSystemResource, DeleteSystemResource, ModifySystemResource, ScaleSystemResource
+from tycho.actions import tycho as tycho_core
 from kubernetes import client as k8s_client, config as k8s_config
 
 logger = logging.getLogger (__name__)
@@ -31,7 +32,7 @@ class TychoService:
     """ Represent a service endpoint. """
     try_minikube = True
 
-    def __init__(self, name, app_id, ip_address, port, sid=None, creation_time=None, username="",utilization={}, conn_string="", workspace_name="",is_ready=False):
+    def __init__(self, name, app_id, ip_address, port, sid=None, creation_time=None, username="",utilization={}, conn_string="", workspace_name="",is_ready=False,is_hibernated=False):
         self.name = name
         self.app_id = app_id
         self.ip_address = ip_address
@@ -44,6 +45,7 @@ class TychoService:
         self.conn_string = conn_string
         self.workspace_name = workspace_name
         self.is_ready = is_ready
+        self.is_hibernated = is_hibernated
             
     def get_utilization (self, utilization):
         total = {
@@ -115,8 +117,13 @@ class TychoClient:
             'start': StartSystemResource(),
             'status': StatusSystemResource(),
             'delete': DeleteSystemResource(),
-            'modify': ModifySystemResource()
+            'modify': ModifySystemResource(),
+            'scale': ScaleSystemResource()
         }
+        """ Status results are shared briefly between callers asking the same question.
+            Set TYCHO_STATUS_CACHE_TTL to 0 to only coalesce concurrent requests. """
+        self.status_cache = TTLCache (
+            ttl=float (os.environ.get ("TYCHO_STATUS_CACHE_TTL", "2")))
         
     def request (self, service, request):
         """ Send a request to the server. Generic underlayer to all requests. 
@@ -165,7 +172,11 @@ class TychoClient:
             :type request: JSON
             :returns: Returns a TychoSystem object
         """
-        response = self.request ("start", request)
+        try:
+            response = self.request ("start", request)
+        finally:
+            principal = json.loads (request.get ("principal") or "{}")
+            self.invalidate_status (username=principal.get ("username"))
         error = response.get('result',{}).get('error',None)
         if error == 'error':
             for e in error:
@@ -188,7 +199,10 @@ class TychoClient:
         """
         logger.error (f"-- delete: {json.dumps(request, indent=2)}")
         print (f"-- delete: {json.dumps(request, indent=2)}")
-        return self.request ("delete", request)
+        try:
+            return self.request ("delete", request)
+        finally:
+            self.invalidate_status (name=request.get ("name"))
     
     def status (self, request): 
         """ Get status of running systems.
@@ -202,8 +216,111 @@ class TychoClient:
             :param request: Request formatted as above.
             :type request: JSON
         """
-        response = self.request ("status", request)
-        return TychoStatus (**response)
+        key = (request.get ("name"), request.get ("username"))
+        return self.status_cache.get (
+            key, lambda: TychoStatus (**self.request ("status", request)))
+
+    def status_page (self, request):
+        """ Get one page of status records across systems, straight from the cluster.
+
+            The format of a request is::
+
+                {
+                   "username" : <optional owner of the systems>,
+                   "limit"    : <maximum records in the page>,
+                   "cursor"   : <cursor returned with the previous page>
+                }
+
+            Only available with the in-process compute backend.
+
+            :returns: A dict with the status records under "result" and the cursor of
+                the next page under "cursor", None after the last page.
+        """
+        if os.environ.get("REST_API", "false") == "true":
+            raise TychoException ("Paged status is not supported with REST_API=true.")
+        records, cursor = tycho_core().get_compute().status_page (
+            username=request.get ("username"),
+            limit=request.get ("limit", 500),
+            cursor=request.get ("cursor"))
+        return { "result" : records, "cursor" : cursor }
+
+    def invalidate_status (self, name=None, username=None):
+        """ Forget cached status that could include the named system or the user's systems. """
+        def affected (key, status):
+            key_name, key_username = key
+            if key_name is None and key_username is None:
+                return True
+            if username is not None and key_username == username:
+                return True
+            if name is not None:
+                return key_name == name or any (
+                    service.identifier == name for service in status.services or [])
+            return username is None
+        self.status_cache.invalidate (affected)
+
+    def add_status_listener (self, listener):
+        """ Register a callable to be notified of changes to running systems.
+
+            The listener is called with ``(event_type, record, previous)`` where the
+            records are formatted like the results of a status request. Events are
+            generated by the in-process compute backend so this is not available
+            when the client talks to a remote Tycho API.
+
+            :param listener: A callable that must not block.
+        """
+        if os.environ.get("REST_API", "false") == "true":
+            raise TychoException ("Status events are not supported with REST_API=true.")
+        tycho_core().get_compute().add_status_listener (listener)
+
+    def remove_status_listener (self, listener):
+        if os.environ.get("REST_API", "false") != "true":
+            tycho_core().get_compute().remove_status_listener (listener)
+
+    def enable_warm_pool (self, sizes, launch, interval=30):
+        """ Keep standby systems of apps running for launches to claim.
+
+            Like status events this drives the in-process compute backend, so it
+            is not available when the client talks to a remote Tycho API.
+
+            :param sizes: Number of standbys to keep for each app id.
+            :type sizes: dict
+            :param launch: Function starting one standby for an app id.
+        """
+        if os.environ.get("REST_API", "false") == "true":
+            raise TychoException ("Warm pools are not supported with REST_API=true.")
+        return tycho_core().get_compute().enable_warm_pool (sizes, launch, interval)
+
+    def warm_pool_stats (self):
+        if os.environ.get("REST_API", "false") == "true":
+            return {}
+        return tycho_core().get_compute().warm_pool_stats ()
+
+    def drain_warm_pool (self):
+        """ Delete the standbys left by a warm pool that is now turned off. """
+        if os.environ.get("REST_API", "false") != "true":
+            tycho_core().get_compute().drain_warm_pool ()
+
+    def sync_prepull (self, images):
+        """ Have every node pull the images, through the in-process compute backend. """
+        if os.environ.get("REST_API", "false") == "true":
+            raise TychoException ("Image pre-pull is not supported with REST_API=true.")
+        return tycho_core().get_compute().sync_prepull (images)
+
+    def prepull_status (self):
+        if os.environ.get("REST_API", "false") == "true":
+            return {}
+        return tycho_core().get_compute().prepull_status ()
+
+    def fits (self, cpus=0, memory=0, ephemeral_storage=0, gpus=0):
+        """ Whether the cluster has room for a launch. None means unknown. """
+        if os.environ.get("REST_API", "false") == "true":
+            return None
+        return tycho_core().get_compute().fits (cpus, memory, ephemeral_storage, gpus)
+
+    def capacity (self):
+        if os.environ.get("REST_API", "false") == "true":
+            return None
+        return tycho_core().get_compute().capacity ()
 
     def modify(self, request):
         """ Takes in a JSON formatted metadata and specs of a running system.
@@ -219,9 +336,36 @@ class TychoClient:
             :returns: A list of all the patches applied to the system
             :rtype: A list
         """
-        response = self.request("modify", request)
+        try:
+            response = self.request("modify", request)
+        finally:
+            self.invalidate_status (name=request.get ("tycho-guid"))
         return response
 
+    def scale (self, request):
+        """ Hibernate or resume a system, keeping its services and volumes.
+
+            The format of a request is::
+
+                {
+                   "name"     : <GUID>,
+                   "replicas" : <0 to hibernate, 1 to resume>
+                }
+
+            :param request: A request formatted as above.
+            :type request: JSON
+        """
+        try:
+            return self.request ("scale", request)
+        finally:
+            self.invalidate_status (name=request.get ("name"))
+
+    def enable_idle_reaper (self, idle_after, cpu_threshold, interval=60):
+        """ Hibernate idle systems, through the in-process compute backend. """
+        if os.environ.get("REST_API", "false") == "true":
+            raise TychoException ("Idle hibernation is not supported with REST_API=true.")
+        return tycho_core().get_compute().enable_idle_reaper (idle_after, cpu_threshold, interval)
+
     def up (self, name, system, settings=""):
         """ Bring a service up starting with a docker-compose spec. 
         
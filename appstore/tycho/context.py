@@ -1,10 +1,14 @@
+import hashlib
 import json
 import logging
 import os
-import traceback
+import threading
+import time
 import uuid
 import yaml
 import copy
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import MappingProxyType
 from typing import TypedDict, Optional
 from deepmerge import Merger
 from requests_cache import CachedSession
@@ -12,6 +16,7 @@ from string import Template
 from jinja2 import Template as jinja2Template
 from tycho.client import TychoStatus, TychoSystem, TychoClient
 from tycho.exceptions import ContextException
+from tycho.warmpool import STANDBY_USERNAME
 
 from urllib.parse import urljoin
 
@@ -25,10 +30,12 @@ mixin_merge = Merger(
 
 class Principal:
     """ Abstract representation of a system identity. """
-    def __init__(self, username, a_token=None, r_token=None):
+    def __init__(self, username, a_token=None, r_token=None, uid=None):
         self.username=username
         self.access_token=a_token
         self.refresh_token=r_token
+        """ iRODS (NFSRODS) uid the user's containers run as, if any. """
+        self.uid=uid
         
 class TychoContext:
     """
@@ -49,6 +56,16 @@ class TychoContext:
         self.tycho_config_url = tycho_config_url
         logger.info (f"-- TychoContext.__init__: registry_config: {registry_config} | app_defaults_config: {app_defaults_config} | product: {product} | tycho_config_url: {self.tycho_config_url} | stub: {stub}")
         self.http_session = CachedSession (cache_name='tycho-registry')
+        """ Seconds to wait on each registry, spec, settings, or icon request. """
+        self.http_timeout = float (os.environ.get ("TYCHO_HTTP_TIMEOUT", "10"))
+        self._fetch_locks = {}
+        self._fetch_locks_lock = threading.Lock ()
+        self.registry_config = registry_config
+        self.app_defaults_config = app_defaults_config
+        """ Validators of each downloaded config file, for conditional reloads. """
+        self.config_versions = {}
+        """ Validators of each fetched app spec, by URL. """
+        self.spec_versions = {}
         self.registry = self._get_config(registry_config)
         self.app_defaults = self._get_config(app_defaults_config)
         self.log_dict(self.app_defaults, pre_dict_message="defaults = \n")
@@ -58,7 +75,9 @@ class TychoContext:
         if not os.environ.get ('DEV_PHASE') == 'stub':
             self.client=TychoClient(url=os.environ.get('TYCHO_URL', "http://localhost:5000"))
         self.product = product
-        self.apps = self._grok ()
+        self.apps = MappingProxyType (self._grok ())
+        """ Bumped whenever the registry, app defaults or a fetched spec changes, so derived data can be rebuilt. """
+        self.generation = 0
 
     def _get_config(self, file_name):
         """ Load the registry metadata. """
@@ -76,16 +95,114 @@ class TychoContext:
             try:
                 app_registry_url = urljoin(self.tycho_config_url, file_name)
                 logger.debug (f"-- downloading {app_registry_url}")
-                response = self.http_session.get(app_registry_url)
+                response = self.http_session.get(app_registry_url, timeout=self.http_timeout)
                 if response.status_code != 200:
                     raise ValueError(f"-- failed to download: {response.status_code}")
                 else:
                     config = yaml.safe_load (response.text)
+                    self.config_versions[file_name] = self._config_version (response)
             except Exception as e:
                 logger.error (f"-- URL: {app_registry_url}\nerror: {e}")
                 logger.debug ("", exc_info=True)
         return config
 
+    @staticmethod
+    def _config_version (response):
+        return {
+            "etag"          : response.headers.get ("ETag"),
+            "last_modified" : response.headers.get ("Last-Modified"),
+            "digest"        : hashlib.sha1 (response.content).hexdigest ()
+        }
+
+    def _get_config_if_changed (self, file_name):
+        """ Download a config file unless the server says, or the content shows, it is unchanged.
+
+            :returns: A (config, version) pair, or None if the file is unchanged.
+        """
+        changed = self._fetch_if_changed (
+            urljoin (self.tycho_config_url, file_name), self.config_versions, file_name)
+        if changed is None:
+            return None
+        response, new_version = changed
+        return yaml.safe_load (response.text), new_version
+
+    def _fetch_if_changed (self, url, versions, key):
+        """ Fetch a URL unless the server says, or the content shows, it is unchanged.
+
+            Uses If-None-Match / If-Modified-Since from the version recorded under
+            key in versions and bypasses the HTTP cache, which would otherwise keep
+            serving the first copy. An unchanged body refreshes the recorded version.
+
+            :returns: A (response, version) pair, or None if unchanged.
+        """
+        version = versions.get (key, {})
+        headers = {}
+        if version.get ("etag"):
+            headers["If-None-Match"] = version["etag"]
+        if version.get ("last_modified"):
+            headers["If-Modified-Since"] = version["last_modified"]
+        with self.http_session.cache_disabled ():
+            response = self.http_session.get (url, headers=headers, timeout=self.http_timeout)
+        if response.status_code == 304:
+            return None
+        if response.status_code != 200:
+            raise ValueError (f"-- failed to download {url}: {response.status_code}")
+        new_version = self._config_version (response)
+        if new_version["digest"] == version.get ("digest"):
+            versions[key] = new_version
+            return None
+        return response, new_version
+
+    def _changed_specs (self):
+        """ Check every spec fetched so far against its server and return the URLs that changed. """
+        changed = {}
+        for url in list (self.spec_versions):
+            try:
+                result = self._fetch_if_changed (url, self.spec_versions, url)
+            except Exception as e:
+                logger.warning (f"-- unable to check spec {url}: {e}")
+                continue
+            if result is not None:
+                changed[url] = result[1]
+        return changed
+
+    def reload (self):
+        """ Build the next generation of this context if the external registry, the app
+            defaults or any spec fetched so far changed. Specs are compared with
+            conditional requests, like the config files.
+
+            The current context is left untouched so requests using it are never
+            blocked or see a half-updated registry. The new generation shares the
+            client and HTTP session, recompiles the apps from the new registry and
+            starts with empty per-app definition caches.
+
+            :returns: The new context, or None if nothing changed.
+        """
+        if self.tycho_config_url == "":
+            return None
+        registry = self._get_config_if_changed (self.registry_config)
+        app_defaults = self._get_config_if_changed (self.app_defaults_config)
+        specs = self._changed_specs ()
+        if registry is None and app_defaults is None and not specs:
+            return None
+        context = copy.copy (self)
+        context.config_versions = dict (self.config_versions)
+        """ The new generation fetches specs again and records their versions as it goes. """
+        context.spec_versions = {}
+        if registry is not None:
+            context.registry, context.config_versions[self.registry_config] = registry
+        if app_defaults is not None:
+            context.app_defaults, context.config_versions[self.app_defaults_config] = app_defaults
+        context._fetch_locks = {}
+        context._fetch_locks_lock = threading.Lock ()
+        context.apps = MappingProxyType (context._grok ())
+        context.generation = self.generation + 1
+        """ Specs are cached by URL; drop them so the new generation sees current specs. """
+        self.http_session.cache.clear ()
+        logger.info (
+            f"-- registry or {len(specs)} specs changed. loaded generation {context.generation} with {len(context.apps)} apps")
+        return context
+
     def log_dict(self, dict, pre_dict_message="", level=logging.DEBUG):
         message = pre_dict_message + json.dumps(dict, sort_keys=True, indent=4)
         logger.log(level, message)
@@ -97,7 +214,9 @@ class TychoContext:
                 self.add_conf_impl(apps, value)
         return apps
 
-    def inherit (self, contexts, context, apps={}):
+    def inherit (self, contexts, context, apps=None):
+        if apps is None:
+            apps = {}
         for base in context.get ("extends", []):
             self.inherit (contexts, contexts[base], apps)
         apps.update (copy.deepcopy(context.get ("apps", {})))
@@ -179,77 +298,76 @@ class TychoContext:
             logger.debug(f"TychoContext._grok -\napp: {app}\nvalue: {value}")
         return apps
     
-    def get_definition(self, app_id):
-        """ Get the apps source definition"""
-        app_definition = self.apps[app_id].get('definition')
-        if not app_definition:
+    def _load_definition (self, app_id):
+        """ Fetch, render, and parse an app's docker-compose spec once.
+
+            The parsed result is stored on the app's registry entry, so it lives
+            exactly as long as this version of the registry. Concurrent callers
+            for the same app wait on a per-app lock rather than fetching again.
+            Fetch errors are raised and not cached; a spec that fails to render
+            is cached as an empty definition.
+        """
+        app = self.apps[app_id]
+        definition = app.get ('definition')
+        if definition is not None:
+            return definition
+        with self._fetch_locks_lock:
+            lock = self._fetch_locks.setdefault (app_id, threading.Lock ())
+        with lock:
+            definition = app.get ('definition')
+            if definition is not None:
+                return definition
+            logger.debug (f"-- resolving definition for {app_id}")
+            url = app['spec']
+            response = self.http_session.get (url, timeout=self.http_timeout)
+            if response.status_code != 200:
+                raise ValueError (f"-- app {app_id}. failed to parse spec. code:{response.status_code}")
+            self.spec_versions[url] = self._config_version (response)
+            template_dict = yaml.safe_load (response.text)
+            context = self.registry["settings"]
+            logger.debug (f"-----> context: {context}")
+            spec_template = str (template_dict)
+            logger.debug (f"-----> spec_template:\n{spec_template}")
             try:
-                logger.debug (f"-- resolving definition for {app_id}")
-                url = self.apps[app_id]['spec']
-                response = self.http_session.get(url)
-                if response.status_code != 200:
-                    raise ValueError(f"-- app {app_id}. failed to parse spec. code:{response.status_code}")
-                template_dict = yaml.safe_load (response.text)
-                context = self.registry["settings"]
-                logger.debug (f"-----> context: {context}")
-                spec_template = str (template_dict)
-                logger.debug (f"-----> spec_template:\n{spec_template}")
-                template = jinja2Template (spec_template)
-                try:
-                    app_def_str = template.render(**context)
-                    logger.debug (f"-----> Rendered app definition:\n{app_def_str}")
+                app_def_str = jinja2Template (spec_template).render (**context)
+                logger.debug (f"-----> Rendered app definition:\n{app_def_str}")
 
-                    # Validate safety of rendered definition/convert back to dict before storing
-                    app_definition = yaml.safe_load(app_def_str)
-                    self.log_dict(app_definition, pre_dict_message="app_definition = \n")
-                    self.apps[app_id]['definition'] = app_definition
-                except Exception as e:
-                    logger.error (f"-- app {app_id} failed to render app definition.\nError: {e}")
-                    logger.debug ("", exc_info=True)
-                    logger.warning (f"-- Setting app {app_id} app definition to empty dict")
-                    app_definition = {}
-                    self.apps[app_id]['definition'] = app_definition
+                # Validate safety of rendered definition/convert back to dict before storing
+                definition = yaml.safe_load (app_def_str)
+                self.log_dict (definition, pre_dict_message="app_definition = \n")
             except Exception as e:
-                logger.error (f"-- app {app_id}. failed to parse definition.\nstatus code:{response.status_code}\nerror: {e}")
+                logger.error (f"-- app {app_id} failed to render app definition.\nError: {e}")
                 logger.debug ("", exc_info=True)
-        return app_definition
+                logger.warning (f"-- Setting app {app_id} app definition to empty dict")
+                definition = {}
+            app['definition'] = definition
+        return definition
+
+    def get_definition(self, app_id):
+        """ Get the apps source definition.
+
+            This is the shared, cached parse of the spec. Treat it as read-only;
+            use :meth:`get_spec` for a copy that may be modified.
+        """
+        try:
+            return self._load_definition (app_id)
+        except Exception as e:
+            logger.error (f"-- app {app_id}. failed to parse definition.\nerror: {e}")
+            logger.debug ("", exc_info=True)
+        return None
 
     def get_spec (self, app_id):
-        """ Get the URL of the system docker-compose yaml specification. """
-        spec = self.apps[app_id].get ('spec_obj', None)
-        if not spec:
-            url = None
-            response = None
-            try:
-                logger.debug (f"-- resolving specification for app: {app_id}")
-                url = self.apps[app_id]['spec']
-                response = self.http_session.get (url)
-                if response.status_code != 200:
-                    raise ValueError (f"-- app {app_id}. failed to parse spec. code:{response.status_code}")
-                template_dict = yaml.safe_load (response.text)
-                context = self.registry["settings"]
-                logger.debug (f"-----> context: {context}")
-                spec_template = str (template_dict)
-                logger.debug (f"-----> spec_template: {spec_template}")
-                template = jinja2Template (spec_template)
-                try:
-                    spec_str = template.render(**context)
-                    logger.debug (f"-----> rendered spec:\n{spec_str}")
+        """ Get a private copy of the app's docker-compose specification.
 
-                    # Validate spec/convert spec to a dict before storing
-                    spec = yaml.safe_load (spec_str)
-                    self.apps[app_id]['spec_obj'] = spec
-                except Exception as e:
-                    traceback.print_exc ()
-                    logger.error (f"--  app {app_id}.\n Failed to render spec.\nError: {e}")
-            except Exception as e:
-                traceback.print_exc ()
-                if response:
-                    logger.error (f"-- app {app_id}. failed to parse spec. code:{response.status_code}")
-                else:
-                    logger.error (f"-- app {app_id}. failed to parse spec.")
-                raise e
-        return spec
+            Callers such as :meth:`start` fill in per-launch details, so this is
+            a deep copy of the cached definition rather than the cached object.
+        """
+        try:
+            definition = self._load_definition (app_id)
+        except Exception as e:
+            logger.error (f"-- app {app_id}. failed to parse spec.\nerror: {e}")
+            raise e
+        return copy.deepcopy (definition)
 
     def get_env_registry(self, app_id, settings):
         """ Get the env variables specified for an app in the registry and update settings"""
@@ -265,7 +383,7 @@ class TychoContext:
             url = self.apps[app_id]['spec']
             env_url = os.path.join (os.path.dirname (url), ".env")
             logger.debug (f"-- resolving settings for app: {app_id}")
-            response = self.http_session.get (env_url)
+            response = self.http_session.get (env_url, timeout=self.http_timeout)
             if response.status_code == 200:
                 logger.debug (f"-- got settings for {app_id}")
                 env = response.text
@@ -275,19 +393,219 @@ class TychoContext:
             self.apps[app_id]['env_obj'] = env
         return env
 
+    def get_icon (self, app_id):
+        """ Fetch the app's icon, leaving it in the HTTP cache. Returns True if it exists. """
+        response = self.http_session.get (self.apps[app_id]['icon'], timeout=self.http_timeout)
+        return response.status_code == 200
+
+    def prefetch (self, max_workers=8):
+        """ Resolve every app's definition, settings, and icon concurrently.
+
+            Each fetch runs as its own task on a bounded thread pool, so a slow
+            or broken app delays only its own tasks and a failure is logged and
+            counted rather than raised. Anything fetched here is memoized the
+            same way the lazy getters would have, so the first request after
+            startup does not pay for N serial round trips.
+
+            :param max_workers: Maximum number of concurrent fetches.
+            :type max_workers: int
+            :returns: A summary with the number of tasks, the failed (app, resource)
+                pairs, and the elapsed seconds.
+        """
+        start = time.monotonic ()
+        fetchers = {
+            "definition" : self._load_definition,
+            "settings"   : self.get_settings,
+            "icon"       : self.get_icon
+        }
+        failed = []
+        with ThreadPoolExecutor (max_workers=max_workers, thread_name_prefix="tycho-prefetch") as executor:
+            futures = {
+                executor.submit (fetch, app_id) : (app_id, resource)
+                for app_id in list(self.apps.keys ())
+                for resource, fetch in fetchers.items ()
+            }
+            for future in as_completed (futures):
+                app_id, resource = futures[future]
+                try:
+                    result = future.result ()
+                except Exception as e:
+                    logger.warning (f"-- prefetch of {resource} for app {app_id} failed: {e}")
+                    result = None
+                if result is None or result is False:
+                    failed.append ((app_id, resource))
+        elapsed = time.monotonic () - start
+        logger.info (f"-- prefetched {len(futures) - len(failed)}/{len(futures)} resources for {len(self.apps)} apps in {elapsed:.2f}s")
+        return {
+            "tasks"   : len(futures),
+            "failed"  : failed,
+            "elapsed" : elapsed
+        }
+
+    def start_prefetch (self, max_workers=8):
+        """ Run :meth:`prefetch` in a background thread. """
+        thread = threading.Thread (
+            target=self.prefetch, kwargs={ "max_workers" : max_workers },
+            name="tycho-prefetch", daemon=True)
+        thread.start ()
+        return thread
+
     def status (self, request):
         return self.client.status (request)
 
+    def status_page (self, request):
+        return self.client.status_page (request)
+
     def delete (self, request):
         return self.client.delete (request)
 
     def update(self, request):
         return self.client.patch(request)
+
+    def hibernate (self, guid):
+        """ Scale a system to zero, keeping its services and volumes for a fast resume. """
+        return self.client.scale ({ "name" : guid, "replicas" : 0 })
+
+    def resume (self, guid):
+        return self.client.scale ({ "name" : guid, "replicas" : 1 })
+
+    def start_idle_reaper (self, idle_after, cpu_threshold=10, interval=60):
+        """ Hibernate systems that stay idle for idle_after seconds. """
+        return self.client.enable_idle_reaper (idle_after, cpu_threshold, interval)
+
+    def add_status_listener (self, listener):
+        self.client.add_status_listener (listener)
+
+    def remove_status_listener (self, listener):
+        self.client.remove_status_listener (listener)
+
+    def start_warm_pool (self, interval=30):
+        """ Keep standbys of every app with a ``warm-pool`` size in the registry.
+
+            Call again with a new context generation to apply changed sizes.
+        """
+        sizes = {
+            app_id : app["warm-pool"]
+            for app_id, app in self.apps.items () if app.get ("warm-pool")
+        }
+        logger.info (f"-- warm pool sizes: {sizes}")
+        return self.client.enable_warm_pool (sizes, self.start_standby, interval)
+
+    def start_standby (self, app_id):
+        """ Launch an app for nobody, at the resources in its spec, as a warm pool standby. """
+        spec = self.get_spec (app_id)
+        resources = { "deploy" : copy.deepcopy (spec["services"][app_id].get ("deploy", {})) }
+        return self.start (Principal (STANDBY_USERNAME), app_id, resources, host="")
+
+    def warm_pool_stats (self):
+        return self.client.warm_pool_stats ()
+
+    def drain_warm_pool (self):
+        """ Delete standbys left running from when warm pools were turned on. """
+        try:
+            self.client.drain_warm_pool ()
+        except Exception as e:
+            logger.warning (f"-- unable to delete warm pool standbys: {e}")
+
+    def images (self):
+        """ The images of every app in the registry, by app id.
+
+            Apps whose definition cannot be loaded are left out.
+        """
+        images = {}
+        for app_id in self.apps:
+            definition = self.get_definition (app_id)
+            if definition is None:
+                continue
+            images[app_id] = sorted ({
+                service["image"]
+                for service in (definition.get ("services") or {}).values ()
+                if service.get ("image")
+            })
+        return images
+
+    def sync_prepull (self):
+        """ Have every node pull the images of the registry's apps and of their init container. """
+        images = { image for app_images in self.images ().values () for image in app_images }
+        images.add ("{}:{}".format (
+            os.environ.get ("TYCHO_APP_INIT_IMAGE_REPOSITORY", "busybox"),
+            os.environ.get ("TYCHO_APP_INIT_IMAGE_TAG", "latest")))
+        result = self.client.sync_prepull (images)
+        logger.info (f"-- pre-pull of {len(images)} images: {result}")
+        return result
+
+    def start_prepull (self):
+        """ Run :meth:`sync_prepull` in a background thread; it loads every definition. """
+        def run ():
+            try:
+                self.sync_prepull ()
+            except Exception as e:
+                logger.warning (f"-- image pre-pull failed: {e}")
+                logger.debug ("", exc_info=True)
+        thread = threading.Thread (target=run, name="tycho-prepull", daemon=True)
+        thread.start ()
+        return thread
+
+    def prepull_status (self):
+        return self.client.prepull_status ()
+
+    def fits (self, cpus=0, memory=0, ephemeral_storage=0, gpus=0):
+        """ Whether a launch with these requests fits on a node.
+
+            :param cpus: CPU cores.
+            :param memory: Memory in bytes.
+            :param ephemeral_storage: Ephemeral storage in bytes.
+            :param gpus: GPU devices.
+            :returns: True or False, or None when capacity is not tracked.
+        """
+        return self.client.fits (cpus, memory, ephemeral_storage, gpus)
+
+    def capacity (self):
+        """ Available resources per node, or None when capacity is not tracked. """
+        return self.client.capacity ()
     
     def start (self, principal, app_id, resource_request, host, extra_container_env={}):
         """ Get application metadata, docker-compose structure, settings, and compose API request. """
         logger.info(f"\nprincipal: {principal}\napp_id: {app_id}\n"
                     f"resource_request: {resource_request}\nhost: {host}")
+        launch = self.prepare_start (app_id, resource_request)
+        return self._start_prepared (launch, principal, host, extra_container_env)
+
+    def start_many (self, principals, app_id, resource_request, host, extra_container_env={}, max_workers=8):
+        """ Start the same app for many principals.
+
+            The spec, settings and resources are resolved once and shared; each
+            principal's system is then launched on a bounded pool.
+
+            :param principals: Identities to launch the app for.
+            :type principals: list of :class:`Principal`
+            :param max_workers: Maximum launches in flight at once.
+            :type max_workers: int
+            :returns: A dict mapping each username to its TychoSystem, or to the
+                exception that stopped its launch.
+        """
+        launch = self.prepare_start (app_id, resource_request)
+        start = time.monotonic ()
+        results = {}
+        with ThreadPoolExecutor (max_workers=max_workers, thread_name_prefix="tycho-start") as executor:
+            futures = {
+                executor.submit (self._start_prepared, launch, principal, host, extra_container_env) : principal.username
+                for principal in principals
+            }
+            for future in as_completed (futures):
+                username = futures[future]
+                try:
+                    results[username] = future.result ()
+                except Exception as e:
+                    logger.warning (f"-- start of {app_id} for {username} failed: {e}")
+                    results[username] = e
+        failed = sum (isinstance (result, Exception) for result in results.values ())
+        logger.info (f"-- started {app_id} for {len(results) - failed} of {len(results)} users "
+                     f"in {time.monotonic () - start:.2f}s")
+        return results
+
+    def prepare_start (self, app_id, resource_request):
+        """ Resolve the parts of a launch that do not depend on who starts the app. """
         spec = self.get_spec (app_id)
         logger.debug(f"context.start - \nspec: {spec}")
         settings = self.client.parse_env (self.get_settings (app_id))
@@ -301,15 +619,6 @@ class TychoContext:
         logger.debug (f"parsed {app_id}\nsettings: {settings}\nsettings_all: {settings_all}")
         """ Use a pre-existing k8s service account """
         service_account = self.apps[app_id]['serviceAccount'] if 'serviceAccount' in self.apps[app_id].keys() else None
-        """ Add entity's auth information """
-        principal_params = {
-            "username": principal.username,
-            "access_token": principal.access_token,
-            "refresh_token": principal.refresh_token,
-            "host": host,
-            "extra_container_env": extra_container_env
-        }
-        principal_params_json = json.dumps(principal_params, indent=4)
         """ Security Context that are set for the app """
         spec["security_context"] = self.apps[app_id]["securityContext"] if 'securityContext' in self.apps[app_id].keys() else {}
         spec["services"][app_id]["ext"] = self.apps[app_id]["ext"] if 'ext' in self.apps[app_id].keys() else None
@@ -339,27 +648,49 @@ class TychoContext:
         """ Add gitea integration rule """
         gitea_integration = self.apps.get(app_id).get("gitea-integration", False)
         spec["services"][app_id]["gitea_integration"] = gitea_integration
+        return {
+            "app_id"         : app_id,
+            "spec"           : spec,
+            "settings"       : settings_all,
+            "services"       : services,
+            "serviceaccount" : service_account
+        }
 
-        if spec is not None:
-            system = self._start ({
-                "name"       : app_id,
-                "serviceaccount": service_account,
-                "env"        : settings_all,
-                "system"     : spec,
-                "principal"   : principal_params_json,
-                "services"   : services
-            })
-            """ Validate resulting interfaces. """
-            """
-            TODO: 
-              1. Check returned status.
-              2. The Ambassador based URL removes the need to pass back a port. Confirm & delete port code.
-            """
-            running = { v.name : v.port for v in system.services }
-            for name, port in services.items ():
-                assert name in running, f"Svc {name} expected but {services.keys()} actually running."            
-            logger.info (
-                f"  -- started app id:{app_id} user:{principal.username} id:{system.identifier} services:{list(running.items ())}")
+    def _start_prepared (self, launch, principal, host, extra_container_env={}):
+        """ Launch a prepared app for one principal. """
+        app_id = launch["app_id"]
+        services = launch["services"]
+        """ Add entity's auth information """
+        principal_params = {
+            "username": principal.username,
+            "access_token": principal.access_token,
+            "refresh_token": principal.refresh_token,
+            "host": host,
+            "extra_container_env": extra_container_env
+        }
+        if principal.uid is not None:
+            principal_params["nfsrods_uid"] = principal.uid
+        principal_params_json = json.dumps(principal_params, indent=4)
+        """ Each launch gets its own copy; parsing the system may modify it. """
+        system = self._start ({
+            "name"       : app_id,
+            "serviceaccount": launch["serviceaccount"],
+            "env"        : copy.deepcopy (launch["settings"]),
+            "system"     : copy.deepcopy (launch["spec"]),
+            "principal"   : principal_params_json,
+            "services"   : copy.deepcopy (services)
+        })
+        """ Validate resulting interfaces. """
+        """
+        TODO: 
+          1. Check returned status.
+          2. The Ambassador based URL removes the need to pass back a port. Confirm & delete port code.
+        """
+        running = { v.name : v.port for v in system.services }
+        for name, port in services.items ():
+            assert name in running, f"Svc {name} expected but {services.keys()} actually running."            
+        logger.info (
+            f"  -- started app id:{app_id} user:{principal.username} id:{system.identifier} services:{list(running.items ())}")
         return system
     
     def _start (self, request):
@@ -394,10 +725,82 @@ class NullContext (TychoContext):
             "message" : "..."
         })
 
+    def status_page (self, request):
+        """ One page of made up rows. """
+        return {
+            "result" : [
+                {
+                    "name"          : service.name,
+                    "app_id"        : service.app_id,
+                    "sid"           : service.identifier,
+                    "creation_time" : "1-1-2024 0:0:0",
+                    "username"      : request.get ("username") or "tester",
+                    "utilization"   : {},
+                    "is_ready"      : index % 2 == 0
+                } for index, service in enumerate (self.status ().services)
+            ],
+            "cursor" : None
+        }
+
     def delete (self, request):
         """ Ingore deletes. """
         logger.debug (f"-- delete: {request}")
+
+    def add_status_listener (self, listener):
+        """ Nothing changes in the null context. """
+
+    def remove_status_listener (self, listener):
+        pass
+
+    def start_warm_pool (self, interval=30):
+        """ There is nothing to keep warm in the null context. """
+
+    def warm_pool_stats (self):
+        return {}
+
+    def drain_warm_pool (self):
+        pass
+
+    def start_prepull (self):
+        """ There are no nodes to pull images on in the null context. """
+
+    def hibernate (self, guid):
+        return { "deployments" : [], "replicas" : 0 }
+
+    def resume (self, guid):
+        return { "deployments" : [], "replicas" : 1 }
+
+    def start_idle_reaper (self, idle_after, cpu_threshold=10, interval=60):
+        """ Nothing runs, so nothing idles, in the null context. """
+
+    def prepull_status (self):
+        return {}
+
+    def fits (self, *args, **kwargs):
+        return None
+
+    def capacity (self):
+        return None
         
+    def start_many (self, principals, app_id, *args, **kwargs):
+        services = self.apps[app_id]['services']
+        return {
+            principal.username : TychoSystem (**{
+                "status" : "ok",
+                "result" : {
+                    "name"        : self.apps[app_id]['name'],
+                    "sid"         : uuid.uuid4 ().hex,
+                    "containers"  : {
+                        k : { 'ip_address' : None, 'port-1' : v }
+                        for k, v in services.items ()
+                    },
+                    "conn_string" : ""
+                },
+                "message" : "mock: testing..."
+            })
+            for principal in principals
+        }
+
     def start (self, principal, app_id):
         logger.debug (f"-- start: {principal} {app_id}")        
         spec = self.get_spec (app_id)
@@ -419,7 +822,12 @@ class NullContext (TychoContext):
     
 class ContextFactory:
     """ Flexible method for connecting to a TychoContext.
-    Also, provide the null context for easy dev testing in appstore. """
+    Also, provide the null context for easy dev testing in appstore.
+
+    Contexts loaded from an external registry are polled for changes every
+    TYCHO_REGISTRY_REFRESH seconds (0 disables). A change produces a new
+    context generation which replaces the old one here, so callers should
+    fetch the context with :meth:`current` per request rather than hold it. """
     _state = {}
     def __init__(self):
         self.__dict__ = self._state
@@ -428,6 +836,7 @@ class ContextFactory:
         else:
             logger.debug("ContextFactory.__init__: creating contexts dictionary")
             self.contexts = {}
+            self.refreshers = {}
     def get (self, product, registry_config="app-registry.yaml", app_defaults_config="app-defaults.yaml", context_type="null", tycho_config_url=""):
         logger.info (f"-- ContextFactory.get: registry_config: {registry_config} | app_defaults_config: {app_defaults_config} | product: {product} | tycho_config_url: {tycho_config_url} | context_type: {context_type}")
         if context_type in self.contexts:
@@ -441,4 +850,58 @@ class ContextFactory:
             elif context_type == "live":
                 self.contexts[context_type] = TychoContext(registry_config=registry_config, app_defaults_config=app_defaults_config, product=product, tycho_config_url=tycho_config_url, stub=False)
                 returnContext = self.contexts[context_type]
-        return returnContext
\ No newline at end of file
+            if os.environ.get ("TYCHO_PREFETCH", "false") == "true":
+                returnContext.start_prefetch (
+                    max_workers=int (os.environ.get ("TYCHO_PREFETCH_WORKERS", "8")))
+            if os.environ.get ("TYCHO_WARM_POOL", "false") == "true":
+                returnContext.start_warm_pool (
+                    interval=float (os.environ.get ("TYCHO_WARM_POOL_INTERVAL", "30")))
+            elif os.environ.get ("TYCHO_WARM_POOL_DRAIN", "false") == "true":
+                returnContext.drain_warm_pool ()
+            if os.environ.get ("TYCHO_PREPULL", "false") == "true":
+                returnContext.start_prepull ()
+            idle_after = float (os.environ.get ("TYCHO_IDLE_HIBERNATE_AFTER", "0"))
+            if idle_after > 0:
+                returnContext.start_idle_reaper (
+                    idle_after,
+                    cpu_threshold=float (os.environ.get ("TYCHO_IDLE_CPU_THRESHOLD", "10")),
+                    interval=float (os.environ.get ("TYCHO_IDLE_CHECK_INTERVAL", "60")))
+            refresh = float (os.environ.get ("TYCHO_REGISTRY_REFRESH", "300"))
+            if returnContext.tycho_config_url != "" and refresh > 0:
+                self.start_refresher (context_type, refresh)
+        return returnContext
+
+    def current (self, context_type):
+        """ The latest generation of a context created by :meth:`get`. """
+        return self.contexts[context_type]
+
+    def refresh (self, context_type):
+        """ Swap in a new generation of the context if its registry changed. """
+        context = self.contexts[context_type]
+        new_context = context.reload ()
+        if new_context is not None:
+            self.contexts[context_type] = new_context
+            if os.environ.get ("TYCHO_PREFETCH", "false") == "true":
+                new_context.start_prefetch (
+                    max_workers=int (os.environ.get ("TYCHO_PREFETCH_WORKERS", "8")))
+            if os.environ.get ("TYCHO_WARM_POOL", "false") == "true":
+                new_context.start_warm_pool (
+                    interval=float (os.environ.get ("TYCHO_WARM_POOL_INTERVAL", "30")))
+            if os.environ.get ("TYCHO_PREPULL", "false") == "true":
+                new_context.start_prepull ()
+        return new_context
+
+    def start_refresher (self, context_type, interval):
+        if context_type in self.refreshers:
+            return
+        def run ():
+            while True:
+                time.sleep (interval)
+                try:
+                    self.refresh (context_type)
+                except Exception as e:
+                    logger.warning (f"-- registry refresh failed: {e}")
+                    logger.debug ("", exc_info=True)
+        thread = threading.Thread (target=run, name=f"tycho-registry-refresh-{context_type}", daemon=True)
+        self.refreshers[context_type] = thread
+        thread.start ()
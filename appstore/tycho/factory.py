@@ -1,16 +1,16 @@
+import importlib
 import json
 import logging
-from tycho.kube import KubernetesCompute
-from tycho.dockerc import DockerComposeCompute
 
 logger = logging.getLogger (__name__)
 
 config = {
     "backplane" : "kubernetes"
 }
+""" Backplanes are imported when first created; docker-compose pulls in a large dependency tree. """
 config_factory = {
-    "kubernetes"     : KubernetesCompute,
-    "docker-compose" : DockerComposeCompute
+    "kubernetes"     : "tycho.kube.KubernetesCompute",
+    "docker-compose" : "tycho.dockerc.DockerComposeCompute"
 }
 supported_backplanes = config_factory.keys ()
 
@@ -27,4 +27,6 @@ class ComputeFactory:
     @staticmethod
     def create_compute (config):
         backplane = config['tycho']['backplane']
-        return config_factory[backplane](config=config)
+        module_name, class_name = config_factory[backplane].rsplit (".", 1)
+        compute = getattr (importlib.import_module (module_name), class_name)
+        return compute(config=config)
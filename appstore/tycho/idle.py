@@ -0,0 +1,142 @@
+import logging
+import os
+import socket
+import threading
+import time
+from kubernetes.client.rest import ApiException
+from tycho.lease import hold_lease
+
+logger = logging.getLogger (__name__)
+
+
+def cpu_millicores (quantity):
+    """ Convert a Kubernetes CPU quantity such as 250m, 1 or 120000n to millicores. """
+    units = { "n" : 1e-6, "u" : 1e-3, "m" : 1 }
+    if quantity and quantity[-1] in units:
+        return float (quantity[:-1]) * units[quantity[-1]]
+    return float (quantity or 0) * 1000
+
+
+class IdleReaper:
+    """ Hibernate systems whose pods stay idle.
+
+        Every ``interval`` seconds the CPU usage of Tycho pods is read from the
+        metrics API (metrics.k8s.io, served by metrics-server). A system whose
+        pods together use less than ``cpu_threshold`` millicores is idle; once
+        it has been idle for ``idle_after`` seconds it is hibernated. Idleness
+        is tracked in memory, so a restart starts every clock over. When a
+        lease API is given, only the process holding the lease samples and
+        hibernates; the others start their clocks over if they take it.
+    """
+
+    def __init__(self, custom_api, namespace, hibernate, idle_after, cpu_threshold=10, interval=60,
+                 lease_api=None, lease_name="tycho-idle-reaper"):
+        """ Construct an idle reaper.
+
+            :param custom_api: A CustomObjectsApi client.
+            :param namespace: Namespace of the systems.
+            :type namespace: str
+            :param hibernate: Function hibernating a system given its GUID.
+            :param idle_after: Seconds a system must be idle before it is hibernated.
+            :type idle_after: float
+            :param cpu_threshold: Millicores below which a system counts as idle.
+            :type cpu_threshold: float
+            :param interval: Seconds between usage samples.
+            :type interval: float
+            :param lease_api: A CoordinationV1Api client, to elect the process that reaps.
+            :param lease_name: Name of the lease.
+            :type lease_name: str
+        """
+        self.custom_api = custom_api
+        self.namespace = namespace
+        self.hibernate = hibernate
+        self.idle_after = idle_after
+        self.cpu_threshold = cpu_threshold
+        self.interval = interval
+        self.lease_api = lease_api
+        self.lease_name = lease_name
+        self.identity = f"{socket.gethostname ()}-{os.getpid ()}"
+        self.idle_since = {}
+        self._lock = threading.Lock ()
+        self._thread = None
+
+    def start (self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive ():
+                self._thread = threading.Thread (
+                    target=self._run, name="tycho-idle-reaper", daemon=True)
+                self._thread.start ()
+
+    def usage (self):
+        """ CPU millicores used by each running system, by GUID. Standbys are left out. """
+        response = self.custom_api.list_namespaced_custom_object (
+            "metrics.k8s.io", "v1beta1", self.namespace, "pods",
+            label_selector="executor=tycho,username!=tycho-standby")
+        usage = {}
+        for pod in response.get ("items", []):
+            guid = (pod.get ("metadata", {}).get ("labels") or {}).get ("tycho-guid")
+            if guid is None:
+                continue
+            usage[guid] = usage.get (guid, 0) + sum (
+                cpu_millicores ((container.get ("usage") or {}).get ("cpu"))
+                for container in pod.get ("containers", []))
+        return usage
+
+    def check (self, now=None):
+        """ Take one usage sample and hibernate the systems idle for long enough.
+
+            :returns: GUIDs of the systems hibernated.
+        """
+        now = time.monotonic () if now is None else now
+        usage = self.usage ()
+        hibernated = []
+        """ Systems that went away, or were hibernated, start over if they come back. """
+        self.idle_since = { guid : since for guid, since in self.idle_since.items () if guid in usage }
+        for guid, cpu in usage.items ():
+            if cpu >= self.cpu_threshold:
+                self.idle_since.pop (guid, None)
+                continue
+            since = self.idle_since.setdefault (guid, now)
+            if now - since < self.idle_after:
+                continue
+            try:
+                self.hibernate (guid)
+                hibernated.append (guid)
+                self.idle_since.pop (guid, None)
+                logger.info (f"-- hibernated {guid} after {now - since:.0f}s below {self.cpu_threshold}m cpu")
+            except Exception as e:
+                logger.warning (f"-- unable to hibernate idle system {guid}: {e}")
+        return hibernated
+
+    def is_leader (self):
+        """ Whether this process holds the lease, taking it if it is free or expired.
+
+            Without a lease API every process is a leader. A lease that cannot be
+            read for lack of permission disables the election; hibernating a
+            system twice is harmless.
+        """
+        if self.lease_api is None:
+            return True
+        try:
+            return hold_lease (self.lease_api, self.lease_name, self.namespace, self.identity, int (3 * self.interval))
+        except ApiException as e:
+            if e.status == 403:
+                logger.warning (f"-- no access to lease {self.lease_name}; every process will reap idle systems")
+                self.lease_api = None
+                return True
+            raise
+
+    def _run (self):
+        while True:
+            try:
+                if self.is_leader ():
+                    self.check ()
+                else:
+                    """ Another process samples; clocks kept here would be stale if this one takes over. """
+                    self.idle_since = {}
+            except ApiException as e:
+                logger.warning (f"-- idle reaper cannot read pod metrics: {e.status} {e.reason}")
+            except Exception as e:
+                logger.warning (f"-- idle reaper error: {e}")
+                logger.debug ("", exc_info=True)
+            time.sleep (self.interval)
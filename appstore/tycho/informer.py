@@ -0,0 +1,233 @@
+import logging
+import threading
+import time
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+logger = logging.getLogger (__name__)
+
+
+class DeploymentInformer:
+    """ Keep an in-memory index of Tycho deployments current using list and watch.
+
+        A single background thread lists the deployments matching a label selector,
+        then watches for changes from the returned resourceVersion. Every deployment
+        is projected into a status record (the same dictionaries returned by
+        :meth:`tycho.kube.KubernetesCompute.status`) and indexed by username and by
+        tycho-guid so status queries are answered from memory instead of issuing a
+        LIST against the API server.
+
+        The index is rebuilt by a full relist every ``resync_period`` seconds and
+        whenever the watch reports that its resourceVersion has expired (HTTP 410).
+        After ``max_failures`` errors in a row the index no longer counts as
+        synced, so callers go back to listing from the API until a list succeeds.
+
+        Listeners registered with :meth:`add_listener` are called with
+        ``(event_type, record, previous)`` for every change to the index, where
+        event_type is one of ADDED, MODIFIED or DELETED.
+    """
+
+    def __init__(self, api, namespace, to_record, label_selector="executor=tycho",
+                 resync_period=300, watch_timeout=60, retry_delay=5, max_failures=3):
+        """ Construct an informer.
+
+            :param api: An AppsV1Api client.
+            :param namespace: Namespace to watch.
+            :type namespace: str
+            :param to_record: Function converting a V1Deployment into a status record.
+            :param label_selector: Selector for the deployments to track.
+            :type label_selector: str
+            :param resync_period: Seconds between full relists.
+            :type resync_period: int
+            :param watch_timeout: Server side timeout of each watch request in seconds.
+            :type watch_timeout: int
+            :param retry_delay: Seconds to wait before retrying after an error.
+            :type retry_delay: int
+            :param max_failures: Consecutive errors after which the index is treated as stale.
+            :type max_failures: int
+        """
+        self.api = api
+        self.namespace = namespace
+        self.to_record = to_record
+        self.label_selector = label_selector
+        self.resync_period = resync_period
+        self.watch_timeout = watch_timeout
+        self.retry_delay = retry_delay
+        self.max_failures = max_failures
+        self.resource_version = None
+        self._lock = threading.RLock ()
+        self._records = {}
+        self._by_username = {}
+        self._by_guid = {}
+        self._listeners = []
+        self._synced = threading.Event ()
+        self._listed = False
+        self._failures = 0
+        self._stopped = threading.Event ()
+        self._thread = None
+
+    def start (self):
+        """ Start the list and watch loop in a daemon thread. """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive ():
+                self._stopped.clear ()
+                self._thread = threading.Thread (
+                    target=self._run, name="tycho-deployment-informer", daemon=True)
+                self._thread.start ()
+
+    def stop (self):
+        """ Stop the informer. The index is left as it was. """
+        self._stopped.set ()
+
+    @property
+    def has_synced (self):
+        """ True once a list has populated the index, until lists and watches keep failing. """
+        return self._synced.is_set ()
+
+    def wait_for_sync (self, timeout=None):
+        return self._synced.wait (timeout)
+
+    def add_listener (self, listener):
+        """ Register a callable to be notified of changes to the index.
+
+            Listeners run on the informer thread and must not block.
+        """
+        with self._lock:
+            self._listeners = self._listeners + [ listener ]
+
+    def remove_listener (self, listener):
+        with self._lock:
+            self._listeners = [ l for l in self._listeners if l is not listener ]
+
+    def list (self, name=None, username=None):
+        """ Get status records from the index.
+
+            Mirrors the label selection of :meth:`tycho.kube.KubernetesCompute.status`:
+            a username takes precedence over a name, and with neither every tracked
+            deployment is returned.
+
+            :param name: GUID of a system.
+            :type name: str
+            :param username: Owner of the systems.
+            :type username: str
+        """
+        with self._lock:
+            if username:
+                keys = self._by_username.get (username, ())
+            elif name:
+                keys = self._by_guid.get (name, ())
+            else:
+                keys = self._records.keys ()
+            return [ dict(self._records[key]) for key in keys ]
+
+    def _run (self):
+        while not self._stopped.is_set ():
+            try:
+                self._list ()
+                self._watch (deadline=time.monotonic () + self.resync_period)
+            except ApiException as e:
+                if e.status == 410:
+                    logger.debug ("-- informer resourceVersion expired. relisting.")
+                    continue
+                logger.warning (f"-- informer api error: {e.status} {e.reason}")
+                self._failed ()
+                self._stopped.wait (self.retry_delay)
+            except Exception as e:
+                logger.warning (f"-- informer error: {e}")
+                logger.debug ("", exc_info=True)
+                self._failed ()
+                self._stopped.wait (self.retry_delay)
+
+    def _failed (self):
+        self._failures += 1
+        if self._failures >= self.max_failures and self._synced.is_set ():
+            logger.warning (f"-- informer failed {self._failures} times in a row. status falls back to the api.")
+            self._synced.clear ()
+
+    def _list (self):
+        """ Replace the index with the result of a full list. """
+        response = self.api.list_namespaced_deployment (
+            self.namespace,
+            label_selector=self.label_selector)
+        records = {}
+        for item in response.items:
+            records[item.metadata.name] = self.to_record (item)
+        with self._lock:
+            previous = self._records
+            self._records = {}
+            self._by_username = {}
+            self._by_guid = {}
+            for key, record in records.items ():
+                self._index (key, record)
+            self.resource_version = response.metadata.resource_version
+            listeners = self._listeners
+        if self._listed:
+            """ Report whatever changed while we were not watching. """
+            for key, record in records.items ():
+                if key not in previous:
+                    self._notify (listeners, "ADDED", record, None)
+                elif record != previous[key]:
+                    self._notify (listeners, "MODIFIED", record, previous[key])
+            for key, record in previous.items ():
+                if key not in records:
+                    self._notify (listeners, "DELETED", record, record)
+        self._listed = True
+        self._failures = 0
+        self._synced.set ()
+        logger.debug (f"-- informer listed {len(records)} deployments at {self.resource_version}")
+
+    def _watch (self, deadline):
+        """ Apply watch events to the index until the resync deadline. """
+        while not self._stopped.is_set () and time.monotonic () < deadline:
+            timeout = max (1, min (self.watch_timeout, int (deadline - time.monotonic ())))
+            stream = watch.Watch ().stream (
+                self.api.list_namespaced_deployment,
+                self.namespace,
+                label_selector=self.label_selector,
+                resource_version=self.resource_version,
+                timeout_seconds=timeout)
+            for event in stream:
+                self._apply (event['type'], event['object'])
+                if self._stopped.is_set ():
+                    break
+
+    def _apply (self, event_type, item):
+        key = item.metadata.name
+        record = self.to_record (item)
+        with self._lock:
+            previous = self._records.get (key)
+            self._unindex (key)
+            if event_type in ("ADDED", "MODIFIED"):
+                self._index (key, record)
+            if item.metadata.resource_version:
+                self.resource_version = item.metadata.resource_version
+            listeners = self._listeners
+        if event_type in ("ADDED", "MODIFIED", "DELETED"):
+            self._notify (listeners, event_type, record, previous)
+
+    def _notify (self, listeners, event_type, record, previous):
+        for listener in listeners:
+            try:
+                listener (event_type, record, previous)
+            except Exception as e:
+                logger.warning (f"-- informer listener failed: {e}")
+                logger.debug ("", exc_info=True)
+
+    def _index (self, key, record):
+        self._records[key] = record
+        if record.get ("username"):
+            self._by_username.setdefault (record["username"], {})[key] = None
+        if record.get ("sid"):
+            self._by_guid.setdefault (record["sid"], {})[key] = None
+
+    def _unindex (self, key):
+        record = self._records.pop (key, None)
+        if record is None:
+            return
+        for index, value in ((self._by_username, record.get ("username")),
+                             (self._by_guid, record.get ("sid"))):
+            keys = index.get (value)
+            if keys is not None:
+                keys.pop (key, None)
+                if not keys:
+                    del index[value]
@@ -5,15 +5,26 @@ import shutil
 import sys
 import traceback
 import base64
-from time import sleep
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import monotonic, sleep
 from kubernetes import client as k8s_client, config as k8s_config
+from tycho.capacity import CapacityIndex
 from tycho.compute import Compute
 from tycho.exceptions import DeleteException
 from tycho.exceptions import StartException
 from tycho.exceptions import TychoException
 from tycho.exceptions import ModifyException
+from tycho.idle import IdleReaper
+from tycho.informer import DeploymentInformer
 from tycho.model import System
+from tycho.prepull import PrePuller
 from tycho.tycho_utils import TemplateUtils
+from tycho.warmpool import STANDBY_LABEL, STANDBY_USERNAME, WarmPool
+try:
+    import orjson as fast_json
+except ImportError:
+    fast_json = json
 import kubernetes.client
 from kubernetes.client.rest import ApiException
 
@@ -48,6 +59,16 @@ class KubernetesCompute(Compute):
         self.extensions_api = k8s_client.AppsV1Api(api_client)
         self.networking_api = k8s_client.NetworkingV1Api(api_client)
         self.try_minikube = True
+        self.informer = None
+        self.informer_lock = threading.Lock ()
+        self.warm_pool = None
+        self.prepuller = None
+        self.idle_reaper = None
+        self.capacity_index = None
+        """ Independent objects of a launch are created concurrently on this pool. """
+        self.launch_executor = ThreadPoolExecutor (
+            max_workers=int (os.environ.get ("TYCHO_LAUNCH_WORKERS", 8)),
+            thread_name_prefix="tycho-launch")
         self.namespace = self.get_namespace (
             namespace=os.environ.get("NAMESPACE", self.get_namespace ()))
         logger.debug (f"-- using namespace: {self.namespace}")
@@ -63,34 +84,58 @@ class KubernetesCompute(Compute):
         return namespace
 
     def check_volumes(self, volumes, namespace):
-        try:
-            volumesNA = []
-            api_response = self.api.list_namespaced_persistent_volume_claim(namespace=namespace)
-            for index, volume in enumerate(volumes):
-                notExists = True
-                if volume["volume_name"] != "stdnfs":
-                    for item in api_response.items:
-                        if item.metadata.name != volume["volume_name"]:
-                            continue
-                        else:
-                            notExists = False
-                            logger.info(f"PVC {volume['volume_name']} exists.")
-                            break
-                if notExists and volume["volume_name"] != 'stdnfs':
-                    volumesNA.append(index)
-                    #raise Exception(f"Cannot create system. PVC {volume['pvc_name']} does not exist. Create it.")
-            return volumesNA 
-        except Exception as e:
-            logger.debug(f"Raising persistent volume claim exception. {e}")
-            #raise
+        """ Find the requested volumes whose PVCs do not exist.
+
+            Each claim is read by name, so the cost does not depend on how many
+            claims the namespace holds. A claim that cannot be checked for any
+            reason other than not existing is kept.
+
+            :returns: Indices into volumes of the missing claims.
+        """
+        volumesNA = []
+        exists = {}
+        for index, volume in enumerate(volumes):
+            name = volume["volume_name"]
+            if name == "stdnfs":
+                continue
+            if name not in exists:
+                try:
+                    self.api.read_namespaced_persistent_volume_claim(name=name, namespace=namespace)
+                    logger.info(f"PVC {name} exists.")
+                    exists[name] = True
+                except ApiException as e:
+                    if e.status == 404:
+                        exists[name] = False
+                    else:
+                        logger.warning(f"Unable to check persistent volume claim {name}. {e.status} {e.reason}")
+                        exists[name] = True
+            if not exists[name]:
+                volumesNA.append(index)
+                #raise Exception(f"Cannot create system. PVC {volume['pvc_name']} does not exist. Create it.")
+        return volumesNA
 
     def is_ambassador_context(self, namespace, ambassador_service_name):
         try:
-            field_sel_api_response = self.api.list_namespaced_service(field_selector=f"metadata.name={ambassador_service_name}", namespace=namespace)
-            return len(field_sel_api_response.items) == 1
+            self.api.read_namespaced_service(name=ambassador_service_name, namespace=namespace)
+            return True
         except ApiException as e:
+            if e.status == 404:
+                return False
             logger.info(f"There was a problem assessing whether the ambassador service is running.", e)
 
+    def read_env_secret(self, name, namespace):
+        """ Get the decoded data of a secret, or None if there is no such secret. """
+        try:
+            secret = self.api.read_namespaced_secret(name=name, namespace=namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+        return {
+            key : str(base64.b64decode(value), 'utf-8')
+            for key, value in (secret.data or {}).items()
+        }
+
     def start (self, system, namespace="default"):
         """ Start an abstractly described distributed system on the cluster.
             Generate each required K8s artifact and wire them together. Currently 
@@ -103,6 +148,7 @@ class KubernetesCompute(Compute):
             :type namespace: str
         """
         namespace = self.namespace #system.get_namespace()
+        created_policies = []
         try:
             """ Check volumes and remove them from the system. """
             volumesNA = self.check_volumes(system.volumes, namespace)
@@ -131,14 +177,10 @@ class KubernetesCompute(Compute):
             #        api_response = self.api.create_namespace(body=ns_manifest)
 
             try:
-                api_response = self.api.list_namespaced_secret(namespace=namespace)
-                for item in api_response.items:
-                    if item.metadata.name == f"{system.system_name}-env":
-                        for key, value in item.data.items():
-                            value = str(base64.b64decode(value), 'utf-8')
-                            for container in system.containers:
-                                container.env.append([key,TemplateUtils.render_string(value,container.env)])
-                        break
+                env_secret = self.read_env_secret(f"{system.system_name}-env", namespace)
+                for key, value in (env_secret or {}).items():
+                    for container in system.containers:
+                        container.env.append([key,TemplateUtils.render_string(value,container.env)])
             except ApiException as e:
                 logger.debug(f"App requires {system.system_name}-env configmap with envs: {e}")
                 ## TODO: Swallows exception.
@@ -178,55 +220,75 @@ class KubernetesCompute(Compute):
             #    response = self.api.create_persistent_volume(
             #        body=pv_manifest)
 
-            """ Create a deployment for the pod. """
-            for pod_manifest in pod_manifests:
-                deployment,create_deployment_api_response = self.pod_to_deployment (
-                    name=system.name,
-                    username=system.username,
-                    identifier=system.identifier,
-                    template=pod_manifest,
-                    namespace=namespace)
+            """ Standbys for the warm pool are only a deployment; a claim adds the rest. """
+            standby = system.username == STANDBY_USERNAME
 
-            """ Create a network policy if appropriate. """
-            if system.requires_network_policy ():
+            """ The network policy does not depend on the deployment; create it alongside. """
+            policy_futures = []
+            if system.requires_network_policy () and not standby:
                 logger.debug ("creating network policy")
                 network_policy_manifests = system.render (
                     template="policy/tycho-default-netpolicy.yaml")
                 for network_policy_manifest in network_policy_manifests:
                     logger.debug (f"applying network policy: {network_policy_manifest}")
-                    network_policy = self.networking_api.create_namespaced_network_policy (
+                    policy_futures.append (self.launch_executor.submit (
+                        self.timed_create, "network policy", network_policy_manifest["metadata"]["name"],
+                        self.networking_api.create_namespaced_network_policy,
                         body=network_policy_manifest,
-                        namespace=namespace)
+                        namespace=namespace))
 
-            """ Create service endpoints. """
-            container_map = {}
-            counter = 0
+            """ Create a deployment for the pod. """
+            try:
+                for pod_manifest in pod_manifests:
+                    deployment,create_deployment_api_response = self.timed_create (
+                        "deployment", system.name, self.place_deployment,
+                        name=system.name,
+                        username=system.username,
+                        identifier=system.identifier,
+                        template=pod_manifest,
+                        app_id=system.system_name,
+                        namespace=namespace)
+            finally:
+                """ Whatever happened, know every policy that exists before rolling back. """
+                wait (policy_futures)
+                created_policies.extend (
+                    future.result ().metadata.name for future in policy_futures
+                    if future.exception () is None)
+            self.wait_all (policy_futures)
+
+            """ Create service endpoints. They are owned by the deployment, so come after it. """
+            service_futures = []
             for container in system.containers:
                 """ Determine if a service is configured for this container. """
                 service = system.services.get (container.name, None)
-                if service:
+                if service and not standby:
                     logger.debug (f"generating service for container {container.name}")
                     service_manifests = system.render (
                         template = "service.yaml",
                         context = { "service" : service, "create_deployment_api_response":create_deployment_api_response }
                     )
                     for service_manifest in service_manifests:
-                        logger.debug (f"-- creating service for container {container.name}")                        
-                        response = self.api.create_namespaced_service(
+                        logger.debug (f"-- creating service for container {container.name}")
+                        service_futures.append ((container, self.launch_executor.submit (
+                            self.timed_create, "service", service_manifest["metadata"]["name"],
+                            self.api.create_namespaced_service,
                             body=service_manifest,
-                            namespace=namespace)
-
-                        ip_address = None
-                        if not system.amb:
-                            ip_address = self.get_service_ip_address (response)
-
-                        """ Return generated node ports to caller. """
-                        for port in response.spec.ports:
-                            container_map[container.name] = {
-                                "ip_address" : ip_address,
-                                port.name    : port.node_port
-                            }
-                            break
+                            namespace=namespace)))
+            responses = self.wait_all ([ future for container, future in service_futures ])
+
+            container_map = {}
+            for (container, future), response in zip (service_futures, responses):
+                ip_address = None
+                if not system.amb:
+                    ip_address = self.get_service_ip_address (response)
+
+                """ Return generated node ports to caller. """
+                for port in response.spec.ports:
+                    container_map[container.name] = {
+                        "ip_address" : ip_address,
+                        port.name    : port.node_port
+                    }
+                    break
             result = {
                 'name'       : system.name,
                 'sid'        : system.identifier,
@@ -236,6 +298,12 @@ class KubernetesCompute(Compute):
         
         except Exception as e:
             self.delete (system.name)
+            for policy_name in created_policies:
+                try:
+                    self.networking_api.delete_namespaced_network_policy (
+                        name=policy_name, namespace=namespace)
+                except ApiException as delete_error:
+                    logger.warning (f"-- unable to roll back network policy {policy_name}: {delete_error.reason}")
             exc_type, exc_value, exc_traceback = sys.exc_info()
             text = traceback.format_exception(
                 exc_type, exc_value, exc_traceback)
@@ -246,6 +314,28 @@ class KubernetesCompute(Compute):
         logger.info (f"result of the app launch: {json.dumps(result,indent=2)}")
         return result
 
+    def timed_create (self, kind, label, create, **kwargs):
+        """ Call an API create method, logging how long the round trip took. """
+        start = monotonic ()
+        try:
+            return create (**kwargs)
+        finally:
+            logger.info (f"-- create {kind} {label}: {(monotonic () - start) * 1000:.0f}ms")
+
+    @staticmethod
+    def wait_all (futures):
+        """ Wait for every future, then return their results in order.
+
+            Nothing is left running when this returns, so a rollback after a
+            failure cannot race a create still in flight. The first failure is
+            raised once all have finished.
+        """
+        wait (futures)
+        error = next ((f.exception () for f in futures if f.exception () is not None), None)
+        if error is not None:
+            raise error
+        return [ future.result () for future in futures ]
+
     def get_service_ip_address (self, service_metadata):
         """ Get the IP address for a service. On a system with a load balancer
             that will be in the service status' load balancer section. On minikube,
@@ -276,42 +366,75 @@ class KubernetesCompute(Compute):
         logger.debug (f"service {service_metadata.metadata.name} ingress ip: {ip_address}")
         return ip_address
 
-    def pod_to_deployment (self, name, username, identifier, template, namespace="default"):
-        """ Create a deployment specification based on a pod template.
-            
-            :param name: Name of the system.
-            :type name: str
-            :param template: Relative path to the template to use.
-            :type template: str
-            :param identifier: Unique key to this system.
-            :type identifier: str
-            :param namepsace: Namespace to run the pod in.
-            :type namespace: str
+    def place_deployment (self, name, username, identifier, template, app_id, namespace="default"):
+        """ Run a pod template as a deployment, claiming a warm standby of the app if
+            one is available. Standbys themselves are always created fresh.
+
+            :param app_id: The app the pod belongs to.
+            :type app_id: str
         """
-        namespace = self.namespace #self.get_namespace()
+        if username == STANDBY_USERNAME:
+            return self.pod_to_deployment (name, username, identifier, template, namespace, standby=app_id)
+        if self.warm_pool is not None:
+            adopted = self.warm_pool.claim (
+                app_id, lambda standby: self.adopt_standby (standby, username, identifier, template))
+            if adopted is not None:
+                return adopted
+        return self.pod_to_deployment (name, username, identifier, template, namespace)
+
+    def deployment_manifest (self, name, labels, selector, template):
+        """ A single replica deployment of a pod template. """
         deployment_spec = k8s_client.V1DeploymentSpec(
             replicas=1,
             template=template,
             selector=k8s_client.V1LabelSelector (
-                match_labels = {
-                    "tycho-guid" : identifier,
-                    "username"   : username
-                }))
+                match_labels = selector))
         
         """ Instantiate the deployment object """
         logger.debug (f"creating deployment specification {template}")
-        deployment = k8s_client.V1Deployment(
+        return k8s_client.V1Deployment(
             api_version="apps/v1",
             kind="Deployment",
             metadata=k8s_client.V1ObjectMeta(
                 name=name,
-                labels={
-                    "tycho-guid" : identifier,
-                    "executor" : "tycho",
-                    "username" : username
-                }),
+                labels=labels),
             spec=deployment_spec)
 
+    def pod_to_deployment (self, name, username, identifier, template, namespace="default", standby=None):
+        """ Create a deployment specification based on a pod template.
+            
+            :param name: Name of the system.
+            :type name: str
+            :param template: Relative path to the template to use.
+            :type template: str
+            :param identifier: Unique key to this system.
+            :type identifier: str
+            :param namepsace: Namespace to run the pod in.
+            :type namespace: str
+            :param standby: App id, when creating a warm pool standby of the app.
+            :type standby: str
+        """
+        namespace = self.namespace #self.get_namespace()
+        labels = {
+            "tycho-guid" : identifier,
+            "executor" : "tycho",
+            "username" : username
+        }
+        selector = {
+            "tycho-guid" : identifier,
+            "username"   : username
+        }
+        if standby:
+            """ Kept out of status by the executor label, and selected by a label a claim keeps. """
+            labels.update ({
+                "executor"          : STANDBY_LABEL,
+                STANDBY_LABEL       : identifier,
+                "original-app-name" : standby
+            })
+            selector = { STANDBY_LABEL : identifier }
+            template["metadata"]["labels"][STANDBY_LABEL] = identifier
+        deployment = self.deployment_manifest (name, labels, selector, template)
+
         """ Create the deployment. """
         logger.debug (f"applying deployment {template}")
         api_response = self.extensions_api.create_namespaced_deployment(
@@ -320,6 +443,119 @@ class KubernetesCompute(Compute):
         logger.debug (f"deployment created. status={api_response.status}")
         return deployment,api_response
 
+    def adopt_standby (self, standby, username, identifier, template):
+        """ Replace a standby deployment with a user's system.
+
+            The deployment keeps its name and standby selector; its labels and pod
+            template become the user's. The standby's resourceVersion makes the
+            replace fail with a conflict if another launch claimed it first.
+
+            :param standby: The standby deployment.
+            :type standby: V1Deployment
+        """
+        standby_id = standby.metadata.labels[STANDBY_LABEL]
+        template["metadata"]["labels"][STANDBY_LABEL] = standby_id
+        deployment = self.deployment_manifest (
+            name=standby.metadata.name,
+            labels={
+                "tycho-guid" : identifier,
+                "executor" : "tycho",
+                "username" : username
+            },
+            selector={ STANDBY_LABEL : standby_id },
+            template=template)
+        deployment.metadata.resource_version = standby.metadata.resource_version
+        api_response = self.extensions_api.replace_namespaced_deployment(
+            name=standby.metadata.name,
+            namespace=self.namespace,
+            body=deployment)
+        logger.debug (f"claimed standby {standby.metadata.name} for {identifier}")
+        return deployment,api_response
+
+    def enable_warm_pool (self, sizes, launch, interval=30):
+        """ Keep standbys of apps running and let launches claim them.
+
+            Calling this again updates the pool sizes and the launch function.
+
+            :param sizes: Number of standbys to keep for each app id.
+            :type sizes: dict
+            :param launch: Function starting one standby for an app id.
+        """
+        with self.informer_lock:
+            if self.warm_pool is None:
+                self.warm_pool = WarmPool (
+                    self.extensions_api, self.namespace, launch, interval=interval,
+                    lease_api=k8s_client.CoordinationV1Api (self.extensions_api.api_client))
+        self.warm_pool.configure (sizes, launch=launch)
+        self.warm_pool.start ()
+        return self.warm_pool
+
+    def drain_warm_pool (self):
+        """ Delete every standby, for when warm pools are turned off.
+
+            Only the process holding the warm pool lease drains, so the other
+            workers and replicas do not repeat the list and deletes.
+        """
+        pool = WarmPool (
+            self.extensions_api, self.namespace, launch=None,
+            lease_api=k8s_client.CoordinationV1Api (self.extensions_api.api_client))
+        if pool.is_leader ():
+            pool.replenish ()
+
+    def warm_pool_stats (self):
+        return self.warm_pool.stats () if self.warm_pool is not None else {}
+
+    def get_prepuller (self):
+        with self.informer_lock:
+            if self.prepuller is None:
+                self.prepuller = PrePuller (
+                    self.extensions_api, self.api, self.namespace,
+                    pause_image=os.environ.get ("TYCHO_PREPULL_PAUSE_IMAGE", "registry.k8s.io/pause:3.9"))
+        return self.prepuller
+
+    def sync_prepull (self, images):
+        """ Make every node pull these images. See :class:`tycho.prepull.PrePuller`.
+
+            :param images: Images of the registry's apps.
+            :type images: iterable of str
+        """
+        return self.get_prepuller ().apply (images)
+
+    def prepull_status (self):
+        """ Pull state of each pre-pulled image on each node. """
+        return self.get_prepuller ().status ()
+
+    def get_capacity_index (self):
+        """ Get the node capacity index, starting it on first use.
+
+            Returns None unless the index is enabled with TYCHO_CAPACITY_INDEX=true,
+            as it watches every node and pod in the cluster.
+        """
+        if os.environ.get ("TYCHO_CAPACITY_INDEX", "false").lower () != "true":
+            return None
+        with self.informer_lock:
+            if self.capacity_index is None:
+                self.capacity_index = CapacityIndex (
+                    self.api,
+                    gpu_resource_name=os.environ.get ("TYCHO_APP_GPU_RESOURCE_NAME", "nvidia.com/gpu"))
+                self.capacity_index.start ()
+        return self.capacity_index
+
+    def fits (self, cpus=0, memory=0, ephemeral_storage=0, gpus=0):
+        """ Whether a pod with these requests fits on a node. See :meth:`tycho.capacity.CapacityIndex.fits`.
+
+            :returns: True or False, or None when the capacity index is disabled or still syncing.
+        """
+        index = self.get_capacity_index ()
+        if index is None:
+            return None
+        return index.fits (cpus, memory, ephemeral_storage, gpus)
+
+    def capacity (self):
+        """ Available resources per node, or None when the capacity index is disabled. """
+        index = self.get_capacity_index ()
+        return index.summary () if index is not None else None
+
     def delete (self, name, namespace="default"):
         """ Delete the deployment. 
                 
@@ -361,67 +597,248 @@ class KubernetesCompute(Compute):
             Without a name, this will get status for all running systems.
             With a name, it will get status for the specified system.
 
+            Once the deployment informer has synced, status is served from its
+            in-memory index rather than listing deployments from the API server.
+
             :param name: GUID of a system to get status for.
             :type name: str
             :param namespace: Namespace the system runs in.
             :type namespace: str
+            :returns: An iterable of status records. Listing straight from the API
+                server yields them page by page, so callers needing a list make one.
         """
         namespace = self.namespace
-        result = []
+        informer = self.get_informer ()
+        if informer is not None and informer.has_synced:
+            return informer.list (name=name, username=username)
 
         """ Find all our generated deployments. """
-        label = f"tycho-guid={name}" if name else f"executor=tycho"
-        if username:
-            label = f"username={username}" if username else f"executor=tycho"
+        label = self.status_label (name, username)
         logger.debug (f"-- status label: {label}")
+        if os.environ.get ("TYCHO_STATUS_RAW", "true").lower () == "true":
+            """ Skip building V1Deployment models; we only read a handful of fields. """
+            return self.iter_status (name=name, username=username)
+
         response = self.extensions_api.list_namespaced_deployment (
             namespace,
             label_selector=label)
 
+        result = []
         if response is not None:
             for item in response.items:
+                result.append (self.deployment_status (item))
+        return result
 
-                """ Collect pod metrics for this deployment. """
-                pod_resources = {
-                    container.name : container.resources.limits
-                    for container in item.spec.template.spec.containers
-                }
-                logger.debug(f"-- pod-resources {pod_resources}")
-
-                item_guid = item.metadata.labels.get("tycho-guid", None)
-                item_username = item.metadata.labels.get("username", None)
-
-                """ Get the creation timestamp"""
-                c_time = item.metadata.creation_timestamp
-                time = f"{c_time.month}-{c_time.day}-{c_time.year} {c_time.hour}:{c_time.minute}:{c_time.second}"
-
-                """ Get the workspace name of the pod """
-                workspace_name = item.spec.template.metadata.labels.get("app-name", "")
-
-                """ Temporary variables so rest of the code doesn't break elsewhere. """
-                ip_address = "127.0.0.1"
-                port = 80
-
-                desired_replicas = item.status.replicas
-                ready_replicas = item.status.ready_replicas
-                is_ready = ready_replicas == desired_replicas
-
-                result.append(
-                    {
-                        "name": item.metadata.name,
-                        "app_id": item.spec.template.metadata.labels.get('original-app-name', None),
-                        "sid": item_guid,
-                        "ip_address": ip_address,
-                        "port": str(port),
-                        "creation_time": time,
-                        "username": item_username,
-                        "utilization": pod_resources,
-                        "workspace_name": workspace_name,
-                        "is_ready": is_ready
-                    }
-                )
+    @staticmethod
+    def status_label (name=None, username=None):
+        """ The label selector for a status request. A username takes precedence over a name. """
+        if username:
+            return f"username={username}"
+        return f"tycho-guid={name}" if name else f"executor=tycho"
 
-        return result
+    def status_page (self, name=None, username=None, limit=500, cursor=None):
+        """ Get one page of status records straight from the API server.
+
+            :param limit: Maximum number of deployments in the page.
+            :type limit: int
+            :param cursor: The continue token returned with the previous page.
+            :type cursor: str
+            :returns: The records and the cursor of the next page, or None after the last page.
+        """
+        try:
+            response = self.extensions_api.list_namespaced_deployment (
+                self.namespace,
+                label_selector=self.status_label (name, username),
+                limit=limit,
+                _continue=cursor,
+                _preload_content=False)
+        except ApiException as e:
+            if e.status == 410:
+                raise TychoException (message="The status cursor has expired. Start again without a cursor.")
+            raise
+        body = fast_json.loads (response.data)
+        records = [ self.deployment_status_raw (item) for item in body.get ("items") or [] ]
+        return records, (body.get ("metadata") or {}).get ("continue") or None
+
+    def iter_status (self, name=None, username=None, page_size=500):
+        """ Yield status records page by page, holding at most one page of deployments in memory. """
+        cursor = None
+        while True:
+            records, cursor = self.status_page (name, username, limit=page_size, cursor=cursor)
+            yield from records
+            if cursor is None:
+                break
+
+    def get_informer (self):
+        """ Get the deployment informer, starting it on first use.
+
+            Returns None if the informer is disabled with TYCHO_STATUS_INFORMER=false.
+        """
+        if os.environ.get ("TYCHO_STATUS_INFORMER", "true").lower () != "true":
+            return None
+        with self.informer_lock:
+            if self.informer is None:
+                self.informer = DeploymentInformer (
+                    api=self.extensions_api,
+                    namespace=self.namespace,
+                    to_record=self.deployment_status,
+                    resync_period=int (os.environ.get ("TYCHO_STATUS_INFORMER_RESYNC", 300)))
+                self.informer.start ()
+        return self.informer
+
+    def add_status_listener (self, listener):
+        """ Register a callable notified as systems are created, change, or are deleted.
+
+            The listener is called from the informer thread with
+            ``(event_type, record, previous)``. See :class:`tycho.informer.DeploymentInformer`.
+        """
+        informer = self.get_informer ()
+        if informer is None:
+            raise TychoException (message="Status events require TYCHO_STATUS_INFORMER=true.")
+        informer.add_listener (listener)
+
+    def remove_status_listener (self, listener):
+        if self.informer is not None:
+            self.informer.remove_listener (listener)
+
+    @staticmethod
+    def deployment_status (item):
+        """ Project a deployment into a status record.
+
+            :param item: A deployment.
+            :type item: V1Deployment
+        """
+        """ Collect pod metrics for this deployment. """
+        pod_resources = {
+            container.name : container.resources.limits
+            for container in item.spec.template.spec.containers
+        }
+        logger.debug(f"-- pod-resources {pod_resources}")
+
+        item_guid = item.metadata.labels.get("tycho-guid", None)
+        item_username = item.metadata.labels.get("username", None)
+
+        """ Get the creation timestamp"""
+        c_time = item.metadata.creation_timestamp
+        time = f"{c_time.month}-{c_time.day}-{c_time.year} {c_time.hour}:{c_time.minute}:{c_time.second}"
+
+        """ Get the workspace name of the pod """
+        workspace_name = item.spec.template.metadata.labels.get("app-name", "")
+
+        """ Temporary variables so rest of the code doesn't break elsewhere. """
+        ip_address = "127.0.0.1"
+        port = 80
+
+        desired_replicas = item.status.replicas
+        ready_replicas = item.status.ready_replicas
+        """ A hibernated system is scaled to zero; with no pods it is not ready. """
+        is_hibernated = item.spec.replicas == 0
+        is_ready = ready_replicas == desired_replicas and not is_hibernated
+
+        return {
+            "name": item.metadata.name,
+            "app_id": item.spec.template.metadata.labels.get('original-app-name', None),
+            "sid": item_guid,
+            "ip_address": ip_address,
+            "port": str(port),
+            "creation_time": time,
+            "username": item_username,
+            "utilization": pod_resources,
+            "workspace_name": workspace_name,
+            "is_ready": is_ready,
+            "is_hibernated": is_hibernated
+        }
+
+    @staticmethod
+    def deployment_status_raw (item):
+        """ Project a deployment, as decoded JSON, into a status record.
+
+            Produces the same record as :meth:`deployment_status` without the
+            kubernetes client's model deserialization.
+
+            :param item: A deployment as returned by the API server.
+            :type item: dict
+        """
+        metadata = item["metadata"]
+        template = item["spec"]["template"]
+        template_labels = template.get ("metadata", {}).get ("labels") or {}
+        labels = metadata.get ("labels") or {}
+        status = item.get ("status") or {}
+
+        """ Collect pod metrics for this deployment. """
+        pod_resources = {
+            container["name"] : (container.get ("resources") or {}).get ("limits")
+            for container in template["spec"]["containers"]
+        }
+
+        """ Get the creation timestamp, formatted as RFC 3339 e.g. 2024-01-02T03:04:05Z """
+        c_time = metadata["creationTimestamp"]
+        time = f"{int(c_time[5:7])}-{int(c_time[8:10])}-{int(c_time[0:4])} {int(c_time[11:13])}:{int(c_time[14:16])}:{int(c_time[17:19])}"
+
+        return {
+            "name": metadata["name"],
+            "app_id": template_labels.get ('original-app-name', None),
+            "sid": labels.get ("tycho-guid", None),
+            "ip_address": "127.0.0.1",
+            "port": "80",
+            "creation_time": time,
+            "username": labels.get ("username", None),
+            "utilization": pod_resources,
+            "workspace_name": template_labels.get ("app-name", ""),
+            "is_ready": status.get ("readyReplicas") == status.get ("replicas") and item["spec"].get ("replicas") != 0,
+            "is_hibernated": item["spec"].get ("replicas") == 0
+        }
+
+    def scale (self, name, replicas):
+        """ Hibernate (0 replicas) or resume (1 replica) a system.
+
+            Only the deployment's replicas change, so services, network policy and
+            volume claims stay in place and resuming is a single patch. The
+            deployment is found in the status index when the informer runs.
+
+            :param name: GUID of the system.
+            :type name: str
+            :param replicas: Replicas to run.
+            :type replicas: int
+        """
+        namespace = self.namespace
+        informer = self.get_informer ()
+        deployments = []
+        if informer is not None and informer.has_synced:
+            deployments = [ record["name"] for record in informer.list (name=name) ]
+        if not deployments:
+            """ Not indexed yet, e.g. just launched. """
+            deployments = [
+                item.metadata.name for item in self.extensions_api.list_namespaced_deployment(
+                    label_selector=f"tycho-guid={name}",
+                    namespace=namespace).items
+            ]
+        if len(deployments) == 0:
+            raise ModifyException (
+                message=f"Failed to scale system: {name}",
+                details="No deployments found. Specify a valid GUID.")
+        for deployment in deployments:
+            self.extensions_api.patch_namespaced_deployment(
+                name=deployment,
+                namespace=namespace,
+                body={ "spec" : { "replicas" : replicas } })
+        logger.info (f"-- scaled {name} to {replicas}")
+        return { "deployments" : deployments, "replicas" : replicas }
+
+    def enable_idle_reaper (self, idle_after, cpu_threshold=10, interval=60):
+        """ Hibernate systems idle for idle_after seconds. See :class:`tycho.idle.IdleReaper`. """
+        with self.informer_lock:
+            if self.idle_reaper is None:
+                self.idle_reaper = IdleReaper (
+                    k8s_client.CustomObjectsApi (self.api.api_client),
+                    self.namespace,
+                    hibernate=lambda name: self.scale (name, 0),
+                    idle_after=idle_after,
+                    cpu_threshold=cpu_threshold,
+                    interval=interval,
+                    lease_api=k8s_client.CoordinationV1Api (self.extensions_api.api_client))
+        self.idle_reaper.start ()
+        return self.idle_reaper
 
     def modify(self, system_modify):
         """
@@ -464,7 +881,7 @@ class KubernetesCompute(Compute):
                 system_modify.containers = containers
 
                 generator = TemplateUtils(config=system_modify.config)
-                templates = list(generator.render("patch.yaml", context={"system_modify": system_modify}))
+                templates = generator.render_manifests("patch.yaml", context={"system_modify": system_modify})
                 patch_template = templates[0] if len(templates) > 0 else {}
                 patches_applied.append(patch_template)
 
@@ -0,0 +1,60 @@
+import logging
+from datetime import datetime, timezone
+from kubernetes import client as k8s_client
+from kubernetes.client.rest import ApiException
+
+logger = logging.getLogger (__name__)
+
+
+def hold_lease (lease_api, name, namespace, identity, duration):
+    """ Take or renew a coordination.k8s.io Lease, electing one process for a job.
+
+        The lease is taken if it does not exist, is held by ``identity`` or has
+        not been renewed within its duration. The holder must call again before
+        ``duration`` seconds pass to keep it.
+
+        :param lease_api: A CoordinationV1Api client.
+        :param name: Name of the lease.
+        :type name: str
+        :param namespace: Namespace of the lease.
+        :type namespace: str
+        :param identity: Holder identity of this process.
+        :type identity: str
+        :param duration: Seconds the lease stays held without a renewal.
+        :type duration: int
+        :returns: Whether ``identity`` holds the lease.
+        :raises ApiException: On errors other than a lost race, e.g. 403 without access to leases.
+    """
+    now = datetime.now (timezone.utc)
+    try:
+        try:
+            lease = lease_api.read_namespaced_lease (name, namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            lease_api.create_namespaced_lease (namespace, k8s_client.V1Lease (
+                metadata=k8s_client.V1ObjectMeta (name=name),
+                spec=k8s_client.V1LeaseSpec (
+                    holder_identity=identity,
+                    lease_duration_seconds=duration,
+                    acquire_time=now,
+                    renew_time=now)))
+            return True
+        spec = lease.spec
+        if spec.holder_identity != identity:
+            renewed = spec.renew_time
+            ttl = spec.lease_duration_seconds or duration
+            if renewed is not None and (now - renewed).total_seconds () < ttl:
+                return False
+            spec.holder_identity = identity
+            spec.acquire_time = now
+        spec.renew_time = now
+        spec.lease_duration_seconds = duration
+        """ The lease's resourceVersion makes a concurrent take over fail with a conflict. """
+        lease_api.replace_namespaced_lease (name, namespace, lease)
+        return True
+    except ApiException as e:
+        if e.status == 409:
+            logger.debug (f"-- lost the race for lease {name}")
+            return False
+        raise
@@ -0,0 +1,359 @@
+import logging
+
+logger = logging.getLogger (__name__)
+
+""" Build Kubernetes manifests as API dicts straight from the system model.
+
+    Each builder produces the object the template of the same name renders,
+    without rendering YAML text and parsing it back. The templates in
+    tycho/template stay the reference: they are used instead of a builder
+    when TYCHO_MANIFEST_TEMPLATES=true, or when a configured template path
+    overrides them (see :meth:`tycho.tycho_utils.TemplateUtils.render_manifests`).
+"""
+
+
+def _int (value):
+    """ Integers stay integers, as YAML would read them from a template. """
+    try:
+        return int (value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _resources (limits, gpu_resource_name):
+    """ A container's limits or requests, or None if none are set. """
+    resources = {}
+    if limits:
+        if limits.cpus != None:
+            resources["cpu"] = str (limits.cpus)
+            resources["memory"] = str (limits.memory)
+        if limits.gpus != None:
+            resources[gpu_resource_name] = limits.gpus
+        if limits.ephemeralStorage not in (None, "0", ""):
+            resources["ephemeral-storage"] = limits.ephemeralStorage
+    return resources or None
+
+
+def _security_context (security_context, fs_group=False):
+    context = {}
+    for key, name in (("run_as_user", "runAsUser"), ("run_as_group", "runAsGroup")) + \
+            ((("fs_group", "fsGroup"),) if fs_group else ()):
+        if security_context.get (key):
+            context[name] = _int (security_context[key])
+    return context
+
+
+def _probe (probe):
+    """ A liveness or readiness probe. """
+    manifest = {}
+    port = getattr (probe, "port", None)
+    path = getattr (probe, "path", None)
+    if probe.cmd:
+        manifest["exec"] = { "command" : list (probe.cmd) }
+    elif port and path:
+        manifest["httpGet"] = { "path" : path, "port" : _int (port) }
+        if getattr (probe, "httpHeaders", None):
+            manifest["httpGet"]["httpHeaders"] = [
+                { "name" : name, "value" : value } for name, value in probe.httpHeaders.items ()
+            ]
+    elif port:
+        manifest["tcpSocket"] = { "port" : _int (port) }
+    for attribute, name in (("delay", "initialDelaySeconds"), ("period", "periodSeconds"),
+                            ("threshold", "failureThreshold")):
+        if getattr (probe, attribute):
+            manifest[name] = _int (getattr (probe, attribute))
+    return manifest
+
+
+def _prefix_env (system):
+    if system.amb:
+        prefix = f"/private/{system.system_name}/{system.username}/{system.identifier}"
+    else:
+        prefix = "/"
+    return [ { "name" : "NB_PREFIX", "value" : prefix }, { "name" : "FB_BASEURL", "value" : prefix } ]
+
+
+def _env (system, container):
+    user = [
+        { "name" : "GUID", "value" : str (system.identifier) },
+        { "name" : "USER_NAME", "value" : str (system.username) },
+        { "name" : "USER", "value" : str (system.username) },
+    ]
+    host = [ { "name" : "HOST", "value" : str (system.host) } ]
+    if container.env:
+        env = [ { "name" : e[0], "value" : str (e[1]) } for e in container.env ] + user
+        env.append ({ "name" : "ACCESS_TOKEN", "value" : str (system.access_token) })
+        env.extend ({ "name" : key, "value" : str (value) } for key, value in system.extra_container_env.items ())
+        env += _prefix_env (system) + host
+    else:
+        env = host + user + _prefix_env (system)
+    env.extend (
+        { "name" : key, "value" : str (value) }
+        for key, value in (system.system_env or {}).items ()
+        if isinstance (value, (str, int, float)))
+    return env
+
+
+def _init_container (system):
+    home = f"{system.parent_dir}/{system.subpath_dir}"
+    commands = [ f"mkdir -p {home}", f"mkdir -p {system.parent_dir}/{system.shared_dir}" ]
+    if system.gitea_integration == True:
+        commands += [
+            f"mkdir -p {home}/.ssh",
+            f'echo -e "Host {system.gitea_host}\\n     Hostname {system.gitea_service_name}\\n'
+            f'     User {system.gitea_user}\\n     IdentityFile ~/.ssh/id_gitea" > {home}/.ssh/config',
+        ]
+    commands += [ f"ls -aln {system.parent_dir}", "echo OK" ]
+    container = {
+        "name"  : "volume-tasks",
+        "image" : f"{system.init_image_repository}:{system.init_image_tag}",
+    }
+    security_context = _security_context (system.init_security_context)
+    if security_context:
+        container["securityContext"] = security_context
+    resources = { "memory" : system.init_memory, "cpu" : system.init_cpus }
+    container.update ({
+        "resources"    : { "requests" : dict (resources), "limits" : dict (resources) },
+        "command"      : [ "sh", "-c" ],
+        "args"         : [ " && ".join (commands) ],
+        "volumeMounts" : [ { "name" : system.stdnfs_pvc, "mountPath" : system.parent_dir } ],
+    })
+    return container
+
+
+def _container (system, container):
+    manifest = { "name" : container.name, "image" : container.image }
+    security_context = _security_context (system.security_context)
+    if security_context:
+        manifest["securityContext"] = security_context
+    if container.command:
+        manifest["command"] = container.command
+    manifest["env"] = _env (system, container)
+    if container.expose:
+        manifest["ports"] = [
+            { "containerPort" : _int (port["containerPort"]), "protocol" : "TCP" } for port in container.expose
+        ]
+    if container.limits or container.requests:
+        manifest["resources"] = {
+            "limits"   : _resources (container.limits, system.gpu_resource_name),
+            "requests" : _resources (container.requests, system.gpu_resource_name),
+        }
+    mounts = []
+    if getattr (system, "irods_enabled", False) == True:
+        mounts.append ({ "name" : "nfs", "mountPath" : "/home/nfs" })
+    if system.gitea_integration == True:
+        mounts.append ({
+            "name"      : f"{system.username_all_hyphens}-id-gitea",
+            "mountPath" : f"{system.parent_dir}/{system.subpath_dir}/.ssh/id_gitea",
+            "subPath"   : "id_gitea",
+            "readOnly"  : True,
+        })
+    if container.volumes:
+        mounts.extend (
+            { "name" : volume["volume_name"], "mountPath" : volume["path"], "subPath" : volume["subpath"], "readOnly" : False }
+            for volume in system.volumes if volume["container_name"] == container.name)
+    manifest["volumeMounts"] = mounts
+    for attribute, name in (("liveness_probe", "livenessProbe"), ("readiness_probe", "readinessProbe")):
+        probe = getattr (container, attribute, None)
+        if probe:
+            manifest[name] = _probe (probe)
+    return manifest
+
+
+def pod_manifest (system):
+    """ The pod of a system, as rendered by pod.yaml.
+
+        Probe delays, periods and thresholds are set on the probe itself;
+        pod.yaml puts them beside it, where the API server drops them.
+    """
+    spec = {}
+    if system.serviceaccount:
+        spec["serviceAccountName"] = system.serviceaccount
+    if system.containers:
+        first = system.containers[0]
+        if first.limits and first.limits.gpus != None:
+            spec["tolerations"] = [
+                { "key" : system.gpu_resource_name, "operator" : "Exists", "effect" : "NoSchedule" }
+            ]
+        security_context = _security_context (system.security_context, fs_group=True)
+        if security_context:
+            spec["securityContext"] = security_context
+        if system.enable_init_container == "true" and system.create_home_dirs == "true" and \
+                system.dev_phase != "test":
+            spec["initContainers"] = [ _init_container (system) ]
+    spec["containers"] = [ _container (system, container) for container in system.containers ]
+    volumes = []
+    if getattr (system, "irods_enabled", False) == True:
+        volumes.append ({ "name" : "nfs", "nfs" : { "server" : system.nfsrods_host, "path" : "/" } })
+    if system.gitea_integration == True:
+        volumes.append ({
+            "name"   : f"{system.username_all_hyphens}-id-gitea",
+            "secret" : { "secretName" : f"{system.username_all_hyphens}-id-gitea", "defaultMode" : 0o600 },
+        })
+    for container in system.containers:
+        if container.volumes:
+            volumes.extend (
+                { "name" : volume["volume_name"], "persistentVolumeClaim" : { "claimName" : volume["pvc_name"] } }
+                for volume in system.volumes
+                if volume["container_name"] == container.name and volume["pvc_name"] != None)
+    spec["volumes"] = volumes
+    return {
+        "apiVersion" : "v1",
+        "kind"       : "Pod",
+        "metadata"   : {
+            "name"   : system.name,
+            "labels" : {
+                "name"              : system.name,
+                "username"          : system.username,
+                "app-name"          : system.system_name,
+                "original-app-name" : system.system_name,
+                "reaper-label"      : system.system_name,
+                "executor"          : "tycho",
+                "tycho-guid"        : system.identifier,
+                "tycho-app-id"      : getattr (system, "app_id", None),
+            },
+        },
+        "spec" : spec,
+    }
+
+
+def _ambassador_mapping (system):
+    """ The Ambassador mapping annotation of a system's service. """
+    prefix = f"/private/{system.system_name}/{system.username}/{system.identifier}/{system.conn_string}"
+    lines = [
+        "---",
+        "apiVersion: ambassador/v1",
+        "kind:  Mapping",
+        f"name: {system.name}-mapping",
+    ]
+    if len (system.ambassador_id) > 0:
+        lines.append (f"ambassador_id: {system.ambassador_id}")
+    lines += [ f"prefix: {prefix}", f"service: {system.name}:{system.system_port}" ]
+    if system.dev_phase != 'dev':
+        lines += [ "headers:", f"    REMOTE_USER: {system.username}" ]
+    if system.proxy_rewrite["enabled"] == True:
+        if system.proxy_rewrite["target"] == None:
+            lines.append (f"rewrite: {prefix}")
+        else:
+            lines += [
+                f"rewrite: {system.proxy_rewrite['target']}",
+                "add_response_headers:",
+                f"  X-Original-Path: {prefix}",
+            ]
+    lines += [
+        "retry_policy:",
+        "  retry_on: gateway-error",
+        "  num_retries: 10",
+        "bypass_auth: true",
+        "timeout_ms: 300000",
+        "idle_timeout_ms: 500000",
+        "connect_timeout_ms: 500000",
+        "use_websocket: true",
+    ]
+    return "\n".join (lines) + "\n"
+
+
+def service_manifest (system, service, create_deployment_api_response):
+    """ The service exposing a container of a system, as rendered by service.yaml. """
+    metadata = {
+        "labels" : {
+            "name"        : service.name,
+            "username"    : system.username,
+            "executor"    : "tycho",
+            "tycho-app"   : system.name,
+            "tycho-guid"  : system.identifier,
+            "conn_string" : system.conn_string or None,
+        },
+        "ownerReferences" : [ {
+            "apiVersion" : "apps/v1",
+            "controller" : True,
+            "kind"       : "Deployment",
+            "name"       : create_deployment_api_response.metadata.name,
+            "uid"        : create_deployment_api_response.metadata.uid,
+        } ],
+        "name" : service.name,
+    }
+    if system.amb:
+        metadata["annotations"] = { "getambassador.io/config" : _ambassador_mapping (system) }
+    ports = []
+    for container in system.containers:
+        if container.name == service.name_noid:
+            ports.extend (
+                {
+                    "name"       : f"port-{index}",
+                    "port"       : _int (port["containerPort"]),
+                    "protocol"   : "TCP",
+                    "targetPort" : _int (port["containerPort"]),
+                }
+                for index, port in enumerate (container.ports, start=1))
+    return {
+        "apiVersion" : "v1",
+        "kind"       : "Service",
+        "metadata"   : metadata,
+        "spec"       : {
+            "type"     : "ClusterIP" if system.amb else "LoadBalancer",
+            "selector" : { "name" : system.name },
+            "ports"    : ports,
+        },
+    }
+
+
+def network_policy_manifest (system):
+    """ The network policy of a system, as rendered by policy/tycho-default-netpolicy.yaml. """
+    ingress = []
+    if len (system.services) > 0:
+        sources = [
+            { "ipBlock" : { "cidr" : ip_block } }
+            for service in system.services.values () for ip_block in service.clients
+        ]
+        sources.append ({ "podSelector" : { "matchLabels" : { "tycho-guid" : system.identifier } } })
+        ingress.append ({
+            "from"  : sources,
+            "ports" : [ { "protocol" : "TCP", "port" : service.port } for service in system.services.values () ],
+        })
+    return {
+        "kind"       : "NetworkPolicy",
+        "apiVersion" : "networking.k8s.io/v1",
+        "metadata"   : {
+            "name"   : f"{system.identifier}-netpolicy",
+            "labels" : { "executor" : "tycho", "tycho-guid" : system.identifier },
+        },
+        "spec" : {
+            "podSelector" : { "matchLabels" : { "tycho-guid" : system.identifier } },
+            "policyTypes" : [ "Ingress", "Egress" ],
+            "ingress"     : ingress,
+        },
+    }
+
+
+def patch_manifest (system_modify):
+    """ The deployment patch of a modify request, as rendered by patch.yaml. Empty without changes. """
+    if not system_modify.patch:
+        return None
+    template = {}
+    if len (system_modify.labels) > 0:
+        template["metadata"] = { "labels" : dict (system_modify.labels) }
+    if len (system_modify.resources) > 0:
+        template["spec"] = {
+            "containers" : [
+                {
+                    "resources" : {
+                        "limits"   : dict (system_modify.resources),
+                        "requests" : dict (system_modify.resources),
+                    },
+                    "name"  : container.name,
+                    "image" : container.image,
+                }
+                for container in system_modify.containers
+            ]
+        }
+    return { "spec" : { "template" : template } }
+
+
+""" Builders by the template they replace. Each takes that template's context. """
+BUILDERS = {
+    "pod.yaml"                            : lambda system, **context: pod_manifest (system),
+    "service.yaml"                        : service_manifest,
+    "policy/tycho-default-netpolicy.yaml" : lambda system, **context: network_policy_manifest (system),
+    "patch.yaml"                          : patch_manifest,
+}
@@ -7,10 +7,6 @@ import uuid
 import yaml
 from tycho.tycho_utils import TemplateUtils
 
-from cryptography.hazmat.primitives import serialization as crypto_serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.backends import default_backend as crypto_default_backend
-
 logger = logging.getLogger (__name__)
 
 
@@ -197,11 +193,11 @@ class System:
             service.name = f"{name}-{self.identifier}"
             service.name_noid =  name
         self.volumes = Volumes(self.identifier, containers).process_volumes()
-        self.source_text = None
+        self._source_text = None
         self.system_port = None
         self.ambassador_id = self._get_ambassador_id()
         """ System environment variables """
-        self.system_env = dict(principal)
+        self.system_env = { k : v for k, v in principal.items () if k != "nfsrods_uid" }
         """ System tags """
         self.username = principal.get("username")
         username_remove_us = self.username.replace("_", "-")
@@ -226,8 +222,9 @@ class System:
         self.default_run_as_user = default_security_context.get('uid', '1000')
         self.default_run_as_group = default_security_context.get('gid', '1000')
         """Override container security context"""
-        if os.environ.get("NFSRODS_UID"):
-            self.security_context = { "run_as_user": os.environ.get("NFSRODS_UID")}
+        nfsrods_uid = principal.get("nfsrods_uid") or os.environ.get("NFSRODS_UID")
+        if nfsrods_uid:
+            self.security_context = { "run_as_user": nfsrods_uid}
         else:
             self.security_context = security_context
         """init security context"""
@@ -254,11 +251,23 @@ class System:
         self.gitea_service_name = os.environ.get("GITEA_SERVICE_NAME", " ")
         self.ambassador_service_name = os.environ.get("AMBASSADOR_SVC_NAME", "")
 
+    @property
+    def source_text (self):
+        """ YAML of the system, for the docker-compose backplane. Dumped on first use. """
+        if self._source_text is None:
+            self._source_text = yaml.dump (self)
+        return self._source_text
+
+    @source_text.setter
+    def source_text (self, text):
+        self._source_text = text
+
     @staticmethod
-    def set_security_context(sc_from_registry):
+    def set_security_context(sc_from_registry, nfsrods_uid=None):
         security_context: dict[str, Any] = {}
-        if os.environ.get("NFSRODS_UID"):
-            security_context["run_as_user"] = os.environ.get("NFSRODS_UID")
+        nfsrods_uid = nfsrods_uid or os.environ.get("NFSRODS_UID")
+        if nfsrods_uid:
+            security_context["run_as_user"] = nfsrods_uid
         else:
             security_context["run_as_user"] = sc_from_registry.get("runAsUser")
         if os.environ.get("TYCHO_APP_RUN_AS_USER"):
@@ -318,12 +327,14 @@ class System:
         """ Supply this system as a context to a template.
         
             :param template: Template 
+            :returns: The manifests, built directly unless the template is to be rendered.
+                See :meth:`tycho.tycho_utils.TemplateUtils.render_manifests`.
         """
         final_context = { "system" : self }
         for n, v in context.items ():
             final_context[n] = v
         generator = TemplateUtils (config=self.config)
-        template = generator.render (template, context=final_context)
+        template = generator.render_manifests (template, context=final_context)
         logger.debug (f"--generated template: {template}")
         return template
     
@@ -347,9 +358,9 @@ class System:
             :param env: Dictionary of settings.
             :param services: Service specifications - networking configuration.
         """
-        security_context = System.set_security_context(system.get("security_context", {}))
-        init_security_context = System.set_init_security_context(system.get("security_context", {}))
         principal = json.loads(principal)
+        security_context = System.set_security_context(system.get("security_context", {}), principal.get("nfsrods_uid"))
+        init_security_context = System.set_init_security_context(system.get("security_context", {}))
         identifier = System.get_identifier()
         containers = []
         if env != None:
@@ -365,13 +376,9 @@ class System:
             if system_port != None: env['system_port'] = system_port
             else: env['system_port'] = 8000
             logger.debug ("applying environment settings.")
-            system_template = yaml.dump (system)
-            logger.debug (f"System.parse - system_template:\n{json.dumps(system_template,indent=2)}")
             logger.debug (f"System.parse - env:\n{json.dumps(env,indent=2)}")
-            system_rendered = TemplateUtils.render_text(template_text=system_template,context=env)
-            logger.debug (f"System.parse - system_rendered:\n {system_rendered}")
-            for system_render in system_rendered:
-                system = system_render
+            system = TemplateUtils.render_structure (system, env)
+            logger.debug (f"System.parse - system_rendered:\n {system}")
 
         """ Model each service. """
         logger.debug (f"compose {system}")
@@ -461,9 +468,7 @@ class System:
         if spec.get('proxy_rewrite_rule') != None:
            system_specification["proxy_rewrite"]["enabled"] = spec.get('proxy_rewrite_rule')
         logger.debug (f"parsed-system: {json.dumps(system_specification, indent=2)}")
-        system = System(**system_specification)
-        system.source_text = yaml.dump (system)
-        return system
+        return System(**system_specification)
 
     def __repr__(self):
         return f"name:{self.name} containers:{self.containers}"
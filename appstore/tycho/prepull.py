@@ -0,0 +1,138 @@
+import hashlib
+import logging
+from kubernetes import client as k8s_client
+from kubernetes.client.rest import ApiException
+
+logger = logging.getLogger (__name__)
+
+""" Annotation recording which image set a pre-pull DaemonSet was built for. """
+IMAGES_ANNOTATION = "tycho/prepull-images"
+
+
+class PrePuller:
+    """ Keep every app image present on every node with a DaemonSet.
+
+        Each image becomes an init container that exits immediately, so the
+        kubelet on every node pulls it; a pause container then holds the pod.
+        The image set is hashed into an annotation so the DaemonSet is only
+        replaced when the registry's images change.
+
+        Init containers run in order, so an image that cannot be pulled, or
+        that has no ``sh``, holds up the images after it on that node.
+    """
+
+    def __init__(self, apps_api, core_api, namespace, name="tycho-prepull",
+                 pause_image="registry.k8s.io/pause:3.9"):
+        """ Construct a pre-puller.
+
+            :param apps_api: An AppsV1Api client.
+            :param core_api: A CoreV1Api client.
+            :param namespace: Namespace to run the DaemonSet in.
+            :type namespace: str
+            :param name: Name of the DaemonSet.
+            :type name: str
+            :param pause_image: Image of the container that keeps each pod running.
+            :type pause_image: str
+        """
+        self.apps_api = apps_api
+        self.core_api = core_api
+        self.namespace = namespace
+        self.name = name
+        self.pause_image = pause_image
+
+    @staticmethod
+    def digest (images):
+        return hashlib.sha1 ("\n".join (sorted (images)).encode ()).hexdigest ()
+
+    def manifest (self, images):
+        """ The DaemonSet pulling the images. """
+        images = sorted (set (images))
+        small = k8s_client.V1ResourceRequirements (
+            requests={ "cpu" : "10m", "memory" : "16Mi" },
+            limits={ "cpu" : "50m", "memory" : "32Mi" })
+        labels = { "name" : self.name }
+        return k8s_client.V1DaemonSet (
+            api_version="apps/v1",
+            kind="DaemonSet",
+            metadata=k8s_client.V1ObjectMeta (
+                name=self.name,
+                labels=labels,
+                annotations={ IMAGES_ANNOTATION : self.digest (images) }),
+            spec=k8s_client.V1DaemonSetSpec (
+                selector=k8s_client.V1LabelSelector (match_labels={ "name" : self.name }),
+                template=k8s_client.V1PodTemplateSpec (
+                    metadata=k8s_client.V1ObjectMeta (labels=labels),
+                    spec=k8s_client.V1PodSpec (
+                        init_containers=[
+                            k8s_client.V1Container (
+                                name=f"pull-{index}",
+                                image=image,
+                                image_pull_policy="IfNotPresent",
+                                command=[ "sh", "-c", "exit 0" ],
+                                resources=small)
+                            for index, image in enumerate (images)
+                        ],
+                        containers=[
+                            k8s_client.V1Container (
+                                name="pause",
+                                image=self.pause_image,
+                                resources=small)
+                        ],
+                        tolerations=[ k8s_client.V1Toleration (operator="Exists") ]))))
+
+    def apply (self, images):
+        """ Create or update the DaemonSet for an image set.
+
+            :param images: Images every node should have.
+            :type images: iterable of str
+            :returns: One of created, updated or unchanged.
+        """
+        manifest = self.manifest (images)
+        try:
+            current = self.apps_api.read_namespaced_daemon_set (self.name, self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            self.apps_api.create_namespaced_daemon_set (self.namespace, manifest)
+            logger.info (f"-- created pre-pull daemonset {self.name} for {len(manifest.spec.template.spec.init_containers)} images")
+            return "created"
+        annotations = current.metadata.annotations or {}
+        if annotations.get (IMAGES_ANNOTATION) == manifest.metadata.annotations[IMAGES_ANNOTATION]:
+            return "unchanged"
+        manifest.metadata.resource_version = current.metadata.resource_version
+        self.apps_api.replace_namespaced_daemon_set (self.name, self.namespace, manifest)
+        logger.info (f"-- updated pre-pull daemonset {self.name} for {len(manifest.spec.template.spec.init_containers)} images")
+        return "updated"
+
+    def status (self):
+        """ Pull state of each image on each node.
+
+            :returns: A dict mapping node names to dicts mapping images to one of
+                pulled, pulling or failed.
+        """
+        pods = self.core_api.list_namespaced_pod (
+            self.namespace, label_selector=f"name={self.name}")
+        nodes = {}
+        for pod in pods.items:
+            node = pod.spec.node_name or pod.metadata.name
+            """ Statuses report the image as normalized by the runtime; match on the container name. """
+            states = {
+                container.name : self.pull_state (container)
+                for container in (pod.status and pod.status.init_container_statuses) or []
+            }
+            nodes[node] = {
+                container.image : states.get (container.name, "pulling")
+                for container in pod.spec.init_containers or []
+            }
+        return nodes
+
+    @staticmethod
+    def pull_state (container_status):
+        state = container_status.state
+        if state is not None:
+            if state.terminated is not None or state.running is not None:
+                return "pulled"
+            if state.waiting is not None and state.waiting.reason in (
+                    "ErrImagePull", "ImagePullBackOff", "InvalidImageName"):
+                return "failed"
+        return "pulling"
@@ -0,0 +1,1575 @@
+import contextlib
+import copy
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import jinja2
+import yaml
+from django.test import SimpleTestCase
+from kubernetes import client as k8s_client
+from kubernetes.client import ApiClient
+from kubernetes.client.rest import ApiException
+
+from tycho.capacity import CapacityIndex
+from tycho.client import TychoClient, TychoSystem
+from tycho.config import Config
+from tycho.context import ContextFactory, Principal, TychoContext
+from tycho.exceptions import ModifyException, StartException
+from tycho.factory import ComputeFactory
+from tycho.idle import IdleReaper, cpu_millicores
+from tycho.informer import DeploymentInformer
+from tycho import actions, manifests
+from tycho.kube import KubernetesCompute
+from tycho.model import System
+from tycho.prepull import IMAGES_ANNOTATION, PrePuller
+from tycho.tycho_utils import TemplateUtils, TTLCache
+from tycho.warmpool import STANDBY_LABEL, STANDBY_USERNAME, WarmPool
+
+logger = logging.getLogger(__name__)
+
+
+class FakeResponse:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode()
+        self.headers = headers or {}
+
+    def stream(self, amt=None, decode_content=False):
+        """ Read as a watch response. """
+        yield self.content
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class FakeSession:
+    """
+    Serve specs for apps by URL, counting how many requests are in flight.
+    """
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def get(self, url, timeout=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay)
+            if "/broken/" in url:
+                raise ConnectionError(f"cannot reach {url}")
+            if url.endswith("docker-compose.yaml"):
+                app_id = url.split("/")[-2]
+                return FakeResponse(200, f"services:\n  {app_id}:\n    image: {app_id}:{{{{ tag }}}}\n")
+            if url.endswith(".env"):
+                return FakeResponse(200, "A=1\n")
+            return FakeResponse(200)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def make_context(app_ids):
+    context = TychoContext.__new__(TychoContext)
+    context.http_session = FakeSession()
+    context.http_timeout = 1
+    context._fetch_locks = {}
+    context._fetch_locks_lock = threading.Lock()
+    context.spec_versions = {}
+    context.registry = {"settings": {"tag": "latest"}}
+    context.apps = {
+        app_id: {
+            "spec": f"http://registry/{app_id}/docker-compose.yaml",
+            "icon": f"http://registry/{app_id}/icon.png",
+        }
+        for app_id in app_ids
+    }
+    return context
+
+
+class TestPrefetch(SimpleTestCase):
+    def test_prefetch_memoizes_every_app(self):
+        context = make_context(["a", "b", "c"])
+        summary = context.prefetch(max_workers=4)
+        self.assertEqual(summary["tasks"], 9)
+        self.assertEqual(summary["failed"], [])
+        for app_id in ["a", "b", "c"]:
+            self.assertEqual(
+                context.apps[app_id]["definition"]["services"][app_id]["image"],
+                f"{app_id}:latest",
+            )
+            self.assertEqual(context.apps[app_id]["env_obj"], "A=1\n")
+
+    def test_prefetch_is_bounded_and_isolates_failures(self):
+        context = make_context(["a", "b", "broken", "c", "d"])
+        summary = context.prefetch(max_workers=3)
+        self.assertLessEqual(context.http_session.peak, 3)
+        self.assertGreater(context.http_session.peak, 1)
+        self.assertEqual({app_id for app_id, _ in summary["failed"]}, {"broken"})
+        self.assertIn("definition", context.apps["d"])
+
+
+class TestDefinition(SimpleTestCase):
+    def test_spec_is_fetched_once_and_copied(self):
+        context = make_context(["a"])
+        context.http_session.delay = 0
+        calls = []
+        get = context.http_session.get
+        context.http_session.get = lambda url, timeout=None: calls.append(url) or get(url, timeout)
+
+        definition = context.get_definition("a")
+        spec = context.get_spec("a")
+        spec["services"]["a"]["image"] = "changed"
+        spec["security_context"] = {}
+
+        self.assertEqual(len(calls), 1)
+        self.assertIs(context.get_definition("a"), definition)
+        self.assertEqual(definition, {"services": {"a": {"image": "a:latest"}}})
+
+    def test_fetch_failure_is_not_cached(self):
+        context = make_context(["broken"])
+        context.http_session.delay = 0
+        self.assertIsNone(context.get_definition("broken"))
+        self.assertNotIn("definition", context.apps["broken"])
+        with self.assertRaises(ConnectionError):
+            context.get_spec("broken")
+
+
+REGISTRY = """
+settings: {{}}
+contexts:
+  test:
+    apps:
+      {app_id}:
+        name: {app_id}
+        spec: http://registry/{app_id}/docker-compose.yaml
+        docs: http://registry/{app_id}/docs
+"""
+
+
+class RegistrySession:
+    """
+    Serve config files with ETags, answering 304 to a matching If-None-Match.
+    """
+
+    def __init__(self, files):
+        self.files = files
+        self.cache = mock.Mock()
+
+    @contextlib.contextmanager
+    def cache_disabled(self):
+        yield
+
+    def get(self, url, headers=None, timeout=None):
+        text = self.files[url.rsplit("/", 1)[1]]
+        etag = f'"{hashlib.sha1(text.encode()).hexdigest()}"'
+        if (headers or {}).get("If-None-Match") == etag:
+            return FakeResponse(304)
+        return FakeResponse(200, text, {"ETag": etag})
+
+
+class TestRegistryReload(SimpleTestCase):
+    def setUp(self):
+        self.session = RegistrySession({
+            "app-registry.yaml": REGISTRY.format(app_id="a"),
+            "app-defaults.yaml": "{}",
+        })
+        with mock.patch("tycho.context.CachedSession", return_value=self.session):
+            self.context = TychoContext(
+                product="test", tycho_config_url="http://registry/main"
+            )
+
+    def test_unchanged_registry_is_not_reloaded(self):
+        self.assertIsNone(self.context.reload())
+        self.session.cache.clear.assert_not_called()
+
+    def test_changed_registry_loads_new_generation(self):
+        self.session.files["app-registry.yaml"] = REGISTRY.format(app_id="b")
+        context = self.context.reload()
+        self.assertEqual(list(context.apps), ["b"])
+        self.assertEqual(context.generation, self.context.generation + 1)
+        self.assertEqual(list(self.context.apps), ["a"])
+        self.session.cache.clear.assert_called_once()
+        self.assertIsNone(context.reload())
+
+    def test_changed_spec_loads_new_generation(self):
+        self.session.files["docker-compose.yaml"] = "services:\n  a:\n    image: a:1\n"
+        self.assertEqual(self.context.get_definition("a")["services"]["a"]["image"], "a:1")
+        self.assertIsNone(self.context.reload())
+        self.session.files["docker-compose.yaml"] = "services:\n  a:\n    image: a:2\n"
+        context = self.context.reload()
+        self.assertEqual(context.generation, self.context.generation + 1)
+        self.assertEqual(context.get_definition("a")["services"]["a"]["image"], "a:2")
+        self.assertIsNone(context.reload())
+
+    def test_factory_swaps_in_new_generation(self):
+        factory = ContextFactory.__new__(ContextFactory)
+        factory.contexts = {"live": self.context}
+        self.assertIsNone(factory.refresh("live"))
+        self.assertIs(factory.current("live"), self.context)
+        self.session.files["app-registry.yaml"] = REGISTRY.format(app_id="b")
+        context = factory.refresh("live")
+        self.assertIs(factory.current("live"), context)
+
+
+class TestTTLCache(SimpleTestCase):
+    def test_concurrent_misses_share_one_load(self):
+        cache = TTLCache(ttl=60)
+        release = threading.Event()
+        calls = []
+
+        def load():
+            calls.append(1)
+            release.wait(5)
+            return "value"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get("k", load)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        while cache.stats()["coalesced"] < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 5)
+        self.assertEqual(cache.get("k", load), "value")
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_entries_expire_and_invalidate(self):
+        cache = TTLCache(ttl=0.05)
+        counter = iter(range(100))
+        self.assertEqual(cache.get("k", lambda: next(counter)), 0)
+        self.assertEqual(cache.get("k", lambda: next(counter)), 0)
+        time.sleep(0.06)
+        self.assertEqual(cache.get("k", lambda: next(counter)), 1)
+        cache.invalidate(lambda key, value: key == "k")
+        self.assertEqual(cache.get("k", lambda: next(counter)), 2)
+
+    def test_errors_are_not_cached(self):
+        cache = TTLCache(ttl=60)
+
+        def fail():
+            raise ValueError("backend down")
+
+        with self.assertRaises(ValueError):
+            cache.get("k", fail)
+        self.assertEqual(cache.get("k", lambda: "ok"), "ok")
+
+    def test_invalidate_discards_load_in_flight(self):
+        cache = TTLCache(ttl=60)
+
+        def load():
+            cache.invalidate()
+            return "stale"
+
+        self.assertEqual(cache.get("k", load), "stale")
+        self.assertEqual(cache.get("k", lambda: "fresh"), "fresh")
+
+
+class TestStatusCache(SimpleTestCase):
+    def setUp(self):
+        self.client = TychoClient()
+        self.requests = []
+
+        def request(service, request):
+            self.requests.append((service, request))
+            return {
+                "status": "success",
+                "result": [{
+                    "name": "jupyter-ds", "app_id": "jupyter-ds",
+                    "sid": request.get("name", "1"),
+                    "ip_address": "x", "port": "8080", "username": "alice",
+                }] if service == "status" else {
+                    "name": "jupyter-ds", "sid": "3", "containers": {}, "conn_string": "",
+                },
+                "message": "",
+            }
+
+        self.client.request = request
+
+    def test_status_is_shared_until_delete(self):
+        self.client.status({"username": "alice"})
+        self.client.status({"username": "alice"})
+        self.client.status({"name": "2"})
+        self.assertEqual(len(self.requests), 2)
+        self.client.delete({"name": "1"})
+        self.client.status({"username": "alice"})
+        self.client.status({"name": "2"})
+        self.assertEqual(
+            [service for service, _ in self.requests],
+            ["status", "status", "delete", "status"],
+        )
+
+    def test_start_invalidates_the_users_status(self):
+        self.client.status({"username": "alice"})
+        self.client.status({"username": "bob"})
+        self.client.start({"principal": json.dumps({"username": "bob"})})
+        self.client.status({"username": "alice"})
+        self.client.status({"username": "bob"})
+        self.assertEqual(
+            [service for service, _ in self.requests],
+            ["status", "status", "start", "status"],
+        )
+
+
+def make_deployment(i):
+    """
+    A deployment shaped like the ones tycho creates, with the fields the API
+    server returns that status() never reads.
+    """
+    guid = f"{i:032x}"
+    labels = {
+        "executor": "tycho", "tycho-guid": guid, "username": f"user{i % 300}",
+        "name": f"jupyter-ds-{guid}", "app-name": f"jupyter-ds-{guid}",
+        "original-app-name": "jupyter-ds",
+    }
+    return {
+        "metadata": {
+            "name": f"jupyter-ds-{guid}", "namespace": "default", "uid": guid,
+            "resourceVersion": str(1000 + i), "generation": 1,
+            "creationTimestamp": f"2024-01-{1 + i % 28:02d}T0{i % 10}:0{i % 6}:1{i % 10}Z",
+            "labels": labels,
+            "annotations": {"deployment.kubernetes.io/revision": "1"},
+        },
+        "spec": {
+            "replicas": 1,
+            "selector": {"matchLabels": {"name": labels["name"]}},
+            "strategy": {"type": "RollingUpdate"},
+            "template": {
+                "metadata": {"labels": labels},
+                "spec": {
+                    "securityContext": {"fsGroup": 0, "runAsUser": 1000},
+                    "volumes": [
+                        {"name": "home", "persistentVolumeClaim": {"claimName": "stdnfs"}},
+                        {"name": "dshm", "emptyDir": {"medium": "Memory"}},
+                    ],
+                    "containers": [{
+                        "name": "jupyter-ds",
+                        "image": "containers.renci.org/helxplatform/jupyter-ds:v1",
+                        "ports": [{"containerPort": 8888, "protocol": "TCP"}],
+                        "env": [{"name": f"VAR_{n}", "value": str(n)} for n in range(12)],
+                        "resources": {
+                            "limits": {"cpu": "1", "memory": "4000M"},
+                            "requests": {"cpu": "500m", "memory": "2000M"},
+                        },
+                        "volumeMounts": [
+                            {"name": "home", "mountPath": "/home"},
+                            {"name": "dshm", "mountPath": "/dev/shm"},
+                        ],
+                    }],
+                },
+            },
+        },
+        "status": {
+            "replicas": 1, "readyReplicas": 1 if i % 3 else None,
+            "updatedReplicas": 1, "availableReplicas": 1, "observedGeneration": 1,
+            "conditions": [
+                {"type": "Available", "status": "True", "reason": "MinimumReplicasAvailable",
+                 "lastUpdateTime": "2024-01-01T00:00:00Z", "lastTransitionTime": "2024-01-01T00:00:00Z"},
+            ],
+        },
+    }
+
+
+class RecordedDeploymentsApi:
+    """
+    Answer list_namespaced_deployment from a recorded response body, the way
+    the kubernetes client would with and without _preload_content.
+    """
+
+    def __init__(self, body):
+        self.body = body
+        self.pages = 0
+
+    def list_namespaced_deployment(self, namespace, label_selector=None, limit=None,
+                                   _continue=None, _preload_content=True):
+        self.pages += 1
+        body = self.body
+        if label_selector:
+            page = json.loads(body)
+            wanted = dict(term.split("=") for term in label_selector.split(","))
+            page["items"] = [
+                item for item in page["items"]
+                if all(item["metadata"]["labels"].get(k) == v for k, v in wanted.items())
+            ]
+            body = json.dumps(page).encode()
+        if limit:
+            page = json.loads(body)
+            start = int(_continue or 0)
+            items = page["items"]
+            page["items"] = items[start:start + limit]
+            if start + limit < len(items):
+                page["metadata"]["continue"] = str(start + limit)
+            body = json.dumps(page).encode()
+        response = mock.Mock(data=body)
+        if not _preload_content:
+            return response
+        return ApiClient().deserialize(response, "V1DeploymentList")
+
+
+class TestRawStatus(SimpleTestCase):
+    def setUp(self):
+        body = {"kind": "DeploymentList", "apiVersion": "apps/v1", "metadata": {},
+                "items": [make_deployment(i) for i in range(2000)]}
+        self.compute = KubernetesCompute.__new__(KubernetesCompute)
+        self.compute.namespace = "default"
+        self.compute.informer = None
+        self.compute.extensions_api = RecordedDeploymentsApi(json.dumps(body).encode())
+
+    def status(self, raw):
+        env = {"TYCHO_STATUS_INFORMER": "false", "TYCHO_STATUS_RAW": "true" if raw else "false"}
+        with mock.patch.dict(os.environ, env):
+            start = time.perf_counter()
+            result = list(self.compute.status())
+            return result, time.perf_counter() - start
+
+    def test_raw_status_matches_model_status_and_is_faster(self):
+        model, model_seconds = self.status(raw=False)
+        raw, raw_seconds = self.status(raw=True)
+        self.assertEqual(len(raw), 2000)
+        self.assertEqual(raw, model)
+        logger.info(
+            f"status of 2000 deployments: models {model_seconds:.3f}s, "
+            f"raw {raw_seconds:.3f}s ({model_seconds / raw_seconds:.1f}x)"
+        )
+        self.assertLess(raw_seconds, model_seconds)
+
+    def test_raw_status_streams_pages(self):
+        self.compute.extensions_api.pages = 0
+        with mock.patch.dict(os.environ, {"TYCHO_STATUS_INFORMER": "false"}):
+            records = self.compute.status()
+            self.assertEqual(self.compute.extensions_api.pages, 0)
+            next(iter(records))
+        self.assertEqual(self.compute.extensions_api.pages, 1)
+
+    def test_status_is_listed_page_by_page(self):
+        self.compute.extensions_api.pages = 0
+        records = list(self.compute.iter_status(page_size=300))
+        self.assertEqual(len(records), 2000)
+        self.assertEqual(self.compute.extensions_api.pages, 7)
+        self.assertEqual(len({record["sid"] for record in records}), 2000)
+
+    def test_status_page_returns_cursor(self):
+        records, cursor = self.compute.status_page(limit=1500)
+        self.assertEqual(len(records), 1500)
+        records, cursor = self.compute.status_page(limit=1500, cursor=cursor)
+        self.assertEqual(len(records), 500)
+        self.assertIsNone(cursor)
+
+
+def deployment_model(i, **labels):
+    item = make_deployment(i)
+    item["metadata"]["labels"].update(labels)
+    return ApiClient().deserialize(mock.Mock(data=json.dumps(item)), "V1Deployment")
+
+
+class TestInformerIndex(SimpleTestCase):
+    def setUp(self):
+        body = {"kind": "DeploymentList", "apiVersion": "apps/v1", "metadata": {"resourceVersion": "1"},
+                "items": [make_deployment(i) for i in range(600)]}
+        self.api = RecordedDeploymentsApi(json.dumps(body).encode())
+        self.informer = DeploymentInformer(
+            self.api, "default", to_record=KubernetesCompute.deployment_status)
+        self.informer._list()
+
+    def test_events_update_the_username_and_guid_indexes(self):
+        events = []
+        self.informer.add_listener(lambda *event: events.append(event[0]))
+        guid = f"{1000:032x}"
+        self.informer._apply("ADDED", deployment_model(1000, username="alice"))
+        self.assertEqual([r["sid"] for r in self.informer.list(username="alice")], [guid])
+        self.assertEqual([r["username"] for r in self.informer.list(name=guid)], ["alice"])
+
+        self.informer._apply("MODIFIED", deployment_model(1000, username="bob"))
+        self.assertEqual(self.informer.list(username="alice"), [])
+        self.assertEqual([r["sid"] for r in self.informer.list(username="bob")], [guid])
+
+        self.informer._apply("DELETED", deployment_model(1000, username="bob"))
+        self.assertEqual(self.informer.list(username="bob"), [])
+        self.assertEqual(self.informer.list(name=guid), [])
+        self.assertEqual(len(self.informer.list()), 600)
+        self.assertEqual(events, ["ADDED", "MODIFIED", "DELETED"])
+
+    def test_status_from_the_index_matches_the_list(self):
+        compute = KubernetesCompute.__new__(KubernetesCompute)
+        compute.namespace = "default"
+        compute.extensions_api = self.api
+        compute.informer = self.informer
+        compute.informer_lock = threading.Lock()
+
+        def status(informer, **kwargs):
+            with mock.patch.dict(os.environ, {"TYCHO_STATUS_INFORMER": informer}):
+                return sorted(compute.status(**kwargs), key=lambda record: record["sid"])
+
+        for kwargs in [{"username": "user7"}, {"name": f"{42:032x}"}, {}]:
+            pages = self.api.pages
+            indexed = status("true", **kwargs)
+            self.assertEqual(self.api.pages, pages)
+            self.assertTrue(indexed)
+            self.assertEqual(indexed, status("false", **kwargs))
+
+
+class ExpiringDeploymentsApi:
+    """
+    List no deployments; the first watch finds its resourceVersion expired.
+    """
+
+    def __init__(self):
+        self.lists = 0
+        self.watches = 0
+
+    def list_namespaced_deployment(self, namespace, **kwargs):
+        if kwargs.get("watch"):
+            self.watches += 1
+            if self.watches == 1:
+                raise ApiException(status=410, reason="Gone")
+            time.sleep(0.01)
+            return FakeResponse(200, "")
+        self.lists += 1
+        return mock.Mock(items=[], metadata=mock.Mock(resource_version=str(self.lists)))
+
+
+class FailingDeploymentsApi:
+    """
+    List no deployments while ``failing`` is unset; fail every call while it is set.
+    """
+
+    def __init__(self):
+        self.failing = threading.Event()
+
+    def list_namespaced_deployment(self, namespace, **kwargs):
+        if self.failing.is_set():
+            raise ApiException(status=403, reason="Forbidden")
+        if kwargs.get("watch"):
+            time.sleep(0.01)
+            return FakeResponse(200, "")
+        return mock.Mock(items=[], metadata=mock.Mock(resource_version="1"))
+
+
+class TestInformerFailures(SimpleTestCase):
+    def wait_until(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_expired_watch_relists(self):
+        api = ExpiringDeploymentsApi()
+        informer = DeploymentInformer(api, "default", to_record=dict, retry_delay=5, watch_timeout=1)
+        informer.start()
+        try:
+            self.assertTrue(self.wait_until(lambda: api.lists >= 2))
+            self.assertEqual(informer._failures, 0)
+            self.assertTrue(informer.has_synced)
+        finally:
+            informer.stop()
+
+    def test_index_is_stale_after_repeated_failures(self):
+        api = FailingDeploymentsApi()
+        informer = DeploymentInformer(api, "default", to_record=dict, retry_delay=0.01, watch_timeout=1)
+        informer.start()
+        try:
+            self.assertTrue(informer.wait_for_sync(5))
+            api.failing.set()
+            self.assertTrue(self.wait_until(lambda: not informer.has_synced))
+            api.failing.clear()
+            self.assertTrue(self.wait_until(lambda: informer.has_synced))
+        finally:
+            informer.stop()
+
+
+class NamespaceApi:
+    """
+    Answer reads of named objects; anything else would be a namespace-wide list.
+    """
+
+    def __init__(self, claims=(), services=(), secrets=None):
+        self.claims = set(claims)
+        self.services = set(services)
+        self.secrets = secrets or {}
+        self.reads = []
+
+    def read(self, kind, names, name):
+        self.reads.append((kind, name))
+        if name not in names:
+            raise ApiException(status=404, reason="Not Found")
+        return mock.Mock()
+
+    def read_namespaced_persistent_volume_claim(self, name, namespace):
+        return self.read("pvc", self.claims, name)
+
+    def read_namespaced_service(self, name, namespace):
+        return self.read("service", self.services, name)
+
+    def read_namespaced_secret(self, name, namespace):
+        self.read("secret", self.secrets, name)
+        return mock.Mock(data=self.secrets[name])
+
+
+class TestLaunchLookups(SimpleTestCase):
+    def compute(self, api):
+        compute = KubernetesCompute.__new__(KubernetesCompute)
+        compute.api = api
+        return compute
+
+    def test_missing_volumes_are_found_by_name(self):
+        api = NamespaceApi(claims=["home"])
+        volumes = [{"volume_name": name} for name in ["stdnfs", "home", "data", "home"]]
+        self.assertEqual(self.compute(api).check_volumes(volumes, "default"), [2])
+        self.assertEqual(api.reads, [("pvc", "home"), ("pvc", "data")])
+
+    def test_ambassador_context(self):
+        compute = self.compute(NamespaceApi(services=["ambassador"]))
+        self.assertTrue(compute.is_ambassador_context("default", "ambassador"))
+        self.assertFalse(compute.is_ambassador_context("default", "other"))
+
+    def test_env_secret(self):
+        compute = self.compute(NamespaceApi(secrets={"app-env": {"A": "MQ=="}}))
+        self.assertEqual(compute.read_env_secret("app-env", "default"), {"A": "1"})
+        self.assertIsNone(compute.read_env_secret("other-env", "default"))
+
+
+class LaunchApi(NamespaceApi):
+    """
+    Take a fixed time for every create and record when each one ran.
+    """
+
+    def __init__(self, delay=0.2, fail=()):
+        super().__init__(services=["ambassador"])
+        self.delay = delay
+        self.fail = set(fail)
+        self.calls = []
+        self.deleted = []
+
+    def create(self, kind, name):
+        started = time.monotonic()
+        time.sleep(self.delay)
+        self.calls.append((kind, name, started, time.monotonic()))
+        if kind in self.fail:
+            raise ApiException(status=500, reason=f"{kind} failed")
+        port = mock.Mock(node_port=30000)
+        port.name = "http"
+        response = mock.Mock()
+        response.spec.ports = [port]
+        return response
+
+    def create_namespaced_network_policy(self, body, namespace):
+        response = self.create("policy", body["metadata"]["name"])
+        response.metadata.name = body["metadata"]["name"]
+        return response
+
+    def create_namespaced_service(self, body, namespace):
+        return self.create("service", body["metadata"]["name"])
+
+    def delete_namespaced_network_policy(self, name, namespace):
+        self.deleted.append(("policy", name))
+
+    def __getattr__(self, attr):
+        if attr.startswith("delete_collection_namespaced_"):
+            return lambda **kwargs: self.deleted.append(
+                (attr[len("delete_collection_namespaced_"):], kwargs["label_selector"])
+            )
+        raise AttributeError(attr)
+
+
+def make_system(containers=("app", "sidecar")):
+    system = mock.Mock(
+        volumes=[], system_name="app", ambassador_service_name="ambassador",
+        identifier="abc", username="user", conn_string="", amb=False,
+    )
+    system.name = "app-abc"
+    system.containers = []
+    for name in containers:
+        container = mock.Mock(env=[], ports=[])
+        container.name = name
+        system.containers.append(container)
+    system.services = {name: {"port": 80} for name in containers}
+    system.requires_network_policy.return_value = True
+
+    def render(template, context=None):
+        if template == "service.yaml":
+            return [{"metadata": {"name": context["service"]["name"]}}]
+        return [{"metadata": {"name": f"{system.name}-{template}"}}]
+
+    for name, service in system.services.items():
+        service["name"] = name
+    system.render.side_effect = render
+    return system
+
+
+class TestConcurrentLaunch(SimpleTestCase):
+    def compute(self, api):
+        compute = KubernetesCompute.__new__(KubernetesCompute)
+        compute.api = compute.extensions_api = compute.networking_api = api
+        compute.namespace = "default"
+        compute.warm_pool = None
+        compute.launch_executor = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(compute.launch_executor.shutdown)
+
+        def pod_to_deployment(name, *args, **kwargs):
+            return None, api.create("deployment", name)
+
+        compute.pod_to_deployment = pod_to_deployment
+        return compute
+
+    def test_independent_creates_overlap(self):
+        api = LaunchApi()
+        started = time.monotonic()
+        result = self.compute(api).start(make_system())
+        elapsed = time.monotonic() - started
+        self.assertEqual(list(result["containers"]), ["app", "sidecar"])
+        """ Policy alongside the deployment, then both services together. """
+        self.assertLess(elapsed, 4 * api.delay)
+        calls = {(kind, name): (start, end) for kind, name, start, end in api.calls}
+        deployment_created = calls[("deployment", "app-abc")][1]
+        for name in ("app", "sidecar"):
+            self.assertGreaterEqual(calls[("service", name)][0], deployment_created)
+
+    def test_failure_rolls_back_after_creates_finish(self):
+        api = LaunchApi(fail=["service"])
+        with self.assertRaises(StartException):
+            self.compute(api).start(make_system())
+        self.assertEqual(len([call for call in api.calls if call[0] == "service"]), 2)
+        self.assertIn(("policy", "app-abc-policy/tycho-default-netpolicy.yaml"), api.deleted)
+        self.assertIn(("deployment", "tycho-guid=app-abc"), api.deleted)
+
+    def test_failed_deployment_still_removes_policy(self):
+        api = LaunchApi(fail=["deployment"])
+        with self.assertRaises(StartException):
+            self.compute(api).start(make_system())
+        self.assertIn(("policy", "app-abc-policy/tycho-default-netpolicy.yaml"), api.deleted)
+        self.assertNotIn("service", [call[0] for call in api.calls])
+
+
+class TestStartMany(SimpleTestCase):
+    def context(self):
+        context = make_context(["app"])
+        context.client = TychoClient.__new__(TychoClient)
+        context.apps["app"]["services"] = {"app": 8888}
+        context.http_session.get = mock.Mock(
+            side_effect=lambda url, timeout=None: FakeResponse(
+                200,
+                "services:\n  app:\n    image: app\n    deploy:\n      resources:\n"
+                "        limits: {}\n        reservations: {}\n",
+            )
+            if url.endswith("docker-compose.yaml")
+            else FakeResponse(200, "A=1\n"),
+        )
+        return context
+
+    def test_spec_is_resolved_once_and_launches_overlap(self):
+        context = self.context()
+        launched = []
+
+        def start(request):
+            principal = json.loads(request["principal"])
+            time.sleep(0.1)
+            if principal["username"] == "broken":
+                raise ValueError("quota exceeded")
+            launched.append((principal["username"], request["system"]["services"]["app"]["cpus"]))
+            """ Each launch may change its own copy of the spec. """
+            request["system"]["services"]["app"]["cpus"] = "changed"
+            return TychoSystem(
+                status="ok",
+                result={
+                    "name": "app",
+                    "sid": principal["username"],
+                    "containers": {"app": {"ip_address": None, "port-1": 8888}},
+                    "conn_string": "",
+                },
+                message="",
+            )
+
+        context._start = start
+        usernames = [f"student{i}" for i in range(8)] + ["broken"]
+        started = time.monotonic()
+        results = context.start_many(
+            [Principal(username) for username in usernames],
+            "app",
+            {"cpus": 1},
+            "example.org",
+            max_workers=9,
+        )
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(set(results), set(usernames))
+        self.assertIsInstance(results["broken"], ValueError)
+        self.assertEqual(results["student3"].identifier, "student3")
+        self.assertEqual({cpus for _, cpus in launched}, {1})
+        spec_fetches = [
+            call for call in context.http_session.get.call_args_list
+            if call.args[0].endswith("docker-compose.yaml")
+        ]
+        self.assertEqual(len(spec_fetches), 1)
+
+
+def make_standby(name, ready=True, app_id="app"):
+    standby = mock.Mock()
+    standby.metadata.name = name
+    standby.metadata.labels = {
+        STANDBY_LABEL: name, "executor": STANDBY_LABEL, "original-app-name": app_id
+    }
+    standby.metadata.resource_version = f"{name}-v1"
+    standby.status.ready_replicas = 1 if ready else None
+    return standby
+
+
+class StandbyApi:
+    """
+    Hold standby deployments; replacing one claims it unless it was taken.
+    """
+
+    def __init__(self, *standbys, taken=()):
+        self.standbys = list(standbys)
+        self.taken = set(taken)
+        self.created = []
+        self.replaced = []
+        self.deleted = []
+        self.lists = 0
+
+    def list_namespaced_deployment(self, namespace, label_selector=None):
+        self.lists += 1
+        return mock.Mock(items=list(self.standbys))
+
+    def create_namespaced_deployment(self, body, namespace):
+        self.created.append(body)
+        return mock.Mock()
+
+    def replace_namespaced_deployment(self, name, namespace, body):
+        if name in self.taken:
+            raise ApiException(status=409, reason="Conflict")
+        self.replaced.append((name, body))
+        self.standbys = [s for s in self.standbys if s.metadata.name != name]
+        return mock.Mock()
+
+    def delete_namespaced_deployment(self, name, namespace, body):
+        if name in self.taken:
+            raise ApiException(status=409, reason="Conflict")
+        self.deleted.append((name, body.preconditions.resource_version))
+        self.standbys = [s for s in self.standbys if s.metadata.name != name]
+        return mock.Mock()
+
+
+class LeaseApi:
+    """
+    Hold one lease; replacing it with a stale resourceVersion conflicts.
+    """
+
+    def __init__(self):
+        self.lease = None
+        self.version = 0
+
+    def read_namespaced_lease(self, name, namespace):
+        if self.lease is None:
+            raise ApiException(status=404, reason="Not Found")
+        lease = copy.deepcopy(self.lease)
+        lease.metadata.resource_version = str(self.version)
+        return lease
+
+    def create_namespaced_lease(self, namespace, body):
+        if self.lease is not None:
+            raise ApiException(status=409, reason="Conflict")
+        self.lease = body
+        self.version += 1
+
+    def replace_namespaced_lease(self, name, namespace, body):
+        if body.metadata.resource_version != str(self.version):
+            raise ApiException(status=409, reason="Conflict")
+        self.lease = body
+        self.version += 1
+
+
+class TestWarmPool(SimpleTestCase):
+    def compute(self, api):
+        compute = KubernetesCompute.__new__(KubernetesCompute)
+        compute.extensions_api = api
+        compute.namespace = "default"
+        compute.warm_pool = WarmPool(api, "default", launch=None)
+        compute.warm_pool.configure({"app": 2})
+        return compute
+
+    def template(self):
+        return {"metadata": {"labels": {"name": "app-abc", "username": "alice"}}}
+
+    def test_launch_claims_a_ready_standby(self):
+        api = StandbyApi(make_standby("starting", ready=False), make_standby("warm"))
+        compute = self.compute(api)
+        deployment, _ = compute.place_deployment(
+            "app-abc", "alice", "abc", self.template(), app_id="app"
+        )
+        [(name, body)] = api.replaced
+        self.assertEqual(name, "warm")
+        self.assertEqual(body.metadata.resource_version, "warm-v1")
+        self.assertEqual(body.metadata.labels["username"], "alice")
+        self.assertEqual(body.metadata.labels["tycho-guid"], "abc")
+        self.assertEqual(body.spec.selector.match_labels, {STANDBY_LABEL: "warm"})
+        self.assertEqual(body.spec.template["metadata"]["labels"][STANDBY_LABEL], "warm")
+        self.assertEqual(api.created, [])
+        self.assertEqual(compute.warm_pool.stats()["app"]["hit_rate"], 1)
+
+    def test_conflicting_claim_moves_on_then_misses(self):
+        api = StandbyApi(make_standby("taken"), make_standby("free"), taken=["taken"])
+        compute = self.compute(api)
+        compute.place_deployment("app-abc", "alice", "abc", self.template(), app_id="app")
+        self.assertEqual([name for name, _ in api.replaced], ["free"])
+        compute.place_deployment("app-def", "bob", "def", self.template(), app_id="app")
+        self.assertEqual(len(api.created), 1)
+        stats = compute.warm_pool.stats()["app"]
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (1, 1, 0.5))
+
+    def test_apps_without_a_pool_are_not_looked_up(self):
+        api = StandbyApi(make_standby("warm"))
+        compute = self.compute(api)
+        compute.place_deployment("other-abc", "alice", "abc", self.template(), app_id="other")
+        self.assertEqual(api.lists, 0)
+        self.assertEqual(len(api.created), 1)
+
+    def test_standbys_select_on_the_standby_label(self):
+        api = StandbyApi()
+        compute = self.compute(api)
+        compute.place_deployment(
+            "app-abc", STANDBY_USERNAME, "abc", self.template(), app_id="app"
+        )
+        [body] = api.created
+        self.assertEqual(body.metadata.labels["executor"], STANDBY_LABEL)
+        self.assertEqual(body.metadata.labels["original-app-name"], "app")
+        self.assertEqual(body.spec.selector.match_labels, {STANDBY_LABEL: "abc"})
+
+    def test_replenish_tops_up_each_pool(self):
+        api = StandbyApi(make_standby("warm"))
+        launched = []
+        pool = WarmPool(api, "default", launch=launched.append)
+        pool.configure({"app": 3, "cold": 0})
+        pool.replenish()
+        self.assertEqual(launched, ["app", "app"])
+
+    def test_replenish_deletes_standbys_above_the_size(self):
+        api = StandbyApi(
+            make_standby("warm-b"),
+            make_standby("cold", ready=False),
+            make_standby("warm-a"),
+            make_standby("removed", app_id="gone"),
+        )
+        launched = []
+        pool = WarmPool(api, "default", launch=launched.append)
+        pool.configure({"app": 2})
+        pool.replenish()
+        self.assertEqual(sorted(api.deleted), [("cold", "cold-v1"), ("removed", "removed-v1")])
+        self.assertEqual(launched, [])
+        pool.configure({})
+        pool.replenish()
+        self.assertEqual(api.standbys, [])
+
+    def test_claimed_standbys_are_not_deleted(self):
+        api = StandbyApi(make_standby("warm"), taken=["warm"])
+        pool = WarmPool(api, "default", launch=None)
+        pool.replenish()
+        self.assertEqual(api.deleted, [])
+
+    def test_standbys_are_drained_only_when_asked(self):
+        for env, drained in [({}, False), ({"TYCHO_WARM_POOL_DRAIN": "true"}, True)]:
+            factory = ContextFactory.__new__(ContextFactory)
+            factory.contexts = {}
+            factory.refreshers = {}
+            with mock.patch.dict(os.environ, env), \
+                    mock.patch("tycho.context.NullContext.drain_warm_pool") as drain:
+                factory.get(product="helx", context_type="null")
+            self.assertEqual(drain.called, drained)
+
+    def test_drain_needs_the_lease(self):
+        compute = KubernetesCompute.__new__(KubernetesCompute)
+        compute.extensions_api = StandbyApi(make_standby("warm"))
+        compute.extensions_api.api_client = None
+        compute.namespace = "default"
+        lease_api = LeaseApi()
+        with mock.patch("tycho.kube.k8s_client.CoordinationV1Api", return_value=lease_api):
+            WarmPool(StandbyApi(), "default", launch=None, lease_api=lease_api).is_leader()
+            lease_api.lease.spec.holder_identity = "other"
+            compute.drain_warm_pool()
+            self.assertEqual(compute.extensions_api.deleted, [])
+            lease_api.lease.spec.renew_time = datetime.now(timezone.utc) - timedelta(hours=1)
+            compute.drain_warm_pool()
+        self.assertEqual(compute.extensions_api.deleted, [("warm", "warm-v1")])
+
+    def test_only_the_lease_holder_replenishes(self):
+        lease_api = LeaseApi()
+        pools = [WarmPool(StandbyApi(), "default", launch=None, lease_api=lease_api) for _ in range(2)]
+        pools[1].identity = "other"
+        self.assertEqual([pool.is_leader() for pool in pools], [True, False])
+        self.assertTrue(pools[0].is_leader())
+        expired = datetime.now(timezone.utc) - timedelta(seconds=pools[0].interval * 3 + 1)
+        lease_api.lease.spec.renew_time = expired
+        self.assertEqual([pool.is_leader() for pool in reversed(pools)], [True, False])
+        self.assertEqual(lease_api.lease.spec.holder_identity, "other")
+
+
+class DaemonSetApi:
+    def __init__(self):
+        self.daemon_set = None
+        self.writes = []
+        self.pods = []
+
+    def read_namespaced_daemon_set(self, name, namespace):
+        if self.daemon_set is None:
+            raise ApiException(status=404, reason="Not Found")
+        return self.daemon_set
+
+    def create_namespaced_daemon_set(self, namespace, body):
+        self.writes.append("create")
+        body.metadata.resource_version = "1"
+        self.daemon_set = body
+
+    def replace_namespaced_daemon_set(self, name, namespace, body):
+        self.writes.append(("replace", body.metadata.resource_version))
+        self.daemon_set = body
+
+    def list_namespaced_pod(self, namespace, label_selector=None):
+        return mock.Mock(items=self.pods)
+
+
+def make_prepull_pod(node, states):
+    pod = mock.Mock()
+    pod.spec.node_name = node
+    pod.spec.init_containers = []
+    pod.status.init_container_statuses = []
+    for index, (image, state) in enumerate(states.items()):
+        container = mock.Mock(image=image)
+        container.name = f"pull-{index}"
+        pod.spec.init_containers.append(container)
+        if state is None:
+            continue
+        status = mock.Mock(image=f"docker.io/library/{image}")
+        status.name = container.name
+        status.state.terminated = mock.Mock() if state == "done" else None
+        status.state.running = None
+        status.state.waiting = None if state == "done" else mock.Mock(reason=state)
+        pod.status.init_container_statuses.append(status)
+    return pod
+
+
+class TestPrePull(SimpleTestCase):
+    def test_daemon_set_follows_the_image_set(self):
+        api = DaemonSetApi()
+        puller = PrePuller(api, api, "default")
+        self.assertEqual(puller.apply(["b:1", "a:1", "a:1"]), "created")
+        containers = api.daemon_set.spec.template.spec.init_containers
+        self.assertEqual([c.image for c in containers], ["a:1", "b:1"])
+        self.assertEqual(puller.apply(["a:1", "b:1"]), "unchanged")
+        self.assertEqual(puller.apply(["a:1", "b:2"]), "updated")
+        self.assertEqual(api.writes, ["create", ("replace", "1")])
+        self.assertEqual(
+            api.daemon_set.metadata.annotations[IMAGES_ANNOTATION],
+            PrePuller.digest(["b:2", "a:1"]),
+        )
+
+    def test_status_per_node(self):
+        api = DaemonSetApi()
+        api.pods = [
+            make_prepull_pod("node-1", {"a:1": "done", "b:1": "ErrImagePull"}),
+            make_prepull_pod("node-2", {"a:1": "PodInitializing", "b:1": None}),
+        ]
+        self.assertEqual(
+            PrePuller(api, api, "default").status(),
+            {
+                "node-1": {"a:1": "pulled", "b:1": "failed"},
+                "node-2": {"a:1": "pulling", "b:1": "pulling"},
+            },
+        )
+
+    def test_images_come_from_app_definitions(self):
+        context = make_context(["a", "broken", "b"])
+        self.assertEqual(context.images(), {"a": ["a:latest"], "b": ["b:latest"]})
+
+
+class MetricsApi:
+    def __init__(self):
+        self.usage = {}
+
+    def list_namespaced_custom_object(self, group, version, namespace, plural, label_selector=None):
+        return {"items": [
+            {"metadata": {"labels": {"tycho-guid": guid}},
+             "containers": [{"usage": {"cpu": cpu}} for cpu in cpus]}
+            for guid, cpus in self.usage.items()
+        ]}
+
+
+class ScaleApi:
+    def __init__(self, names):
+        self.names = names
+        self.patches = []
+
+    def list_namespaced_deployment(self, namespace, label_selector=None):
+        items = []
+        for name in self.names:
+            item = mock.Mock()
+            item.metadata.name = name
+            items.append(item)
+        return mock.Mock(items=items)
+
+    def patch_namespaced_deployment(self, name, namespace, body):
+        self.patches.append((name, body))
+
+
+class TestHibernation(SimpleTestCase):
+    def test_cpu_quantities(self):
+        self.assertEqual(cpu_millicores("250m"), 250)
+        self.assertEqual(cpu_millicores("2"), 2000)
+        self.assertEqual(cpu_millicores("1500000n"), 1.5)
+        self.assertEqual(cpu_millicores(None), 0)
+
+    def test_idle_systems_are_hibernated_after_the_idle_period(self):
+        api = MetricsApi()
+        hibernated = []
+        reaper = IdleReaper(api, "default", hibernated.append, idle_after=600, cpu_threshold=10)
+        api.usage = {"idle": ["2m", "3m"], "busy": ["400m"]}
+        self.assertEqual(reaper.check(now=0), [])
+        api.usage = {"idle": ["1m"], "busy": ["1m"]}
+        self.assertEqual(reaper.check(now=300), [])
+        self.assertEqual(reaper.check(now=600), ["idle"])
+        self.assertEqual(reaper.check(now=900), ["busy"])
+        self.assertEqual(hibernated, ["idle", "busy"])
+
+    def test_usage_resets_the_idle_clock(self):
+        api = MetricsApi()
+        hibernated = []
+        reaper = IdleReaper(api, "default", hibernated.append, idle_after=600)
+        api.usage = {"app": ["1m"]}
+        reaper.check(now=0)
+        api.usage = {"app": ["50m"]}
+        reaper.check(now=300)
+        api.usage = {"app": ["1m"]}
+        self.assertEqual(reaper.check(now=700), [])
+        self.assertEqual(reaper.check(now=1300), ["app"])
+
+    def test_only_the_lease_holder_reaps(self):
+        lease_api = LeaseApi()
+        reapers = [
+            IdleReaper(MetricsApi(), "default", None, idle_after=600, lease_api=lease_api)
+            for _ in range(2)
+        ]
+        reapers[1].identity = "other"
+        reapers[1].idle_since = {"app": 0}
+        self.assertTrue(reapers[0].is_leader())
+        self.assertEqual(lease_api.lease.metadata.name, "tycho-idle-reaper")
+        for reaper in reapers:
+            with mock.patch.object(reaper, "check") as check, \
+                    mock.patch("tycho.idle.time.sleep", side_effect=InterruptedError), \
+                    self.assertRaises(InterruptedError):
+                reaper._run()
+            self.assertEqual(check.called, reaper is reapers[0])
+        self.assertEqual(reapers[1].idle_since, {})
+
+    def test_reaping_without_lease_access(self):
+        lease_api = mock.Mock()
+        lease_api.read_namespaced_lease.side_effect = ApiException(status=403, reason="Forbidden")
+        reaper = IdleReaper(MetricsApi(), "default", None, idle_after=600, lease_api=lease_api)
+        self.assertTrue(reaper.is_leader())
+        self.assertIsNone(reaper.lease_api)
+
+    def test_scale_patches_replicas_only(self):
+        compute = KubernetesCompute.__new__(KubernetesCompute)
+        compute.namespace = "default"
+        compute.extensions_api = ScaleApi(["jupyter-ds-abc"])
+        with mock.patch.dict(os.environ, {"TYCHO_STATUS_INFORMER": "false"}):
+            result = compute.scale("abc", 0)
+        self.assertEqual(result, {"deployments": ["jupyter-ds-abc"], "replicas": 0})
+        self.assertEqual(
+            compute.extensions_api.patches,
+            [("jupyter-ds-abc", {"spec": {"replicas": 0}})],
+        )
+        compute.extensions_api = ScaleApi([])
+        with mock.patch.dict(os.environ, {"TYCHO_STATUS_INFORMER": "false"}):
+            with self.assertRaises(ModifyException):
+                compute.scale("missing", 1)
+
+    def test_hibernated_deployments_are_reported(self):
+        item = make_deployment(1)
+        item["spec"]["replicas"] = 0
+        record = KubernetesCompute.deployment_status_raw(item)
+        self.assertTrue(record["is_hibernated"])
+        self.assertFalse(record["is_ready"])
+
+
+def make_node(name, cpu="4", memory="16Gi", gpus=None, ready=True, unschedulable=False):
+    allocatable = {"cpu": cpu, "memory": memory, "ephemeral-storage": "100Gi"}
+    if gpus:
+        allocatable["nvidia.com/gpu"] = gpus
+    return k8s_client.V1Node(
+        metadata=k8s_client.V1ObjectMeta(name=name),
+        spec=k8s_client.V1NodeSpec(unschedulable=unschedulable),
+        status=k8s_client.V1NodeStatus(
+            allocatable=allocatable,
+            conditions=[k8s_client.V1NodeCondition(type="Ready", status=str(ready))],
+        ),
+    )
+
+
+def make_pod(name, node, *requests, init=None, phase="Running"):
+    def container(index, request):
+        return k8s_client.V1Container(
+            name=f"c{index}", resources=k8s_client.V1ResourceRequirements(requests=request)
+        )
+    return k8s_client.V1Pod(
+        metadata=k8s_client.V1ObjectMeta(name=name, namespace="default"),
+        spec=k8s_client.V1PodSpec(
+            node_name=node,
+            containers=[container(i, r) for i, r in enumerate(requests)],
+            init_containers=[container(0, init)] if init else None,
+        ),
+        status=k8s_client.V1PodStatus(phase=phase),
+    )
+
+
+class TestCapacityIndex(SimpleTestCase):
+    def make_index(self, nodes, pods):
+        index = CapacityIndex(api=None)
+        index._replace("node", nodes)
+        index._replace("pod", pods)
+        for event in index._synced.values():
+            event.set()
+        return index
+
+    def test_requests_are_subtracted_per_node(self):
+        index = self.make_index(
+            [make_node("a"), make_node("b", cpu="2", gpus="1"), make_node("down", ready=False)],
+            [
+                make_pod("p1", "a", {"cpu": "1500m", "memory": "4Gi"}, {"cpu": "500m"}),
+                make_pod("p2", "a", {"cpu": "1"}, init={"cpu": "3", "memory": "1Gi"}),
+                make_pod("pending", None, {"cpu": "4"}),
+            ],
+        )
+        nodes = index.summary()["nodes"]
+        self.assertEqual(set(nodes), {"a", "b"})
+        self.assertEqual(nodes["a"]["available"]["cpus"], 0)
+        self.assertEqual(nodes["a"]["available"]["memory"], 11 * 2**30)
+        self.assertEqual(nodes["b"]["available"]["gpus"], 1)
+        self.assertTrue(index.fits(cpus=2, memory=2**30, gpus=1))
+        self.assertFalse(index.fits(cpus=2.5))
+        self.assertFalse(index.fits(cpus=1, gpus=2))
+
+    def test_watch_events_update_the_index(self):
+        index = self.make_index([make_node("a", cpu="2")], [])
+        pod = make_pod("p", "a", {"cpu": "2"})
+        index._update("pod", "ADDED", pod)
+        self.assertFalse(index.fits(cpus=1))
+        index._update("pod", "MODIFIED", make_pod("p", "a", {"cpu": "2"}, phase="Succeeded"))
+        self.assertTrue(index.fits(cpus=2))
+        index._update("pod", "ADDED", pod)
+        index._update("pod", "DELETED", pod)
+        self.assertTrue(index.fits(cpus=2))
+        index._update("node", "MODIFIED", make_node("a", cpu="2", unschedulable=True))
+        self.assertFalse(index.fits(cpus=1))
+
+    def test_unsynced_index_does_not_know(self):
+        self.assertIsNone(CapacityIndex(api=None).fits(cpus=1))
+
+    def test_fit_check_is_fast(self):
+        nodes = [make_node(f"node-{i}") for i in range(500)]
+        pods = [make_pod(f"p{i}", f"node-{i % 500}", {"cpu": "3500m"}) for i in range(2000)]
+        index = self.make_index(nodes, pods)
+        start = time.perf_counter()
+        for _ in range(100):
+            self.assertFalse(index.fits(cpus=1))
+        seconds = (time.perf_counter() - start) / 100
+        logger.info(f"capacity check over 500 nodes: {seconds * 1e6:.0f}us")
+        self.assertLess(seconds, 0.01)
+
+
+class TestTemplateEnvironment(SimpleTestCase):
+    def setUp(self):
+        self.override = tempfile.TemporaryDirectory()
+        self.addCleanup(self.override.cleanup)
+        with open(os.path.join(self.override.name, "service.yaml"), "w") as stream:
+            stream.write("name: {{ name }}\n")
+        self.config = {"tycho": {"templates": {"paths": [self.override.name, "/no/such/dir"]}}}
+        self.addCleanup(TemplateUtils.environments.pop, tuple(self.config["tycho"]["templates"]["paths"]), None)
+
+    def test_overrides_come_first(self):
+        generator = TemplateUtils(self.config)
+        self.assertEqual(list(generator.render("service.yaml", {"name": "x"})), [{"name": "x"}])
+        self.assertTrue(generator.get_environment().get_template("pod.yaml").filename.endswith(
+            os.path.join("tycho", "template", "pod.yaml")))
+        with self.assertRaises(ValueError):
+            generator.render("missing.yaml", {})
+
+    def test_templates_are_compiled_once_per_process(self):
+        first = TemplateUtils(self.config).get_environment().get_template("pod.yaml")
+        second = TemplateUtils(dict(self.config)).get_environment().get_template("pod.yaml")
+        self.assertIs(first, second)
+        with open(first.filename) as stream:
+            text = stream.read()
+        start = time.perf_counter()
+        for _ in range(20):
+            jinja2.Template(text)
+        compiled = (time.perf_counter() - start) / 20
+        environment = TemplateUtils(self.config).get_environment()
+        start = time.perf_counter()
+        for _ in range(20):
+            environment.get_template("pod.yaml")
+        cached = (time.perf_counter() - start) / 20
+        logger.info(f"pod.yaml: compile {compiled * 1e3:.2f}ms, cached lookup {cached * 1e6:.0f}us")
+        self.assertLess(cached, compiled)
+
+
+COMPOSE = {
+    "version": "3.0",
+    "services": {
+        "jupyter-ds": {
+            "image": "containers.renci.org/helxplatform/jupyter/datascience:v1",
+            "entrypoint": "/bin/bash -c start.sh",
+            "env": [
+                "NB_PREFIX=/private/jupyter-ds/{{ username }}/{{ identifier }}",
+                "JUPYTER_ENABLE_LAB=yes",
+            ],
+            "ports": ["8888:8888"],
+            "volumes": ["pvc://stdnfs/{{ username }}:/home/{{ username }}"],
+            "deploy": {"resources": {
+                "limits": {"cpus": 2, "memory": "4000M"},
+                "reservations": {"cpus": 1, "memory": "1000M"},
+            }},
+        },
+    },
+}
+
+
+class TestSystemParse(SimpleTestCase):
+    def measure(self, function, repeat=50):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        seconds = (time.perf_counter() - start) / repeat
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return seconds, peak
+
+    def test_only_templated_strings_are_rendered(self):
+        context = {"username": "alice", "identifier": "abc"}
+        rendered = TemplateUtils.render_structure(COMPOSE, context)
+        self.assertEqual(rendered, next(TemplateUtils.render_text(yaml.dump(COMPOSE), context)))
+        service = rendered["services"]["jupyter-ds"]
+        self.assertEqual(service["volumes"], ["pvc://stdnfs/alice:/home/alice"])
+        self.assertEqual(service["deploy"]["resources"]["limits"]["cpus"], 2)
+        self.assertIn("{{ username }}", COMPOSE["services"]["jupyter-ds"]["volumes"][0])
+
+    def test_parse_skips_the_yaml_round_trip(self):
+        config = Config()
+        principal = json.dumps({"username": "alice", "access_token": "t", "host": "h"})
+        with mock.patch.dict(os.environ, {"DEV_PHASE": "test"}):
+            system = System.parse(config, "jupyter-ds", principal, COMPOSE, "default", env={})
+            context = {"username": "alice", "identifier": system.identifier}
+            old_seconds, old_peak = self.measure(
+                lambda: (list(TemplateUtils.render_text(yaml.dump(COMPOSE), context)), yaml.dump(system)))
+            new_seconds, new_peak = self.measure(
+                lambda: TemplateUtils.render_structure(COMPOSE, context))
+        self.assertEqual(system.containers[0].env[0], ["NB_PREFIX", f"/private/jupyter-ds/alice/{system.identifier}"])
+        self.assertIsNone(system._source_text)
+        self.assertIn("jupyter-ds", system.source_text)
+        logger.info(
+            f"System.parse templating: round trip {old_seconds * 1e3:.2f}ms {old_peak / 1024:.0f}KiB, "
+            f"structural {new_seconds * 1e3:.2f}ms {new_peak / 1024:.0f}KiB"
+        )
+        self.assertLess(new_seconds, old_seconds)
+
+    def test_nfsrods_uid_comes_from_the_principal(self):
+        principals = [
+            json.dumps({"username": username, "access_token": "t", "host": "h", "nfsrods_uid": uid})
+            for username, uid in [("alice", "30001"), ("bob", "30002")]
+        ]
+        with mock.patch.dict(os.environ, {"DEV_PHASE": "test"}):
+            os.environ.pop("NFSRODS_UID", None)
+            systems = [
+                System.parse(Config(), "jupyter-ds", principal, COMPOSE, "default", env={})
+                for principal in principals
+            ]
+        self.assertEqual([s.security_context["run_as_user"] for s in systems], ["30001", "30002"])
+        self.assertNotIn("nfsrods_uid", systems[0].system_env)
+
+
+class TestRenderString(SimpleTestCase):
+    def test_plain_strings_are_not_compiled(self):
+        TemplateUtils._compile_string.cache_clear()
+        value = "postgres://db:5432/app"
+        self.assertIs(TemplateUtils.render_string(value, {}), value)
+        self.assertEqual(TemplateUtils._compile_string.cache_info().currsize, 0)
+        for value in ["a\n", "a\r\nb", "{{ x }}\n"]:
+            self.assertEqual(TemplateUtils.render_string(value, {"x": 1}), jinja2.Template(value).render(x=1))
+
+    def test_templates_are_compiled_once(self):
+        TemplateUtils._compile_string.cache_clear()
+        for username in ["alice", "bob"]:
+            self.assertEqual(
+                TemplateUtils.render_string("HOME=/home/{{ username }}", {"username": username}),
+                f"HOME=/home/{username}",
+            )
+        self.assertEqual(TemplateUtils.render_string("{{ now() is defined }}", {}), "True")
+        info = TemplateUtils._compile_string.cache_info()
+        self.assertEqual((info.misses, info.hits), (2, 1))
+
+    def test_env_rendering_scales_with_templated_values(self):
+        env = {f"VAR_{i}": f"value-{i}" for i in range(60)}
+        env.update({f"URL_{i}": "https://{{ host }}/" + str(i) for i in range(3)})
+        env["host"] = "example.org"
+        containers = 4
+
+        def compile_every_value():
+            for _ in range(containers):
+                for k, v in env.items():
+                    jinja2.Template(f"{k}={v}").render(env)
+
+        def render_strings():
+            for _ in range(containers):
+                for k, v in env.items():
+                    TemplateUtils.render_string(f"{k}={v}", env)
+
+        timings = {}
+        for name, function in [("compile", compile_every_value), ("render_string", render_strings)]:
+            start = time.perf_counter()
+            function()
+            timings[name] = time.perf_counter() - start
+        logger.info(
+            f"{len(env)} env values x {containers} containers: "
+            f"compiling each {timings['compile'] * 1e3:.1f}ms, render_string {timings['render_string'] * 1e3:.1f}ms"
+        )
+        self.assertLess(timings["render_string"], timings["compile"])
+
+
+def without_empty(value):
+    """ Drop the empty values a template renders for keys it leaves blank. """
+    if isinstance(value, dict):
+        return {k: without_empty(v) for k, v in value.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [without_empty(v) for v in value]
+    return value
+
+
+class TestManifestBuilders(SimpleTestCase):
+    def setUp(self):
+        compose = {"services": {
+            "jupyter-ds": dict(
+                COMPOSE["services"]["jupyter-ds"],
+                expose=[8888],
+                volumes=COMPOSE["services"]["jupyter-ds"]["volumes"] + ["pvc://stdnfs/data:/data"],
+                ext={"kube": {
+                    "livenessProbe": {"httpGet": {"path": "/health", "port": 8888}},
+                    "readinessProbe": {"cmd": ["cat", "/tmp/ready"]},
+                }},
+            ),
+            "sidecar": {"image": "busybox", "expose": ["9000"]},
+        }}
+        compose["services"]["jupyter-ds"]["deploy"]["resources"]["limits"]["gpus"] = 1
+        principal = json.dumps({"username": "alice", "access_token": "t", "host": "h"})
+        with mock.patch.dict(os.environ, {"DEV_PHASE": "test"}):
+            self.system = System.parse(
+                Config(), "jupyter-ds", principal, compose, "default", env={},
+                services={"jupyter-ds": {"port": 8888, "clients": ["10.0.0.0/8"]}})
+        self.system.system_port = 8888
+        self.deployment = mock.Mock()
+        self.deployment.metadata.name = self.system.name
+        self.deployment.metadata.uid = "0b1c"
+        self.generator = TemplateUtils(self.system.config)
+
+    def contexts(self):
+        service = self.system.services["jupyter-ds"]
+        return [
+            ("pod.yaml", {"system": self.system}),
+            ("service.yaml", {"system": self.system, "service": service,
+                              "create_deployment_api_response": self.deployment}),
+            ("policy/tycho-default-netpolicy.yaml", {"system": self.system}),
+        ]
+
+    def test_built_manifests_match_the_templates(self):
+        for amb in [False, True]:
+            self.system.amb = amb
+            for template, context in self.contexts():
+                built = self.generator.render_manifests(template, context)
+                rendered = list(self.generator.render(template, context))
+                rendered[0].pop("resourceversion", None)
+                if amb and template == "service.yaml":
+                    for manifest in built + rendered:
+                        annotations = manifest["metadata"]["annotations"]
+                        annotations["getambassador.io/config"] = yaml.safe_load(annotations["getambassador.io/config"])
+                self.assertEqual(without_empty(built), without_empty(rendered), template)
+
+    def test_probe_timings_are_set_on_the_probe(self):
+        container = self.system.containers[0]
+        container.readiness_probe.delay = 5
+        container.readiness_probe.threshold = 3
+        built = manifests.pod_manifest(self.system)["spec"]["containers"][0]
+        self.assertEqual(built["readinessProbe"], {
+            "exec": {"command": ["cat", "/tmp/ready"]}, "initialDelaySeconds": 5, "failureThreshold": 3,
+        })
+        self.assertNotIn("initialDelaySeconds", built)
+
+    def test_templates_are_an_opt_in(self):
+        with mock.patch.object(TemplateUtils, "render", return_value=iter([{"kind": "Pod"}])) as render:
+            self.generator.render_manifests("pod.yaml", {"system": self.system})
+            render.assert_not_called()
+            with mock.patch.dict(os.environ, {"TYCHO_MANIFEST_TEMPLATES": "true"}):
+                self.assertEqual(
+                    self.generator.render_manifests("pod.yaml", {"system": self.system}), [{"kind": "Pod"}])
+        modify = mock.Mock(patch=False)
+        self.assertEqual(self.generator.render_manifests("patch.yaml", {"system_modify": modify}), [])
+
+    def test_building_is_faster_than_rendering(self):
+        def generate(render):
+            for template, context in self.contexts():
+                list(render(template, context))
+
+        timings = {}
+        generate(self.generator.render)
+        for name, render in [("templates", self.generator.render), ("builders", self.generator.render_manifests)]:
+            start = time.perf_counter()
+            for _ in range(20):
+                generate(render)
+            timings[name] = (time.perf_counter() - start) / 20
+        logger.info(
+            f"manifests per launch: templates {timings['templates'] * 1e3:.2f}ms, "
+            f"builders {timings['builders'] * 1e3:.3f}ms"
+        )
+        self.assertLess(timings["builders"], timings["templates"])
+
+
+class TestLazyCore(SimpleTestCase):
+    def test_core_is_created_once_on_first_use(self):
+        with mock.patch.object(actions, "_tycho", None), mock.patch.object(actions, "Tycho") as core:
+            core.side_effect = lambda **kwargs: time.sleep(0.05) or mock.Mock()
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                cores = list(executor.map(lambda _: actions.tycho(), range(8)))
+            core.assert_called_once_with(backplane=None)
+            self.assertEqual(len({id(c) for c in cores}), 1)
+            self.assertIs(actions.tycho(), cores[0])
+
+    def test_schema_is_loaded_once(self):
+        actions.schema.cache_clear()
+        with mock.patch.object(actions.yaml, "load", wraps=actions.yaml.load) as load:
+            for resource in (actions.StartSystemResource(), actions.StatusSystemResource()):
+                resource.validate({"name": "x"}, "StatusRequest")
+        self.assertEqual(load.call_count, 1)
+
+    def test_backplane_is_imported_when_created(self):
+        with mock.patch("tycho.kube.KubernetesCompute") as compute:
+            created = ComputeFactory.create_compute({"tycho": {"backplane": "kubernetes"}})
+        compute.assert_called_once_with(config={"tycho": {"backplane": "kubernetes"}})
+        self.assertIs(created, compute.return_value)
@@ -1,54 +1,97 @@
 import datetime
+import functools
 import json
 import logging
 import netifaces
 import os
 import string
+import threading
+import time
 import traceback
 import yaml
-from jinja2 import Template
+from collections import OrderedDict
+from tycho import manifests
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, TemplateNotFound
 
 logger = logging.getLogger (__name__)
 
 class TemplateUtils:
     """ Utilities for generating text. """
 
+    """ Template environments shared by the process, by template search path. """
+    environments = {}
+    environments_lock = threading.Lock ()
+
     def __init__(self, config):
         self.config = config
 
+    def get_environment (self):
+        """ Get the Jinja environment loading templates from the configured paths.
+
+            Templates in the user provided paths override the default templates.
+            The environment is built once per search path and keeps compiled
+            templates, so a template file is read and compiled on first use only;
+            templates are not reloaded when their files change. When
+            TYCHO_TEMPLATE_BYTECODE_CACHE names a directory, compiled templates
+            are also kept there and survive restarts.
+        """
+        alternate_paths = tuple (self.config['tycho']['templates']['paths'])
+        with TemplateUtils.environments_lock:
+            environment = TemplateUtils.environments.get (alternate_paths)
+            if environment is None:
+                search_path = []
+                for path in alternate_paths:
+                    if os.path.exists (path):
+                        search_path.append (path)
+                    else:
+                        logger.warning (f"template path {path} is configured but does not exist.")
+                search_path.append (os.path.join (os.path.dirname (__file__), "template"))
+                bytecode_cache = None
+                cache_dir = os.environ.get ("TYCHO_TEMPLATE_BYTECODE_CACHE", "")
+                if cache_dir:
+                    os.makedirs (cache_dir, exist_ok=True)
+                    bytecode_cache = FileSystemBytecodeCache (cache_dir)
+                environment = Environment (
+                    loader=FileSystemLoader (search_path),
+                    bytecode_cache=bytecode_cache,
+                    auto_reload=False)
+                environment.globals['now'] = datetime.datetime.utcnow
+                TemplateUtils.environments[alternate_paths] = environment
+        return environment
+
     def render (self, template, context):
         """Render a template object given a context. """
-        result=None
-        template_path = None
-        
-        """ First, allow the user to override the default templates with custom templates.
-            Check for a template with this name in the user provided paths. """
-        alternate_paths = self.config['tycho']['templates']['paths']
-        for path in alternate_paths:
-            if os.path.exists (path):
-                template_path = os.path.join (path, template)
-                if os.path.exists (template_path):
-                    logger.debug (f"using user supplied template: {template_path}")
-                else:
-                    template_path = None
-            else:
-                logger.warning (f"template path {path} is configured but does not exist.")
+        try:
+            compiled = self.get_environment ().get_template (template)
+        except TemplateNotFound:
+            raise ValueError (
+                f"No template {template} found in default location or in {self.config['tycho']['templates']['paths']}")
+        logger.debug (f"applying template {compiled.filename}")
+        text = compiled.render (**context)
+        logger.debug (f"TemplateUtils.render - {text}")
+        return yaml.load_all (text, Loader=yaml.SafeLoader)
 
-        if not template_path:
-            """ Still no template. Look for it in the default design. """
-            template_path = os.path.join (os.path.dirname (__file__), "template", template)
-            if not os.path.exists (template_path):
-                template_path = None
+    def overridden (self, template):
+        """ Whether a configured template path holds its own version of a template. """
+        return any (
+            os.path.exists (os.path.join (path, template))
+            for path in self.config['tycho']['templates']['paths'])
 
-        if not template_path:
-            raise ValueError (
-                f"No template {template} found in default location or in {alternate_paths}")
-        
-        logger.debug (f"applying template {template_path}")
-        with open(template_path, "r") as stream:
-            template_text = stream.read ()
-            result = TemplateUtils.render_text (template_text, context)
-        return result
+    def render_manifests (self, template, context):
+        """ Kubernetes manifests for a template, as a list of API dicts.
+
+            Manifests with a builder in :mod:`tycho.manifests` are built straight
+            from the context. The template is rendered instead when it is
+            overridden in a configured template path, has no builder, or when
+            TYCHO_MANIFEST_TEMPLATES=true.
+        """
+        build = manifests.BUILDERS.get (template)
+        if build is None or self.overridden (template) or \
+                os.environ.get ("TYCHO_MANIFEST_TEMPLATES", "false").lower () == "true":
+            return list (self.render (template, context))
+        manifest = build (**context)
+        logger.debug (f"built {template}: {manifest}")
+        return [ manifest ] if manifest is not None else []
 
     @staticmethod
     def render_text (template_text, context):
@@ -61,11 +104,60 @@ class TemplateUtils:
         logger.debug (f"TemplateUtils.render_text - {text}")
         return yaml.load_all (text, Loader=yaml.SafeLoader)
 
+    """ Strings longer than this are compiled on every render instead of cached. """
+    STRING_TEMPLATE_CACHE_LIMIT = 4096
+
+    @staticmethod
+    def is_template (text):
+        return "{{" in text or "{%" in text or "{#" in text
+
+    @staticmethod
+    @functools.lru_cache (maxsize=1024)
+    def _compile_string (text, keep_trailing_newline):
+        template = Template (text, keep_trailing_newline=keep_trailing_newline)
+        template.globals['now'] = datetime.datetime.utcnow
+        return template
+
+    @staticmethod
+    def string_template (text, keep_trailing_newline=False):
+        """ Get a compiled template for a small string, from a bounded LRU cache.
+
+            Compiled templates are shared and must not be modified.
+        """
+        if len (text) > TemplateUtils.STRING_TEMPLATE_CACHE_LIMIT:
+            return TemplateUtils._compile_string.__wrapped__ (text, keep_trailing_newline)
+        return TemplateUtils._compile_string (text, keep_trailing_newline)
+
+    @staticmethod
+    def render_structure (value, context):
+        """ Render the strings in a structure of dicts and lists, such as a parsed
+            docker-compose file, as templates.
+
+            Only strings holding template markup are rendered; numbers, booleans and
+            plain strings are kept as they are. Dicts and lists are copied, so the
+            input is left untouched.
+        """
+        if isinstance (value, str):
+            if TemplateUtils.is_template (value):
+                return TemplateUtils.string_template (value, keep_trailing_newline=True).render (**context)
+            return value
+        if isinstance (value, dict):
+            return {
+                TemplateUtils.render_structure (k, context) : TemplateUtils.render_structure (v, context)
+                for k, v in value.items ()
+            }
+        if isinstance (value, list):
+            return [ TemplateUtils.render_structure (v, context) for v in value ]
+        return value
+
     @staticmethod
     def render_string(s,context):
-        tmpl = Template(s)
-        tmpl.globals['now'] = datetime.datetime.utcnow
-        return tmpl.render(context)
+        """ Render a string as a template. Strings without template markup are
+            returned as they are, without compiling anything. """
+        if not TemplateUtils.is_template (s) and "\r" not in s and not s.endswith ("\n"):
+            """ Jinja would only normalize newlines, so there is nothing to render. """
+            return s
+        return TemplateUtils.string_template (s).render (context)
 
     @staticmethod
     def apply_environment (environment, text):
@@ -140,3 +232,96 @@ class Resource:
             if format in m:
                 result = m[format](path)
         return result
+
+class TTLCache:
+    """ A small thread safe cache whose entries expire a fixed time after loading.
+
+        :meth:`get` is single-flight: when several threads miss on the same key at
+        once, one of them runs the loader and the others wait for its result
+        instead of repeating the work. A load that started before an
+        :meth:`invalidate` is returned to its callers but not stored, so an
+        invalidation is never undone by a stale result.
+    """
+
+    class _Flight:
+        def __init__(self, version):
+            self.version = version
+            self.done = threading.Event ()
+            self.value = None
+            self.error = None
+
+    def __init__(self, ttl, maxsize=1024):
+        """ Construct a cache.
+
+            :param ttl: Seconds an entry stays valid. Zero or less disables caching,
+                though concurrent loads are still coalesced.
+            :type ttl: float
+            :param maxsize: Maximum number of entries kept; the oldest are evicted first.
+            :type maxsize: int
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.lock = threading.Lock ()
+        self.entries = OrderedDict ()
+        self.inflight = {}
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get (self, key, load):
+        """ Return the cached value for key, calling load() to produce it if needed. """
+        with self.lock:
+            entry = self.entries.get (key)
+            if entry is not None and entry[1] > time.monotonic ():
+                self.hits += 1
+                return entry[0]
+            flight = self.inflight.get (key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self.inflight[key] = TTLCache._Flight (self.version)
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait ()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = load ()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+                if flight.error is None and self.ttl > 0 and flight.version == self.version:
+                    self.entries[key] = (flight.value, time.monotonic () + self.ttl)
+                    self.entries.move_to_end (key)
+                    while len(self.entries) > self.maxsize:
+                        self.entries.popitem (last=False)
+            flight.done.set ()
+        return flight.value
+
+    def invalidate (self, predicate=None):
+        """ Drop the entries whose (key, value) satisfy predicate, or all entries.
+
+            Loads already in flight are not stored when they finish.
+        """
+        with self.lock:
+            self.version += 1
+            if predicate is None:
+                self.entries.clear ()
+            else:
+                for key in [ k for k, (v, _) in self.entries.items () if predicate (k, v) ]:
+                    del self.entries[key]
+
+    def stats (self):
+        with self.lock:
+            return {
+                "size"      : len(self.entries),
+                "hits"      : self.hits,
+                "misses"    : self.misses,
+                "coalesced" : self.coalesced
+            }
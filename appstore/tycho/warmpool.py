@@ -0,0 +1,198 @@
+import logging
+import os
+import socket
+import threading
+from kubernetes import client as k8s_client
+from kubernetes.client.rest import ApiException
+from tycho.lease import hold_lease
+
+logger = logging.getLogger (__name__)
+
+""" Standby systems are launched for this user and are not shown as anyone's instances. """
+STANDBY_USERNAME = "tycho-standby"
+""" Selector label of a standby deployment. It survives the claim, as selectors are immutable. """
+STANDBY_LABEL = "tycho-standby"
+
+
+class WarmPool:
+    """ Keep standby deployments running for apps that ask for a warm pool.
+
+        A standby is an app launched for :data:`STANDBY_USERNAME`. Its deployment
+        selects pods by :data:`STANDBY_LABEL` alone, so a launch can claim it by
+        replacing its labels and pod template with the user's while keeping the
+        deployment. The pod is recreated with the user's env and volumes, but on
+        a node that already pulled the image, which is what dominates a cold
+        launch. Claims use the standby's resourceVersion, so two launches cannot
+        claim the same standby.
+
+        A background thread brings each pool back to its size, launching the
+        standbys missing and deleting those above it, including every standby
+        of an app that no longer has a pool. When a lease API is given, only
+        the process holding the lease does this, so several appstore workers
+        do not each top up the same pools.
+    """
+
+    def __init__(self, api, namespace, launch, interval=30, lease_api=None, lease_name="tycho-warm-pool"):
+        """ Construct a warm pool.
+
+            :param api: An AppsV1Api client.
+            :param namespace: Namespace the standbys run in.
+            :type namespace: str
+            :param launch: Function starting one standby system for an app id.
+            :param interval: Seconds between checks of the pool sizes.
+            :type interval: int
+            :param lease_api: A CoordinationV1Api client, to elect the process that replenishes.
+            :param lease_name: Name of the lease.
+            :type lease_name: str
+        """
+        self.api = api
+        self.namespace = namespace
+        self.launch = launch
+        self.interval = interval
+        self.lease_api = lease_api
+        self.lease_name = lease_name
+        self.identity = f"{socket.gethostname ()}-{os.getpid ()}"
+        self.sizes = {}
+        self._lock = threading.Lock ()
+        self._stats = {}
+        self._wake = threading.Event ()
+        self._thread = None
+
+    def configure (self, sizes, launch=None):
+        """ Set the pool size of each app; apps left out get no standbys. """
+        with self._lock:
+            self.sizes = { app_id : int (size) for app_id, size in sizes.items () if int (size) > 0 }
+            if launch is not None:
+                self.launch = launch
+        self._wake.set ()
+
+    def start (self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive ():
+                self._thread = threading.Thread (
+                    target=self._run, name="tycho-warm-pool", daemon=True)
+                self._thread.start ()
+
+    def standbys (self, app_id=None):
+        """ Standby deployments of an app, or of every app, ready ones first. """
+        label_selector = f"{STANDBY_LABEL},executor={STANDBY_LABEL}"
+        if app_id is not None:
+            label_selector += f",original-app-name={app_id}"
+        response = self.api.list_namespaced_deployment (self.namespace, label_selector=label_selector)
+        """ Ordered by name among equals, so every process trims the same standbys. """
+        return sorted (response.items, key=lambda item: (
+            not (item.status and item.status.ready_replicas), item.metadata.name))
+
+    def claim (self, app_id, adopt):
+        """ Turn a standby of the app into a user's system.
+
+            :param app_id: The app being launched.
+            :type app_id: str
+            :param adopt: Function taking a standby V1Deployment and replacing it
+                with the user's deployment. A conflict (HTTP 409) means another
+                launch claimed that standby first and the next one is tried.
+            :returns: The result of adopt, or None if no standby was available.
+        """
+        if app_id not in self.sizes:
+            return None
+        result = None
+        for standby in self.standbys (app_id):
+            try:
+                result = adopt (standby)
+                break
+            except ApiException as e:
+                if e.status != 409:
+                    raise
+                logger.debug (f"-- standby {standby.metadata.name} was claimed by another launch")
+        with self._lock:
+            stats = self._stats.setdefault (app_id, { "hits" : 0, "misses" : 0 })
+            stats["hits" if result is not None else "misses"] += 1
+        logger.info (f"-- warm pool {'hit' if result is not None else 'miss'} for {app_id}")
+        self._wake.set ()
+        return result
+
+    def replenish (self):
+        """ Launch standbys until every pool is at its size and delete the ones above it.
+
+            Standbys of apps without a size, such as apps removed from the
+            registry, are all deleted.
+        """
+        with self._lock:
+            sizes = dict (self.sizes)
+            launch = self.launch
+        pools = {}
+        for standby in self.standbys ():
+            app_id = (standby.metadata.labels or {}).get ("original-app-name")
+            pools.setdefault (app_id, []).append (standby)
+        for app_id in sorted (set (sizes) | set (pools), key=str):
+            size = sizes.get (app_id, 0)
+            standbys = pools.get (app_id, [])
+            """ Not ready standbys sort last, so they go first. """
+            for standby in standbys[size:]:
+                self.delete (standby)
+            for _ in range (size - len (standbys)):
+                try:
+                    launch (app_id)
+                except Exception as e:
+                    logger.warning (f"-- unable to start a standby of {app_id}: {e}")
+                    break
+
+    def delete (self, standby):
+        """ Delete a standby unless it changed since it was listed, e.g. because a launch claimed it. """
+        name = standby.metadata.name
+        try:
+            self.api.delete_namespaced_deployment (
+                name, self.namespace,
+                body=k8s_client.V1DeleteOptions (
+                    propagation_policy="Background",
+                    preconditions=k8s_client.V1Preconditions (
+                        resource_version=standby.metadata.resource_version)))
+            logger.info (f"-- deleted surplus standby {name}")
+        except ApiException as e:
+            if e.status not in (404, 409):
+                raise
+            logger.debug (f"-- standby {name} changed or went away before it was deleted")
+
+    def is_leader (self):
+        """ Whether this process holds the lease, taking it if it is free or expired.
+
+            Without a lease API every process is a leader. A lease that cannot be
+            read for lack of permission disables the election, so pools are still
+            kept and the surplus of concurrent top ups is trimmed.
+        """
+        if self.lease_api is None:
+            return True
+        try:
+            return hold_lease (self.lease_api, self.lease_name, self.namespace, self.identity, int (3 * self.interval))
+        except ApiException as e:
+            if e.status == 403:
+                logger.warning (f"-- no access to lease {self.lease_name}; every process will replenish the warm pool")
+                self.lease_api = None
+                return True
+            raise
+
+    def stats (self):
+        """ Size, hits, misses and hit rate of each pool. """
+        with self._lock:
+            result = {}
+            for app_id in set (self.sizes) | set (self._stats):
+                stats = self._stats.get (app_id, { "hits" : 0, "misses" : 0 })
+                claims = stats["hits"] + stats["misses"]
+                result[app_id] = {
+                    "size"     : self.sizes.get (app_id, 0),
+                    "hits"     : stats["hits"],
+                    "misses"   : stats["misses"],
+                    "hit_rate" : stats["hits"] / claims if claims else None
+                }
+            return result
+
+    def _run (self):
+        while True:
+            try:
+                if self.is_leader ():
+                    self.replenish ()
+            except Exception as e:
+                logger.warning (f"-- warm pool error: {e}")
+                logger.debug ("", exc_info=True)
+            self._wake.wait (self.interval)
+            self._wake.clear ()